@@ -9,14 +9,12 @@ import sys
 sys.path.append(str(Path(__file__).resolve().parent))
 
 import config
-import strategy
-from line_notifier import notifier
-from modules.api_manager import init_shioaji, get_valid_api, fetch_snapshots_parallel
+from modules.api_manager import init_shioaji, get_valid_api, ApiProvider
 from modules.gap_filter import run_gap_filter
-from modules.contract_resolver import resolve_contracts
-from modules.monitor_loop import run_monitoring_iteration
+from modules.monitor_worker import MonitorWorker, current_worker, start_worker, stop_worker
+from modules.telemetry import tracker as latency_tracker
 
-from modules.ui_components import apply_custom_styles, render_header
+from modules.ui_components import apply_custom_styles, render_header, render_monitor_table
 
 # Page Configuration
 st.set_page_config(page_title="台股即時強勢跳空篩選", layout="wide")
@@ -25,6 +23,12 @@ st.set_page_config(page_title="台股即時強勢跳空篩選", layout="wide")
 apply_custom_styles()
 
 # Helper Functions
+def stop_monitoring():
+    """停止背景監控並等待進行中的掃描結束"""
+    st.session_state.monitoring = False
+    if not stop_worker():
+        st.warning(f"⚠️ 背景監控未在 {config.MONITOR_STOP_TIMEOUT_SECONDS} 秒內結束，請稍後再試")
+
 def run_pre_process():
     import pre_process
     with st.spinner('執行盤前篩選中 (FinLab)...'):
@@ -34,7 +38,8 @@ def run_pre_process():
 
 # --- Session State Initialization ---
 if 'monitoring' not in st.session_state:
-    st.session_state.monitoring = False
+    # 背景監控屬於整個行程：重新整理頁面 / 新 session 時接手仍在執行的監控
+    st.session_state.monitoring = current_worker() is not None and current_worker().running
 if 'log' not in st.session_state:
     st.session_state.log = []
 if 'active_df' not in st.session_state:
@@ -77,8 +82,8 @@ with st.sidebar:
                         api.logout()
                         st.success("✅ API 已登出")
                     
+                    stop_monitoring()
                     st.cache_resource.clear()
-                    st.session_state.monitoring = False
                     
                     st.info("💡 已釋放 API 連線")
                     time.sleep(1)
@@ -132,7 +137,7 @@ with st.sidebar:
     
     # Gap Filter
     if st.button("🔍 執行開盤跳空篩選 (Gap > 1%)", use_container_width=True, type="primary"):
-        st.session_state.monitoring = False
+        stop_monitoring()
         st.cache_resource.clear()
         
         status = st.status("🚀 啟動篩選流程...", expanded=True)
@@ -152,7 +157,7 @@ with st.sidebar:
                 
                 if gap_list:
                     st.success(f"已更新監控名單，共 {len(gap_list)} 檔符合開盤跳空 > 1%")
-                    st.write(gap_df)
+                    render_monitor_table(gap_df)
                 else:
                     st.warning("沒有股票符合開盤跳空 > 1% 條件")
                     
@@ -164,16 +169,27 @@ with st.sidebar:
     # Monitor Control
     if not st.session_state.monitoring:
         if st.button("▶️ 開始監控 (Start)", use_container_width=True, type="primary"):
-            st.session_state.monitoring = True
-            st.rerun()
+            api = get_valid_api()
+            if not api:
+                st.error("API 初始化失敗，請檢查 login.json")
+            else:
+                try:
+                    # 背景執行緒不可呼叫 st.*：沿用這裡驗證過的連線，失效時由 ApiProvider 自行重新登入
+                    start_worker(MonitorWorker(ApiProvider(api), config.CANDIDATE_LIST_PATH,
+                                               st.session_state.monitoring_list))
+                except RuntimeError as e:
+                    st.error(str(e))
+                else:
+                    st.session_state.monitoring = True
+                    st.rerun()
     else:
         if st.button("⏸️ 停止監控 (Stop)", use_container_width=True):
-            st.session_state.monitoring = False
+            stop_monitoring()
             st.rerun()
     
     # Status Indicator
     if st.session_state.monitoring:
-        st.success("🟢 監控中 (每 60 秒更新)")
+        st.success(f"🟢 監控中 (每 {config.MONITOR_INTERVAL_SECONDS} 秒掃描，背景執行)")
     else:
         st.info("🔴 已停止")
     
@@ -201,130 +217,72 @@ with st.sidebar:
 
 
 # ===== MAIN AREA =====
-# Display Tables First (Always visible)
-st.header("📊 即時監控面板")
-
-# Row 1: Active Area (Full Width - Most Important)
-st.subheader("🔥 目前強勢區 (Active Matches)")
-st.dataframe(st.session_state.active_df, use_container_width=True, height=300)
+# 監控面板為定期重繪的 fragment：掃描由背景 MonitorWorker 執行，這裡只讀取最新結果
+@st.fragment(run_every=config.UI_REFRESH_SECONDS if st.session_state.monitoring else None)
+def render_monitor_panel():
+    worker = current_worker()
+    latest = worker.latest() if worker is not None else None
+    if latest is not None and latest["scan_count"]:
+        st.session_state.active_df = latest["active_df"]
+        st.session_state.watchlist_df = latest["watchlist_df"]
+        st.session_state.gap_df = latest["gap_df"]
 
-st.divider()
+    st.header("📊 即時監控面板")
 
-# Row 2: Watchlist and Gap Candidates (Side by Side)
-col1, col2 = st.columns(2)
+    # Row 1: Active Area (Full Width - Most Important)
+    st.subheader("🔥 目前強勢區 (Active Matches)")
+    render_monitor_table(st.session_state.active_df)
 
-with col1:
-    st.subheader("👀 轉弱觀察區 (Watchlist)")
-    st.caption("曾經符合條件，目前暫時觀察之標的")
-    st.dataframe(st.session_state.watchlist_df, use_container_width=True, height=300)
+    st.divider()
 
-with col2:
-    st.subheader("📈 跳空監控池 (Gap Monitoring Pool)")
-    st.caption("今日觀察的樣本總數 - 固定不變")
-    st.dataframe(st.session_state.gap_df, use_container_width=True, height=300)
+    # Row 2: Watchlist and Gap Pool (Side by Side)
+    col1, col2 = st.columns(2)
 
-st.caption(f"監控樣本: {len(st.session_state.monitoring_list)} 檔 (固定) | 最近一次更新: {datetime.datetime.now().strftime('%H:%M:%S')}")
+    with col1:
+        st.subheader("👀 轉弱觀察區 (Watchlist)")
+        st.caption("曾經符合條件，目前暫時觀察之標的")
+        render_monitor_table(st.session_state.watchlist_df)
 
-st.divider()
+    with col2:
+        st.subheader("📈 跳空監控池 (Gap Monitoring Pool)")
+        st.caption("今日仍可能符合條件的樣本 (開盤未跳空或缺口回補者已剔除)")
+        render_monitor_table(st.session_state.gap_df)
 
-# Monitoring Loop (System Messages in Expander)
-if st.session_state.monitoring:
-    with st.expander("🔧 系統執行訊息 (System Logs)", expanded=False):
-        log_container = st.container()
-    
-    # Initialize API
-    api = get_valid_api()
-    
-    if not api:
-        st.error("API 初始化失敗，請檢查 login.json")
-        st.session_state.monitoring = False
+    universe_stats = latest["universe"] if latest is not None else None
+    if universe_stats is not None:
+        universe_text = f"{universe_stats['alive']}/{universe_stats['total']} 檔 (已剔除: 未跳空 {universe_stats['dropped_no_gap']} / 缺口回補 {universe_stats['dropped_gap_filled']})"
     else:
-        with log_container:
-            st.write("🔄 Step 1: 開始新一輪監控掃描...")
-        
-        # Load candidate list
-        try:
-            candidates_df = pd.read_csv(config.CANDIDATE_LIST_PATH)
-            stock_codes = candidates_df['stock_code'].astype(str).str.strip().tolist()
-            
-            # Map bias and prev_high
-            bias_map_val = dict(zip(candidates_df['stock_code'].astype(str), candidates_df['bias']))
-            
-            if 'prev_high' in candidates_df.columns:
-                prev_high_map = dict(zip(candidates_df['stock_code'].astype(str), candidates_df['prev_high']))
-            else:
-                with log_container:
-                    st.warning("⚠️ 監控清單缺少 'prev_high' 欄位，請重新執行盤前運算。目前暫用昨收代替。")
-                prev_high_map = {}
+        universe_text = f"{len(st.session_state.monitoring_list)} 檔"
+    updated_at = latest["updated_at"] if latest is not None else None
+    updated_text = updated_at.strftime('%H:%M:%S') if updated_at else "-"
+    st.caption(f"監控樣本: {universe_text} | 最近一次掃描: {updated_text}")
 
-            # Load monitoring list
-            if not st.session_state.monitoring_list or len(st.session_state.monitoring_list) == 0:
-                st.session_state.monitoring_list = stock_codes
-            
-            current_monitor_codes = st.session_state.monitoring_list
-            with log_container:
-                st.write(f"✅ Step 1 完成: 載入監控名單共 {len(current_monitor_codes)} 檔")
+    st.divider()
 
-            # Build Contracts
-            with log_container:
-                st.write("🔄 Step 2: 正在轉換合約物件...")
-            contracts, contract_info = resolve_contracts(api, current_monitor_codes)
-            with log_container:
-                st.write(f"✅ Step 2 完成: 成功取得 Contract 物件共 {len(contracts)} 筆")
-            
-            if len(contracts) == 0:
-                with log_container:
-                    st.error(f"❌ 嚴重錯誤: 找不到任何 Contract 物件! (監控清單: {len(current_monitor_codes)} 筆)")
-                    st.info("💡 請嘗試重新整理網頁 (F5) 以重新觸發 init_shioaji 合約下載流程。")
-            
-            # Fetch Snapshots
-            with log_container:
-                st.write("🔄 Step 3: 正在向 API 請求行情 (Snapshots)...")
-            snapshots = fetch_snapshots_parallel(api, contracts, chunk_size=300, max_workers=2)
-            with log_container:
-                st.write(f"✅ Step 3 完成: API 回傳 {len(snapshots)} 筆行情資料")
+    if latest is None:
+        # When not monitoring, show placeholder
+        st.info("💡 點擊側邊欄的「開始監控 (Start)」按鈕以啟動即時監控")
+        return
 
-            # Process & Filter
-            if len(snapshots) == 0:
-                with log_container:
-                    st.warning(f"⚠️ 警告: 取得 0 筆行情資料 (預期: {len(contracts)} 筆)")
-            else:
-                # Show first item for validation
-                chk = snapshots[0]
-                with log_container:
-                    st.info(f"🔎 DEBUG Data Validation: Code={chk.code} | Open={chk.open} | Close={chk.close} | Vol={chk.total_volume} | Time={datetime.datetime.now().strftime('%H:%M:%S')}")
+    if latest["error"]:
+        st.error(latest["error"])
+    if not latest["running"] and st.session_state.monitoring:
+        st.warning("⚠️ 背景監控已停止，請重新啟動")
 
-                with log_container:
-                    st.write("🔄 Step 4: 執行篩選邏輯...")
-                
-                # Run monitoring iteration
-                active_df, watchlist_df, gap_df = run_monitoring_iteration(
-                    api,
-                    current_monitor_codes,
-                    prev_high_map,
-                    bias_map_val,
-                    contract_info,
-                    snapshots,
-                    st.session_state
-                )
-                
-                # Update display DataFrames
-                st.session_state.active_df = active_df
-                st.session_state.watchlist_df = watchlist_df
-                st.session_state.gap_df = gap_df
-                
-                with log_container:
-                    st.success(f"✅ Step 4 完成: 強勢股 {len(active_df)} 檔 | 觀察 {len(watchlist_df)} 檔 | 跳空候選 {len(gap_df)} 檔")
-                
-                # Auto-refresh after 60 seconds
-                time.sleep(60)
-                st.rerun()
+    # System Messages in Expander
+    with st.expander("🔧 系統執行訊息 (System Logs)", expanded=False):
+        fetch_report = latest["fetch_report"]
+        if fetch_report:
+            first_latency = fetch_report.get('first_chunk_latency')
+            first_latency_text = f"{first_latency:.1f}s" if first_latency is not None else "-"
+            st.write(f"📦 API 回傳 {fetch_report.get('snapshots', 0)} 筆行情資料 (批次 {fetch_report.get('chunks', 0)} × {fetch_report.get('chunk_size', 0)} 檔, {fetch_report.get('max_workers', 0)} 執行緒, 首批 {first_latency_text} / 總計 {fetch_report.get('elapsed', 0):.1f}s)")
+        latency = latency_tracker.summary()
+        if latency:
+            st.dataframe(pd.DataFrame(latency).T, use_container_width=True)
+            tick_stats = latency.get("tick")
+            if tick_stats and tick_stats["p95"] > config.SCAN_BUDGET_SECONDS * 1000:
+                st.warning(f"⚠️ 掃描耗時 p95 {tick_stats['p95'] / 1000:.1f}s 已超過 {config.SCAN_BUDGET_SECONDS}s 預算")
+        st.code("\n".join(f"{ts} [{level}] {message}" for ts, level, message in reversed(worker.logs())) or "-")
 
-        except Exception as e:
-            with log_container:
-                st.error(f"監控過程發生錯誤: {e}")
-            st.session_state.monitoring = False
-else:
-    # When not monitoring, show placeholder
-    st.info("💡 點擊側邊欄的「開始監控 (Start)」按鈕以啟動即時監控")
 
+render_monitor_panel()
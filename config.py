@@ -1,5 +1,6 @@
 import os
 import json
+import datetime
 from pathlib import Path
 
 # Base Directory
@@ -9,6 +10,11 @@ LOG_DIR = BASE_DIR / "logs"
 
 # File Paths
 CANDIDATE_LIST_PATH = DATA_DIR / "candidate_list.csv"
+CONTRACT_INDEX_PATH = DATA_DIR / "contract_index.json"
+STOCK_FUTURES_LIST_PATH = DATA_DIR / "stock_futures_list.csv"
+KBAR_CACHE_DIR = DATA_DIR / "kbars"
+FINLAB_CACHE_DIR = DATA_DIR / "finlab"
+NOTIFY_DEDUP_PATH = Path(os.environ.get("NOTIFY_DEDUP_PATH", DATA_DIR / "notify_sent.sqlite"))
 LOGIN_CONFIG_PATH = BASE_DIR / "login.json"
 
 # Load Credentials
@@ -31,9 +37,42 @@ P_LOC_THRESHOLD = 0.5
 MIN_VOLUME_SHEETS = 500
 MIN_AMOUNT_TWD = 10_000_000  # 10 Million
 
+# Snapshot Fetch Parameters (Shioaji quote API: 50 requests / 5s, 500 contracts / request)
+SNAPSHOT_REQUESTS_PER_SECOND = 8
+SNAPSHOT_MAX_CHUNK_SIZE = 500
+SNAPSHOT_MAX_WORKERS = 4
+
+# Intraday Monitoring
+MONITOR_INTERVAL_SECONDS = 60  # background scan period
+UI_REFRESH_SECONDS = 5  # dashboard fragment redraw period (reads the latest scan only)
+MONITOR_STOP_TIMEOUT_SECONDS = 30  # wait for the running scan to finish before replacing / stopping the worker
+MONITOR_API_MAX_FAILURES = 3  # consecutive failed scans before the worker asks for a fresh API session
+
+# Historical Kbar Download Parameters
+KBAR_REQUESTS_PER_SECOND = 8
+KBAR_MAX_WORKERS = 4
+KBAR_MAX_RETRIES = 3
+
+# Telemetry
+SCAN_BUDGET_SECONDS = 60  # one monitoring tick must finish before the next one starts
+TELEMETRY_WINDOW = 500  # samples kept per stage for rolling percentiles
+TELEMETRY_SUMMARY_EVERY = 10  # ticks between latency summary logs
+
+# LINE Messaging API
+LINE_PUSH_URL = os.environ.get("LINE_PUSH_URL", "https://api.line.me/v2/bot/message/push")
+LINE_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+LINE_MAX_RETRIES = 4
+LINE_FLUSH_TIMEOUT = 15  # seconds to drain queued messages at exit
+LINE_COALESCE_WINDOW = 1.0  # seconds to collect concurrent signals into one push
+
+# FinLab Cache (daily price tables are complete after this time)
+FINLAB_UPDATE_TIME = datetime.time(17, 0)
+FINLAB_CACHE_ROW_GROUP_SIZE = 250  # ~1 year per row group, so lookback reads decode only the tail
+
 # Pre-process Parameters
 BIAS_WINDOW = 60
 BIAS_PERCENTILE = 0.60  # Bottom 60%
+PREPROCESS_LOOKBACK_DAYS = 120  # Rows pulled from FinLab (covers the MA60 window and the TSM monitor's 3-month history)
 
 MA_CONVERGENCE_THRESHOLD = 0.05
 
@@ -23,20 +23,21 @@ sys.path.append(str(Path(__file__).resolve().parent))
 try:
     import config
     import pre_process
-    from modules.contract_resolver import resolve_contracts
+    from modules.contract_resolver import resolve_contracts, get_contract_index
     from modules.api_manager import fetch_snapshots_parallel
-    from modules.monitor_loop import run_monitoring_iteration
+    from modules.snapshot_frame import SnapshotFrame
+    from modules.monitor_loop import run_monitoring_pipeline
+    from modules.telemetry import tracker as latency_tracker
+    from modules.universe import UniverseManager
+    from modules.tick_clock import TickClock
+    from modules.gap_filter import screen_gaps, format_strategy_tag
+    from modules.quote_stream import QuoteStreamMonitor
     from modules.tsm_premium import TSMPremiumMonitor
+    from modules.session_state import MockSessionState
 except ImportError as e:
     logger.error(f"Import failed: {e}")
     sys.exit(1)
 
-# Mock Streamlit session state
-class MockSessionState(dict):
-    def __getattr__(self, key):
-        return self.get(key)
-    def __setattr__(self, key, value):
-        self[key] = value
 
 # Inject Env Vars into Config
 if "line_channel_access_token" not in config.CONFIG and os.environ.get("LINE_TOKEN"):
@@ -96,6 +97,26 @@ def init_shioaji_headless():
         logger.error(f"API Initialization failed: {e}")
         return None
 
+def run_stream_monitor(api, gap_list, contracts, prev_high_map, bias_map, contract_info, session_state):
+    """Push-based monitoring: evaluate the strategy on every tick until market close"""
+    logger.info("[Step 4] Stream mode: subscribing tick data for gap list...")
+    stream = QuoteStreamMonitor(
+        gap_list, prev_high_map, bias_map, contract_info, session_state,
+        on_signal=lambda e: logger.info(f"Signal: [{e['code']}] {e['name']} close={e['close']} p_loc={e['p_loc']:.2f}")
+    )
+    stream.subscribe(api, contracts)
+
+    try:
+        while datetime.datetime.now().time() <= datetime.time(13, 35):
+            time.sleep(60)
+            logger.info(f"Stream Status: Ticks={stream.tick_count}, Triggered={len(session_state.triggered_history)}")
+        logger.info("Market closed. Daily run completed.")
+    except KeyboardInterrupt:
+        logger.info("Stopped by user.")
+    finally:
+        stream.unsubscribe(api, contracts)
+
+
 def main():
     logger.info("=== Starting GapTrading Automation ===")
     
@@ -150,9 +171,10 @@ def main():
     candidates_df = pd.read_csv(config.CANDIDATE_LIST_PATH)
     all_codes = candidates_df['stock_code'].astype(str).str.strip().tolist()
     
-    target_date_str = datetime.datetime.now().strftime("%Y-%m-%d")
+    clock = TickClock()
     
-    # Resolve Contracts
+    # Resolve Contracts (build today's contract index once, persisted for restarts)
+    get_contract_index(api, persist=True)
     contracts, contract_info = resolve_contracts(api, all_codes)
     if not contracts:
         logger.error("No contracts resolved.")
@@ -160,14 +182,14 @@ def main():
 
     # Fetch Snapshots with Retry
     max_retries = 3
-    snapshots = []
+    snapshots = SnapshotFrame.empty()
     
     for attempt in range(max_retries):
         logger.info(f"Fetching snapshots attempt {attempt+1}/{max_retries}...")
-        snapshots = fetch_snapshots_parallel(api, contracts, chunk_size=300)
+        snapshots = fetch_snapshots_parallel(api, contracts)
         
         # Check if we got valid data for today
-        valid_count = sum(1 for s in snapshots if datetime.datetime.fromtimestamp(s.ts / 1_000_000_000).strftime('%Y-%m-%d') == target_date_str)
+        valid_count = int(clock.is_today(snapshots["ts"]).sum())
         
         if valid_count > 0:
             logger.info(f"Got {valid_count} valid snapshots.")
@@ -177,21 +199,7 @@ def main():
         time.sleep(30)
     
     # Filter for Gaps
-    for snap in snapshots:
-        # Check date freshness
-        ts_date = datetime.datetime.fromtimestamp(snap.ts / 1_000_000_000).strftime('%Y-%m-%d')
-        if ts_date != target_date_str:
-            continue
-            
-        code = snap.code
-        open_ = snap.open
-        info = contract_info.get(code, {})
-        ref_price = info.get("reference", 0.0)
-        
-        if ref_price > 0 and open_ > 0:
-            pct = (open_ - ref_price) / ref_price
-            if pct >= 0.01:
-                gap_list.append(code)
+    gap_list, _, _ = screen_gaps(snapshots, contract_info, clock=clock)
     
     # Prepare Data Maps
     bias_map = dict(zip(candidates_df['stock_code'].astype(str), candidates_df['bias']))
@@ -205,8 +213,7 @@ def main():
     # Log Gap Results with Strategy Tags
     logger.info(f"Gap Filter Result: {len(gap_list)} stocks found with Gap > 1%")
     for code in gap_list:
-        tag = strategy_map.get(str(code), "unknown")
-        tag_display = tag.replace("bias", "低基期").replace("ma_conv", "均線糾結").replace("|", "+")
+        tag_display = format_strategy_tag(strategy_map.get(str(code), "unknown"), sep="+")
         logger.info(f"  - [{code}] {tag_display}")
 
     # Initialize Session State
@@ -216,30 +223,42 @@ def main():
     # Re-resolve contracts only for gap list (optimization)
     monitor_contracts, monitor_contract_info = resolve_contracts(api, gap_list)
 
+    # Event-driven mode: subscribe tick stream instead of polling snapshots
+    if os.environ.get("MONITOR_MODE", "poll").lower() == "stream":
+        run_stream_monitor(api, gap_list, monitor_contracts, prev_high_map, bias_map,
+                           monitor_contract_info, session_state)
+        return
+
+    # Names that can no longer qualify are dropped and never fetched again
+    universe = UniverseManager(gap_list, prev_high_map, monitor_contract_info)
+
     # Loop until 13:30
+    tick_count = 0
     while True:
         now = datetime.datetime.now()
         if now.time() > datetime.time(13, 35):
+            latency_tracker.log_summary()
             logger.info("Market closed. Daily run completed.")
             break
             
         try:
-            # Fetch snapshots for monitoring list
-            snapshots = fetch_snapshots_parallel(api, monitor_contracts, chunk_size=300)
-            
-            # Run Logic
-            active_df, watchlist_df, gap_df = run_monitoring_iteration(
+            # Fetch snapshots for monitoring list, evaluating each chunk as it arrives
+            active_df, watchlist_df, gap_df = run_monitoring_pipeline(
                 api,
                 gap_list,
                 prev_high_map,
                 bias_map,
                 monitor_contract_info,
-                snapshots,
-                session_state
+                monitor_contracts,
+                session_state,
+                universe=universe
             )
             
             # Log progress
-            logger.info(f"Monitor Tick: Active={len(active_df)}, Watchlist={len(watchlist_df)}")
+            logger.info(f"Monitor Tick: Active={len(active_df)}, Watchlist={len(watchlist_df)}, Universe={universe.stats()}")
+            tick_count += 1
+            if tick_count % config.TELEMETRY_SUMMARY_EVERY == 0:
+                latency_tracker.log_summary()
             
             # Sleep 60s
             time.sleep(60)
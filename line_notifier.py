@@ -2,265 +2,258 @@ import requests
 import datetime
 import config
 import json
+import queue
+import random
+import threading
+import time
+import uuid
+import atexit
+from requests.adapters import HTTPAdapter
+from modules.dedup_store import SentStore
+from modules.telemetry import span
+from modules.flex_templates import (
+    PUSH, TEXT_MESSAGE, FLEX_MESSAGE, CAROUSEL, SIGNAL_BUBBLE, raw_list, signal_values
+)
+
+# LINE Messaging API limits
+PUSH_MAX_MESSAGES = 5
+CAROUSEL_MAX_BUBBLES = 12
+ALT_TEXT_MAX_LENGTH = 400
 
 class LineNotifier:
-    def __init__(self):
+    """
+    LINE Messaging API 推播 (背景執行緒發送，呼叫端不會被網路延遲阻塞)
+
+    - send_* 只將訊息放入佇列並立即返回
+    - notify_signal 於 coalesce_window 秒內的訊號合併為 carousel / 多則訊息推播
+    - 訊息以預先編譯的 Flex 版型 (flex_templates) 組成 JSON 字串，不再逐次建構 dict
+    - 背景 worker 以共用的 requests.Session 發送，含逾時、重試與 jitter 退避
+    - 重試帶相同的 X-Line-Retry-Key，避免 LINE 端重複推播
+    - 當日已通知代碼存於 SQLite (SentStore)，程式重啟後不會重複通知；
+      只有推播成功 (2xx) 後才寫入，佇列中尚未送出的代碼只記在記憶體 (pending)，
+      推播失敗或程式中斷時不會讓當日訊號被永久略過
+    """
+
+    def __init__(self, token=None, user_id=None, push_url=None, timeout=None,
+                 max_retries=None, base_backoff=1.0, max_backoff=30.0, coalesce_window=None,
+                 dedup_path=None):
         # Messaging API uses Channel Access Token
-        self.token = config.CONFIG.get("line_channel_access_token")
+        self.token = token or config.CONFIG.get("line_channel_access_token")
         # Target User ID to push message to (since Push API requires a target)
-        self.user_id = config.CONFIG.get("line_user_id") 
+        self.user_id = user_id or config.CONFIG.get("line_user_id") 
+        self.push_url = push_url or config.LINE_PUSH_URL
+        self.timeout = timeout or config.LINE_TIMEOUT
+        self.max_retries = max_retries or config.LINE_MAX_RETRIES
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.coalesce_window = config.LINE_COALESCE_WINDOW if coalesce_window is None else coalesce_window
         
-        self.sent_today = set()
-        self.last_reset = datetime.date.today()
+        # 已通知代碼 (SQLite 持久化，重啟後不重複推播；跨日自動重置)
+        self.sent_today = SentStore(dedup_path)
+        # 已入佇列但尚未送達的代碼 (避免同一訊號重複入佇列)
+        self._pending_codes = set()
+        self._pending_codes_lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self._queue = queue.Queue()
+        self._pending = 0
+        self._pending_cond = threading.Condition()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    # ---------- Background dispatch ----------
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="line-notifier", daemon=True)
+                self._worker.start()
+
+    def _enqueue(self, item):
+        with self._pending_cond:
+            self._pending += 1
+        self._queue.put(item)
+        self._ensure_worker()
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            if items[0][0] == "signal":
+                # 開盤瞬間常有多檔同時觸發：等待一小段時間收集後合併推播
+                deadline = time.monotonic() + self.coalesce_window
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        items.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+
+            signals = [item[1:] for item in items if item[0] == "signal"]
+            payloads = [(item[1], item[2], ()) for item in items if item[0] == "payload"]
+            if signals:
+                payloads = self._build_signal_pushes(signals) + payloads
+
+            for payload, label, codes in payloads:
+                sent = False
+                try:
+                    with span("notify_dispatch", label=label):
+                        sent = self._post(payload, label)
+                except Exception as e:
+                    print(f"Error sending LINE: {e}")
+                try:
+                    if sent:
+                        for code in codes:
+                            self.sent_today.add(code)
+                finally:
+                    with self._pending_codes_lock:
+                        self._pending_codes.difference_update(codes)
+            with self._pending_cond:
+                self._pending -= len(items)
+                self._pending_cond.notify_all()
+
+    def _build_signal_pushes(self, signals):
+        """
+        將多個訊號 bubble 打包成推播：每個 carousel 最多 12 個 bubble，每次推播最多 5 則訊息
+
+        Args:
+            signals: List[(values, alt_text, label, code)]，values 為 SIGNAL_BUBBLE 的欄位值
+
+        Returns:
+            List[(payload, label, codes)]：codes 為該次推播包含的代碼 (送達後才標記已通知)
+        """
+        if len(signals) == 1:
+            values, alt_text, _, code = signals[0]
+            bubble = SIGNAL_BUBBLE.render(size="giga", **values)
+            message = FLEX_MESSAGE.render(alt_text=alt_text, contents=bubble)
+            return [(self._push_payload([message]), "LINE Flex Message", (code,))]
+
+        messages = []
+        message_codes = []
+        for i in range(0, len(signals), CAROUSEL_MAX_BUBBLES):
+            group = signals[i:i + CAROUSEL_MAX_BUBBLES]
+            message_codes.append(tuple(code for _, _, _, code in group))
+            if len(group) == 1:
+                values, alt_text, _, _ = group[0]
+                bubble = SIGNAL_BUBBLE.render(size="giga", **values)
+                messages.append(FLEX_MESSAGE.render(alt_text=alt_text, contents=bubble))
+                continue
+            # carousel 內的 bubble 不支援 giga 尺寸
+            bubbles = [SIGNAL_BUBBLE.render(size="mega", **values) for values, _, _, _ in group]
+            alt_text = f"觸發 {len(group)} 檔: " + ", ".join(label for _, _, label, _ in group)
+            messages.append(FLEX_MESSAGE.render(
+                alt_text=alt_text[:ALT_TEXT_MAX_LENGTH],
+                contents=CAROUSEL.render(contents=raw_list(bubbles)),
+            ))
+
+        return [
+            (self._push_payload(messages[i:i + PUSH_MAX_MESSAGES]), f"LINE Flex Carousel ({len(signals)} signals)",
+             sum(message_codes[i:i + PUSH_MAX_MESSAGES], ()))
+            for i in range(0, len(messages), PUSH_MAX_MESSAGES)
+        ]
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after:
+            try:
+                return min(self.max_backoff, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+
+    def _post(self, payload, label):
+        """
+        發送一則推播 (於 worker 執行緒)；429 / 5xx / 連線錯誤會重試，其他 4xx 直接放棄
+        """
+        headers = {
+            "Authorization": "Bearer " + self.token,
+            "Content-Type": "application/json",
+            "X-Line-Retry-Key": str(uuid.uuid4()),
+        }
+        for attempt in range(self.max_retries):
+            retry_after = None
+            try:
+                r = self.session.post(self.push_url, headers=headers, data=payload.encode("utf-8"),
+                                      timeout=self.timeout)
+                if r.status_code == 200:
+                    print(f"{label} sent.")
+                    return True
+                # 409: 相同 retry key 已被接受 (先前的嘗試其實成功了)
+                if r.status_code == 409:
+                    return True
+                if r.status_code != 429 and r.status_code < 500:
+                    print(f"Failed to send LINE: {r.status_code} {r.text}")
+                    return False
+                retry_after = r.headers.get("Retry-After")
+                print(f"LINE busy ({r.status_code}), attempt {attempt + 1}/{self.max_retries}")
+            except requests.RequestException as e:
+                print(f"Error sending LINE (attempt {attempt + 1}/{self.max_retries}): {e}")
+            if attempt < self.max_retries - 1:
+                time.sleep(self._backoff(attempt, retry_after))
+        print(f"Giving up on {label} after {self.max_retries} attempts.")
+        return False
+
+    def flush(self, timeout=None):
+        """
+        等待佇列中的訊息全部送出 (程式結束或批次工作完成時呼叫)
+
+        Returns:
+            bool: 是否在 timeout 內全部處理完
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._pending_cond:
+            while self._pending:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._pending_cond.wait(remaining)
+        return True
+
+    # ---------- Messages ----------
 
-    def _reset_cache_if_new_day(self):
-        today = datetime.date.today()
-        if today > self.last_reset:
-            self.sent_today.clear()
-            self.last_reset = today
+    def _push_payload(self, messages):
+        return PUSH.render(to=self.user_id, messages=raw_list(messages))
 
     def send_message(self, message):
         if not self.token or not self.user_id:
             print("Warning: Missing LINE Channel Access Token or User ID.")
             return
 
-        headers = {
-            "Authorization": "Bearer " + self.token,
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "to": self.user_id,
-            "messages": [
-                {
-                    "type": "text",
-                    "text": message
-                }
-            ]
-        }
-        
-        try:
-            # Messaging API Push Endpoint
-            r = requests.post("https://api.line.me/v2/bot/message/push", headers=headers, json=payload)
-            
-            if r.status_code == 200:
-                print("LINE Message sent.")
-            else:
-                print(f"Failed to send LINE: {r.status_code} {r.text}")
-        except Exception as e:
-            print(f"Error sending LINE: {e}")
+        payload = self._push_payload([TEXT_MESSAGE.render(text=message)])
+        self._enqueue(("payload", payload, "LINE Message"))
 
     def send_flex_message(self, alt_text, contents):
+        """
+        Args:
+            alt_text: 通知列顯示文字
+            contents: Flex 內容 (FlexTemplate.render 的結果或 dict)
+        """
         if not self.token or not self.user_id:
             print("Warning: Missing LINE Channel Access Token or User ID.")
             return
 
-        headers = {
-            "Authorization": "Bearer " + self.token,
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "to": self.user_id,
-            "messages": [
-                {
-                    "type": "flex",
-                    "altText": alt_text,
-                    "contents": contents
-                }
-            ]
-        }
-        
-        try:
-            r = requests.post("https://api.line.me/v2/bot/message/push", headers=headers, json=payload)
-            if r.status_code == 200:
-                print("LINE Flex Message sent.")
-            else:
-                print(f"Failed to send LINE: {r.status_code} {r.text}")
-        except Exception as e:
-            print(f"Error sending LINE: {e}")
+        payload = self._push_payload([FLEX_MESSAGE.render(alt_text=alt_text, contents=contents)])
+        self._enqueue(("payload", payload, "LINE Flex Message"))
 
     def notify_signal(self, stock_code, name, price, gap, p_loc, volume, amount, has_future=False):
-        self._reset_cache_if_new_day()
-        
-        if stock_code in self.sent_today:
-            print(f"Skipping duplicate notification for {stock_code}")
+        if not self.token or not self.user_id:
+            print("Warning: Missing LINE Channel Access Token or User ID.")
             return
+        with self._pending_codes_lock:
+            if stock_code in self._pending_codes:
+                return
+            if stock_code in self.sent_today:
+                print(f"Skipping duplicate notification for {stock_code}")
+                return
+            self._pending_codes.add(stock_code)
 
-        amt_e = round(amount / 100_000_000, 2)
-        gap_pct = round(gap * 100, 2)
-        
-        # Color Logic
-        header_color = "#D32F2F" if gap_pct >= 3 else "#F57C00" # High urgency Red if >3%, else Orange
-        p_loc_color = "#2E7D32" if p_loc > 0.8 else "#1976D2" # Green for strong, Blue for normal
-        
-        # Badges
-        badges = []
-        if has_future:
-             # Text component does not support backgroundColor directly in checking structure sometimes, use box wrapper or simplified style. 
-             # Actually "text" component doesn't have backgroundColor property. "span" does not either.
-             # We must use a Box to wrap the Text if we want background color, OR use a linear gradient background for bubble but that's for whole container.
-             # Correct approach for badge: Box (layout: baseline/horizontal) -> Text.
-             # BUT simpler approach for badges in a horizontal row: 
-             # Using a Box with backgroundColor and cornerRadius, containing the Text.
-             badges.append({
-                "type": "box",
-                "layout": "vertical",
-                "contents": [
-                    {"type": "text", "text": "期", "color": "#FFFFFF", "size": "xs", "weight": "bold", "align": "center"}
-                ],
-                "backgroundColor": "#E65100",
-                "cornerRadius": "2px",
-                "paddingAll": "2px",
-                "width": "20px",
-                "height": "20px",
-                "justifyContent": "center",
-                "alignItems": "center",
-                "margin": "sm"
-             })
-        
-        # Determine Strategy Source
-        badges.append({
-            "type": "box",
-            "layout": "vertical",
-            "contents": [
-                {"type": "text", "text": "多方", "color": "#FFFFFF", "size": "xs", "weight": "bold", "align": "center"}
-            ],
-            "backgroundColor": "#C62828",
-            "cornerRadius": "2px",
-            "paddingAll": "2px",
-            "width": "35px",
-            "height": "20px",
-            "justifyContent": "center",
-            "alignItems": "center",
-            "margin": "sm"
-        })
-
-        flex_contents = {
-          "type": "bubble",
-          "size": "giga",
-          "header": {
-            "type": "box",
-            "layout": "vertical",
-            "contents": [
-              {
-                "type": "box",
-                "layout": "horizontal",
-                "contents": [
-                  {
-                    "type": "text",
-                    "text": "🚨 訊號觸發",
-                    "color": "#ffffff",
-                    "weight": "bold",
-                    "size": "lg"
-                  },
-                  {
-                    "type": "text",
-                    "text": datetime.datetime.now().strftime("%H:%M:%S"),
-                    "color": "#ffffff",
-                    "size": "sm",
-                    "align": "end",
-                    "gravity": "center"
-                  }
-                ]
-              }
-            ],
-            "backgroundColor": header_color,
-            "paddingAll": "12px"
-          },
-          "body": {
-            "type": "box",
-            "layout": "vertical",
-            "contents": [
-              {
-                "type": "box",
-                "layout": "horizontal",
-                "contents": [
-                  {
-                    "type": "text",
-                    "text": f"{stock_code} {name}",
-                    "weight": "bold",
-                    "size": "xl", # Reduced from xl to lg to fit better? Keep xl for emphasis
-                    "flex": 1,
-                    "color": "#000000"
-                  }
-                ],
-                "alignItems": "center"
-              },
-              {
-                 "type": "box",
-                 "layout": "horizontal",
-                 "contents": badges,
-                 "margin": "sm"
-              },
-              {
-                "type": "separator",
-                "margin": "md",
-                "color": "#BDBDBD"
-              },
-              {
-                "type": "box",
-                "layout": "vertical",
-                "margin": "md",
-                "spacing": "sm",
-                "contents": [
-                  {
-                    "type": "box",
-                    "layout": "baseline",
-                    "contents": [
-                      {"type": "text", "text": "現價", "color": "#757575", "size": "sm", "flex": 2},
-                      {"type": "text", "text": f"{price}", "weight": "bold", "size": "lg", "flex": 4, "color": "#D32F2F"},
-                      {"type": "text", "text": f"(+{gap_pct}%)", "size": "sm", "color": "#D32F2F", "flex": 3, "align": "end"}
-                    ]
-                  },
-                  {
-                    "type": "box",
-                    "layout": "baseline",
-                    "contents": [
-                      {"type": "text", "text": "P-Loc", "color": "#757575", "size": "sm", "flex": 2},
-                      {"type": "text", "text": f"{p_loc:.2f}", "weight": "bold", "size": "md", "flex": 4, "color": p_loc_color}
-                    ]
-                  },
-                  {
-                    "type": "box",
-                    "layout": "baseline",
-                    "contents": [
-                      {"type": "text", "text": "量能", "color": "#757575", "size": "sm", "flex": 2},
-                      {"type": "text", "text": f"{int(volume):,}張", "size": "sm", "flex": 4, "color": "#424242"},
-                      {"type": "text", "text": f"({amt_e}億)", "size": "sm", "flex": 3, "align": "end", "color": "#616161"}
-                    ]
-                  }
-                ]
-              }
-            ]
-          },
-          "footer": {
-            "type": "box",
-            "layout": "vertical",
-            "contents": [
-              {
-                "type": "button",
-                "action": {
-                  "type": "uri",
-                  "label": "查看 K 線圖 (Trend)",
-                  "uri": f"https://www.cnyes.com/twstock/{stock_code}/charts/technical-history"
-                },
-                "style": "secondary",
-                "height": "sm",
-                "color": "#E0E0E0"
-              }
-            ],
-            "paddingAll": "10px"
-          },
-          "styles": {
-             "footer": {
-                "separator": False
-             }
-          }
-        }
-        
-        alt_msg = f"觸發: {stock_code} {name} 現價:{price} (+{gap_pct}%)"
-        self.send_flex_message(alt_msg, flex_contents)
-        self.sent_today.add(stock_code)
+        values = signal_values(stock_code, name, price, gap, p_loc, volume, amount, has_future,
+                               datetime.datetime.now().strftime("%H:%M:%S"))
+        alt_msg = f"觸發: {stock_code} {name} 現價:{price} {values['gap']}"
+        self._enqueue(("signal", values, alt_msg, f"{stock_code} {name}", stock_code))
 
 notifier = LineNotifier()
+
+# 程式結束前盡量送出尚在佇列中的訊息
+atexit.register(notifier.flush, timeout=config.LINE_FLUSH_TIMEOUT)
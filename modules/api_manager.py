@@ -5,8 +5,15 @@ API Manager Module
 import streamlit as st
 import shioaji as sj
 import time
+import random
+import logging
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import config
+from .snapshot_frame import SnapshotFrame
+from .telemetry import tracker
+
+logger = logging.getLogger(__name__)
 
 
 @st.cache_resource(ttl=3600*4)  # Cache for 4 hours
@@ -92,42 +99,299 @@ def get_valid_api():
     return api
 
 
-def fetch_snapshots_parallel(api, contracts, chunk_size=300, max_workers=2):
+def contracts_ready(api):
     """
-    使用多執行緒並行抓取快照資料
-    
-    Args:
-        api: Shioaji API 實例
-        contracts: Contract 物件列表
-        chunk_size: 每批次大小
-        max_workers: 最大執行緒數
-    
+    API 健康檢查：合約庫已載入 (以 2330 為準)
+    """
+    try:
+        return bool(api.Contracts.Stocks["2330"])
+    except Exception:
+        return False
+
+
+def login_shioaji(wait_seconds=60):
+    """
+    不使用 Streamlit 元件的登入 (可在背景執行緒呼叫)：登入並等待合約下載完成
+
     Returns:
-        List[Snapshot]: 快照資料列表
+        Shioaji API 實例，失敗時為 None
     """
-    # Split contracts into chunks
-    chunks = [contracts[i:i+chunk_size] for i in range(0, len(contracts), chunk_size)]
-    
-    snapshots = []
+    if "api_key" not in config.CONFIG or "secret_key" not in config.CONFIG:
+        logger.error("Missing api_key / secret_key in login.json")
+        return None
+    try:
+        api = sj.Shioaji(simulation=False)
+        api.login(api_key=config.CONFIG["api_key"], secret_key=config.CONFIG["secret_key"])
+        if not contracts_ready(api):
+            api.fetch_contracts(contract_download=True)
+            for _ in range(wait_seconds):
+                time.sleep(1)
+                if contracts_ready(api):
+                    break
+            else:
+                logger.error(f"Contracts not ready after {wait_seconds}s")
+                api.logout()
+                return None
+        return api
+    except Exception as e:
+        logger.error(f"Shioaji login failed: {e}")
+        return None
+
+
+class ApiProvider:
+    """
+    背景執行緒用的 API 來源 (不呼叫 st.*)
+
+    先沿用主執行緒以 get_valid_api 取得的連線；健康檢查失敗或呼叫端要求 refresh 時，
+    改以 login_shioaji 重新登入，並登出先前由本物件建立的連線 (主執行緒的快取連線不登出)。
+
+    Args:
+        api: 初始 API 實例 (可為 None)
+        login: 重新登入函式 (預設 login_shioaji)
+    """
+
+    def __init__(self, api=None, login=login_shioaji):
+        self._api = api
+        self._owned = False
+        self._login = login
+        self._lock = threading.Lock()
+
+    def __call__(self, refresh=False):
+        with self._lock:
+            if self._api is not None and not refresh and contracts_ready(self._api):
+                return self._api
+
+            previous, owned = self._api, self._owned
+            logger.warning("API unhealthy or refresh requested, logging in again")
+            self._api, self._owned = self._login(), True
+            if owned and previous is not None:
+                try:
+                    previous.logout()
+                except Exception as e:
+                    logger.warning(f"Logout of replaced API failed: {e}")
+            return self._api
+
+
+class RateLimiter:
+    """
+    執行緒安全的請求速率限制 (每秒最多 rate 次，平均分配時間槽)
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class SnapshotScheduler:
+    """
+    自適應快照抓取排程器
     
-    def fetch_chunk_with_retry(api, chunk, chunk_id):
-        max_retries = 3
-        for attempt in range(max_retries):
+    - 依觀察到的延遲與錯誤率調整 chunk 大小與執行緒數 (AIMD)
+    - 以 RateLimiter 控制每秒請求數，避免被券商限流
+    - 失敗批次採 jitter 指數退避重試，最終失敗的批次記錄於呼叫端傳入的 report
+    - 排程器可被多個掃描共用 (default_scheduler)，每次抓取的統計不存放在排程器上
+    """
+
+    def __init__(self, chunk_size=300, max_workers=2,
+                 requests_per_second=config.SNAPSHOT_REQUESTS_PER_SECOND,
+                 min_chunk_size=50, max_chunk_size=config.SNAPSHOT_MAX_CHUNK_SIZE,
+                 max_workers_cap=config.SNAPSHOT_MAX_WORKERS,
+                 max_retries=3, base_backoff=0.5, max_backoff=8.0,
+                 target_latency=1.5, adaptive=True):
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.max_workers_cap = max_workers_cap
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.target_latency = target_latency
+        self.adaptive = adaptive
+        self.limiter = RateLimiter(requests_per_second)
+        self._stats_lock = threading.Lock()
+        self._adapt_lock = threading.Lock()  # 多個掃描共用排程器時，調整 chunk / workers 需互斥
+
+    def _backoff(self, attempt):
+        # Full jitter: uniform(0, min(cap, base * 2^attempt))
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+
+    def _fetch_chunk(self, api, chunk, stats):
+        for attempt in range(self.max_retries):
+            self.limiter.acquire()
+            start = time.monotonic()
+            outcome = "error"
             try:
                 res = api.snapshots(chunk)
+                latency = time.monotonic() - start
+                with self._stats_lock:
+                    stats["attempts"] += 1
+                    stats["latencies"].append(latency)
                 if res:
+                    outcome = "ok"
                     return res
-            except Exception:
-                pass
-        return []
-    
-    # Execute in Parallel
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {executor.submit(fetch_chunk_with_retry, api, c, i): i for i, c in enumerate(chunks)}
+                outcome = "empty"
+                with self._stats_lock:
+                    stats["empty"] += 1
+            except Exception as e:
+                outcome = type(e).__name__
+                with self._stats_lock:
+                    stats["attempts"] += 1
+                    stats["errors"] += 1
+                    stats["last_error"] = str(e)
+            finally:
+                # 失敗 / 逾時的嘗試也要記錄，否則慢尾端會從延遲統計中消失
+                tracker.record("snapshot_chunk", time.monotonic() - start, size=len(chunk), attempt=attempt,
+                               ok=outcome == "ok", outcome=outcome)
+            if attempt < self.max_retries - 1:
+                time.sleep(self._backoff(attempt))
+        return None
+
+    def _adapt(self, stats):
+        with self._adapt_lock:
+            return self._adapt_locked(stats)
+
+    def _adapt_locked(self, stats):
+        attempts = max(stats["attempts"], 1)
+        error_rate = (stats["errors"] + stats["empty"]) / attempts
+        latencies = stats["latencies"]
+        avg_latency = sum(latencies) / len(latencies) if latencies else None
+
+        if error_rate > 0.2:
+            # Multiplicative decrease: likely throttled or overloaded
+            self.max_workers = max(1, self.max_workers - 1)
+            self.chunk_size = max(self.min_chunk_size, self.chunk_size // 2)
+        elif avg_latency is not None and avg_latency > self.target_latency * 2:
+            self.chunk_size = max(self.min_chunk_size, int(self.chunk_size * 0.75))
+        elif error_rate == 0 and avg_latency is not None and avg_latency < self.target_latency:
+            # Additive increase
+            self.max_workers = min(self.max_workers_cap, self.max_workers + 1)
+            self.chunk_size = min(self.max_chunk_size, self.chunk_size + 50)
+
+        return error_rate, avg_latency
+
+    def iter_fetch(self, api, contracts, report=None):
+        """
+        逐批產出快照：每個 chunk 抓取完成即 yield，呼叫端可在其餘批次仍在抓取時先行處理
+        
+        Args:
+            api: Shioaji API 實例
+            contracts: Contract 物件列表
+            report: dict，可選；結束 (含提前中斷 / 例外) 時填入本次統計，
+                    completed 為 False 表示本輪未完整抓取 (unfinished 為尚未處理的批次)
+        
+        Yields:
+            (chunk_id, SnapshotFrame)
+        """
+        started = time.monotonic()
+        chunk_size = self.chunk_size
+        chunks = [contracts[i:i+chunk_size] for i in range(0, len(contracts), chunk_size)]
+        stats = {"attempts": 0, "errors": 0, "empty": 0, "latencies": [], "last_error": None}
+        
+        dropped = []
+        pending = set(range(len(chunks)))
+        received = 0
+        first_chunk_latency = None
+        completed = False
+        
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = {executor.submit(self._fetch_chunk, api, c, stats): i for i, c in enumerate(chunks)}
+            
+            for future in as_completed(futures):
+                pending.discard(futures[future])
+                res = future.result()
+                if res:
+                    if first_chunk_latency is None:
+                        first_chunk_latency = time.monotonic() - started
+                    received += len(res)
+                    yield futures[future], SnapshotFrame.from_snapshots(res)
+                else:
+                    dropped.append(futures[future])
+            completed = True
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            
+            # 呼叫端提前中斷或例外時也要更新統計，避免沿用上一輪的 report
+            stats_report = {
+                "chunks": len(chunks),
+                "chunk_size": chunk_size,
+                "max_workers": self.max_workers,
+                "snapshots": received,
+                "dropped": sorted(dropped),
+                "dropped_codes": [c.code for i in sorted(dropped) for c in chunks[i]],
+                "attempts": stats["attempts"],
+                "errors": stats["errors"],
+                "last_error": stats["last_error"],
+                "first_chunk_latency": first_chunk_latency,
+                "elapsed": time.monotonic() - started,
+                "completed": completed,
+                "unfinished": sorted(pending),
+            }
+            if self.adaptive and completed:
+                stats_report["error_rate"], stats_report["avg_latency"] = self._adapt(stats)
+            if report is not None:
+                report.clear()
+                report.update(stats_report)
         
-        for future in as_completed(futures):
-            res = future.result()
-            if res:
-                snapshots.extend(res)
+        if dropped:
+            logger.warning(
+                f"Snapshot fetch dropped {len(dropped)}/{len(chunks)} chunks "
+                f"({len(stats_report['dropped_codes'])} contracts), last error: {stats['last_error']}"
+            )
+
+    def fetch(self, api, contracts, report=None):
+        """
+        抓取所有合約快照
+        
+        Args:
+            report: dict，可選；填入本次統計 (含未取得的批次)
+        
+        Returns:
+            SnapshotFrame
+        """
+        return SnapshotFrame.concat([frame for _, frame in self.iter_fetch(api, contracts, report=report)])
+
+
+# Shared scheduler: adapted chunk size / workers carry over between ticks
+default_scheduler = SnapshotScheduler()
+
+
+def fetch_snapshots_parallel(api, contracts, chunk_size=None, max_workers=None, scheduler=None, report=None):
+    """
+    使用多執行緒並行抓取快照資料
+    
+    Args:
+        api: Shioaji API 實例
+        contracts: Contract 物件列表
+        chunk_size: 固定每批次大小 (指定時停用自適應)
+        max_workers: 固定最大執行緒數 (指定時停用自適應)
+        scheduler: SnapshotScheduler (預設使用共用的 default_scheduler)
+        report: dict，可選；填入本次統計 (未取得的批次見 report["dropped"])
+    
+    Returns:
+        SnapshotFrame: 欄位式快照資料 (抓取完成後一次轉換)
+    """
+    if scheduler is None:
+        if chunk_size is not None or max_workers is not None:
+            scheduler = SnapshotScheduler(
+                chunk_size=chunk_size or default_scheduler.chunk_size,
+                max_workers=max_workers or default_scheduler.max_workers,
+                adaptive=False,
+            )
+        else:
+            scheduler = default_scheduler
     
-    return snapshots
+    return scheduler.fetch(api, contracts, report=report)
@@ -0,0 +1,357 @@
+"""
+Backtest Module
+無 UI、無等待的快速回測：重用 simulation 的回放邏輯與 run_monitoring_iteration 訊號判斷
+每個回測日的候選名單、乖離率、昨高與參考價皆以該日之前的 FinLab 資料重建，避免前視偏差
+"""
+import argparse
+import collections
+import datetime
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import pandas as pd
+import config
+import pre_process
+from .finlab_cache import get_dataset
+from .session_state import MockSessionState
+from .simulation import CumulativeBarEngine, replay_day, fetch_intraday_kbars
+
+logger = logging.getLogger(__name__)
+
+TIMELINE_COLUMNS = ["date", "time", "active", "watchlist", "gap"]
+STATS_COLUMNS = ["date", "total_minutes", "max_active", "max_watchlist", "max_gap",
+                 "triggers", "first_trigger", "last_trigger"]
+EVENT_COLUMNS = ["date", "time", "代碼", "名稱", "現價", "跳空%", "P-Loc", "乖離率", "量能", "特徵"]
+
+
+def run_backtest(kbars_dict, monitoring_list, prev_high_map, bias_map, contract_info, trade_date=None):
+    """
+    回放單日 K 線並收集時間軸與觸發事件
+
+    Args:
+        kbars_dict: Dict[code] -> K 線 DataFrame
+        monitoring_list: 回測標的列表
+        prev_high_map: 昨日最高價字典
+        bias_map: 乖離率字典
+        contract_info: 合約資訊字典
+        trade_date: 回測日期 (寫入結果的 date 欄位)
+
+    Returns:
+        (timeline_df, events_df)
+        - timeline_df: 每分鐘的強勢/觀察/跳空檔數
+        - events_df: 每檔首次進入強勢區的時間點與當下數值
+    """
+    session_state = MockSessionState()
+    session_state.triggered_history = set()
+
+    timeline = []
+    event_parts = []
+
+    if kbars_dict:
+        engine = CumulativeBarEngine(kbars_dict, contract_info)
+        replay = replay_day(engine, monitoring_list, prev_high_map, bias_map, contract_info,
+                            session_state, notify=False)
+
+        for _, timestamp, active_df, watchlist_df, gap_df, new_triggers in replay:
+            timeline.append({
+                "date": trade_date,
+                "time": timestamp,
+                "active": len(active_df),
+                "watchlist": len(watchlist_df),
+                "gap": len(gap_df),
+            })
+            if new_triggers:
+                events = active_df[active_df["代碼"].isin(new_triggers)].drop(columns=["時間"])
+                events.insert(0, "time", timestamp)
+                events.insert(0, "date", trade_date)
+                event_parts.append(events)
+
+    timeline_df = pd.DataFrame(timeline, columns=TIMELINE_COLUMNS)
+    events_df = pd.concat(event_parts, ignore_index=True) if event_parts else pd.DataFrame(columns=EVENT_COLUMNS)
+    return timeline_df, events_df
+
+
+def summarize_backtest(timeline_df, events_df):
+    """
+    回測統計 (與 run_simulation 的結果欄位一致)
+    """
+    return {
+        "total_minutes": len(timeline_df),
+        "max_active": int(timeline_df["active"].max()) if not timeline_df.empty else 0,
+        "max_watchlist": int(timeline_df["watchlist"].max()) if not timeline_df.empty else 0,
+        "max_gap": int(timeline_df["gap"].max()) if not timeline_df.empty else 0,
+        "triggers": len(events_df),
+        "first_trigger": events_df["time"].min() if not events_df.empty else None,
+        "last_trigger": events_df["time"].max() if not events_df.empty else None,
+    }
+
+
+def candidates_as_of(close, high, trade_date):
+    """
+    重建 trade_date 當天盤前的候選清單 (只使用 trade_date 之前的收盤價 / 最高價)
+
+    與 pre_process.get_candidates 相同的選股邏輯，基準日為 trade_date 的前一個交易日。
+
+    Args:
+        close: FinLab 收盤價歷史 (index=日期, columns=代碼)
+        high: FinLab 最高價歷史
+        trade_date: 回測日期 (datetime.date)
+
+    Returns:
+        pd.DataFrame: stock_code, bias, prev_high, strategy_tag, data_date, reference
+        (基準日之前資料不足時為空表)
+    """
+    cutoff = pd.Timestamp(trade_date)
+    window = close.loc[close.index < cutoff].iloc[-pre_process.window_size():]
+    high = high.loc[high.index < cutoff]
+    if window.empty or high.empty or window.index[-1] != high.index[-1]:
+        return pd.DataFrame(columns=["stock_code", "bias", "prev_high", "strategy_tag", "data_date", "reference"])
+
+    window = pre_process.drop_inactive(window)
+    candidates_df = pre_process.select_candidates(window, high.iloc[-1], verbose=False)
+    # 基準日收盤價即為當日參考價 (平盤價)
+    candidates_df["reference"] = window.iloc[-1].reindex(candidates_df["stock_code"]).astype(float).values
+    return candidates_df
+
+
+def day_maps(candidates_df, contract_info):
+    """
+    由單日候選清單取出回測輸入 (代碼、昨高、乖離率、含參考價的合約資訊)
+
+    Returns:
+        (codes, prev_high_map, bias_map, day_info)
+    """
+    codes = candidates_df['stock_code'].astype(str).str.strip().tolist()
+    bias_map = dict(zip(codes, candidates_df['bias']))
+    prev_high_map = dict(zip(codes, candidates_df['prev_high']))
+    day_info = {}
+    for code, reference in zip(codes, candidates_df['reference']):
+        info = dict(contract_info.get(code, {}))
+        info["reference"] = float(reference)
+        day_info[code] = info
+    return codes, prev_high_map, bias_map, day_info
+
+
+def backtest_date(api, target_date, candidates_df, contract_info, codes=None):
+    """
+    抓取指定日期的 K 線並回測
+
+    Args:
+        api: Shioaji API 實例
+        target_date: 回測日期 (datetime.date)
+        candidates_df: 該日的候選清單 (candidates_as_of 的輸出)
+        contract_info: 合約資訊字典
+        codes: 限定回測代碼 (預設為候選清單全部)
+    """
+    all_codes, prev_high_map, bias_map, day_info = day_maps(candidates_df, contract_info)
+    codes = codes or all_codes
+
+    def progress_callback(current, total, message):
+        logger.debug(f"[{current}/{total}] {message}")
+
+    kbars_dict = fetch_intraday_kbars(api, codes, contract_info, target_date, progress_callback=progress_callback)
+    logger.info(f"{target_date}: loaded kbars for {len(kbars_dict)}/{len(codes)} stocks")
+
+    return run_backtest(kbars_dict, codes, prev_high_map, bias_map, day_info, trade_date=target_date)
+
+
+def iter_day_inputs(dated_kbars, candidates_by_date, contract_info):
+    """
+    逐日產生回測輸入 (每日使用各自的候選清單，無 K 線的日期略過)
+
+    dated_kbars 可為逐日下載的 generator，搭配 run_backtest_range 時主行程不需同時持有整段區間的 K 線。
+
+    Args:
+        dated_kbars: Iterable[(date, Dict[code] -> K 線 DataFrame)]
+        candidates_by_date: Dict[date] -> 該日候選清單 (candidates_as_of 的輸出)
+        contract_info: 合約資訊字典 (名稱、has_future)
+
+    Yields:
+        tuple: (date, kbars_dict, monitoring_list, prev_high_map, bias_map, contract_info)
+    """
+    for trade_date, kbars_dict in dated_kbars:
+        if not kbars_dict:
+            continue
+
+        codes, prev_high_map, bias_map, day_info = day_maps(candidates_by_date[trade_date], contract_info)
+        codes = [c for c in codes if c in kbars_dict]
+        yield trade_date, kbars_dict, codes, prev_high_map, bias_map, day_info
+
+
+def _backtest_day(day_input):
+    """
+    單日回測 (ProcessPoolExecutor worker，需為模組層級函數)
+    """
+    trade_date, kbars_dict, monitoring_list, prev_high_map, bias_map, contract_info = day_input
+    timeline_df, events_df = run_backtest(kbars_dict, monitoring_list, prev_high_map, bias_map,
+                                          contract_info, trade_date=trade_date)
+    stats = summarize_backtest(timeline_df, events_df)
+    stats["date"] = trade_date
+    return timeline_df, events_df, stats
+
+
+def run_backtest_range(day_inputs, max_workers=None):
+    """
+    多日平行回測：每個交易日交由一個子行程回放
+
+    day_inputs 邊產生邊送出，同時在途的日數上限為 2 × max_workers，
+    主行程只持有這些日的 K 線與已完成的結果 (結果依日期順序)。
+
+    Args:
+        day_inputs: iter_day_inputs 的輸出 (任意 iterable)
+        max_workers: 子行程數 (預設為 CPU 數；1 則在目前行程依序執行)
+
+    Returns:
+        (timeline_df, events_df, stats_df)
+        - stats_df: 每日統計 (max_active, max_watchlist, 觸發時間...)
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    results = []
+    if max_workers <= 1:
+        for day_input in day_inputs:
+            results.append(_backtest_day(day_input))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            in_flight = collections.deque()
+            for day_input in day_inputs:
+                in_flight.append(executor.submit(_backtest_day, day_input))
+                if len(in_flight) >= 2 * max_workers:
+                    results.append(in_flight.popleft().result())
+            results.extend(future.result() for future in in_flight)
+
+    timelines = [r[0] for r in results if not r[0].empty]
+    events = [r[1] for r in results if not r[1].empty]
+    timeline_df = pd.concat(timelines, ignore_index=True) if timelines else pd.DataFrame(columns=TIMELINE_COLUMNS)
+    events_df = pd.concat(events, ignore_index=True) if events else pd.DataFrame(columns=EVENT_COLUMNS)
+    stats_df = pd.DataFrame([r[2] for r in results], columns=STATS_COLUMNS)
+    return timeline_df, events_df, stats_df
+
+
+def load_price_history(start):
+    """
+    讀取 FinLab 收盤價 / 最高價，涵蓋 start 之前一個完整乖離率視窗
+
+    Returns:
+        (close, high)
+    """
+    lookback = len(pd.bdate_range(start, datetime.date.today())) + pre_process.window_size() + 10
+    close = get_dataset('price:收盤價', lookback=lookback, dtype='float32')
+    high = get_dataset('price:最高價', lookback=lookback)
+    return close, high
+
+
+def trading_days(sessions, start, end):
+    """
+    區間內的交易日：取自 FinLab 收盤價的日期索引 (平日休市不會被當成回測日去抓 K 線)
+
+    Args:
+        sessions: 交易日索引 (例如 load_price_history 的 close.index)
+        start, end: 區間起訖 (含)
+    """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    return [d.date() for d in sessions if start <= d <= end]
+
+
+def save_results(timeline_df, events_df, output_dir, fmt="parquet", stats_df=None):
+    """
+    輸出回測結果 (parquet 或 csv)
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    outputs = [("timeline", timeline_df), ("events", events_df)]
+    if stats_df is not None:
+        outputs.append(("stats", stats_df))
+    paths = []
+    for name, df in outputs:
+        path = output_dir / f"backtest_{name}.{fmt}"
+        if fmt == "parquet":
+            df.to_parquet(path, index=False)
+        else:
+            df.to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GapTrading headless backtest")
+    parser.add_argument("--date", action="append", help="回測日期 YYYY-MM-DD (可重複指定)")
+    parser.add_argument("--start", help="區間回測起始日")
+    parser.add_argument("--end", help="區間回測結束日")
+    parser.add_argument("--workers", type=int, default=None, help="區間回測的子行程數")
+    parser.add_argument("--output", default=str(config.DATA_DIR / "backtest"), help="輸出目錄")
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet")
+    args = parser.parse_args(argv)
+
+    if not args.date and not (args.start and args.end):
+        parser.error("需指定 --date 或 --start/--end")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    from headless_monitor import init_shioaji_headless
+    from .contract_resolver import resolve_contracts
+
+    api = init_shioaji_headless()
+    if not api:
+        logger.error("API initialization failed.")
+        return 1
+
+    try:
+        # 每個回測日以當日之前的歷史重建候選清單 (不使用今天盤前產生的 candidate_list.csv)
+        requested = [datetime.date.fromisoformat(d) for d in args.date or []]
+        pre_process.login_finlab()
+        close, high = load_price_history(datetime.date.fromisoformat(args.start) if args.start else min(requested))
+        if args.start and args.end:
+            target_dates = trading_days(close.index, args.start, args.end)
+        else:
+            sessions = set(close.index.date)
+            target_dates = [d for d in requested if d in sessions]
+            for d in requested:
+                if d not in sessions:
+                    logger.warning(f"{d}: not a trading day in FinLab data, skipped")
+        if not target_dates:
+            logger.error("No trading days to backtest.")
+            return 1
+        candidates_by_date = {d: candidates_as_of(close, high, d) for d in target_dates}
+        del close, high
+        codes = sorted({code for df in candidates_by_date.values() for code in df['stock_code'].astype(str)})
+        _, contract_info = resolve_contracts(api, codes)
+
+        if args.start and args.end:
+            # K 線下載受 API 限制，於主行程依序抓取；每抓完一天即交由子行程回放
+            def dated_kbars():
+                for target_date in target_dates:
+                    day_codes = candidates_by_date[target_date]['stock_code'].astype(str).tolist()
+                    kbars_dict = fetch_intraday_kbars(api, day_codes, contract_info, target_date)
+                    logger.info(f"{target_date}: loaded kbars for {len(kbars_dict)}/{len(day_codes)} stocks")
+                    yield target_date, kbars_dict
+
+            day_inputs = iter_day_inputs(dated_kbars(), candidates_by_date, contract_info)
+            timeline_df, events_df, stats_df = run_backtest_range(day_inputs, max_workers=args.workers)
+            logger.info(f"Backtested {len(stats_df)} days, {len(events_df)} triggers")
+            paths = save_results(timeline_df, events_df, args.output, args.format, stats_df=stats_df)
+        else:
+            timelines, events, stats = [], [], []
+            for target_date in target_dates:
+                timeline_df, events_df = backtest_date(api, target_date, candidates_by_date[target_date],
+                                                       contract_info)
+                day_stats = summarize_backtest(timeline_df, events_df)
+                logger.info(f"{target_date}: {day_stats}")
+                day_stats["date"] = target_date
+                timelines.append(timeline_df)
+                events.append(events_df)
+                stats.append(day_stats)
+
+            events = [df for df in events if not df.empty] or [pd.DataFrame(columns=EVENT_COLUMNS)]
+            paths = save_results(pd.concat(timelines, ignore_index=True), pd.concat(events, ignore_index=True),
+                                 args.output, args.format, stats_df=pd.DataFrame(stats, columns=STATS_COLUMNS))
+        logger.info(f"Saved: {', '.join(str(p) for p in paths)}")
+        return 0
+    finally:
+        api.logout()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
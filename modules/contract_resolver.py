@@ -2,7 +2,170 @@
 Contract Resolver Module
 處理 Shioaji 合約查詢邏輯，支援 TSE/OTC 自動切換
 """
-from typing import List, Dict, Tuple, Any
+import datetime
+import json
+import time
+from typing import List, Dict, Tuple, Any, Optional
+import config
+from .telemetry import tracker
+
+EXCHANGES = ("TSE", "OTC")
+
+# 每日合約索引快取: key = (id(api), 交易日)
+_index_cache = {"key": None, "index": {}}
+
+# 股期清單快取: 依檔案 mtime 失效
+_futures_cache = {"path": None, "mtime": None, "codes": frozenset()}
+
+
+def build_contract_index(api) -> Dict[str, Tuple]:
+    """
+    從合約樹一次建立 code -> (exchange, contract, name, reference) 索引
+    
+    Args:
+        api: Shioaji API 實例
+    
+    Returns:
+        Dict[code] -> (exchange, contract, name, reference)
+    """
+    index = {}
+    for exchange in EXCHANGES:
+        try:
+            group = getattr(api.Contracts.Stocks, exchange)
+            for c in group:
+                code = getattr(c, "code", None)
+                if not code or code in index:
+                    continue
+                index[code] = (exchange, c, c.name, float(c.reference) if c.reference else 0.0)
+        except Exception as e:
+            print(f"⚠️ 建立 {exchange} 合約索引失敗: {e}")
+    return index
+
+
+def save_contract_index(index: Dict[str, Tuple], trading_date: datetime.date, path=None):
+    """
+    將合約索引的靜態資訊 (exchange, name, reference) 寫入磁碟
+    """
+    path = path or config.CONTRACT_INDEX_PATH
+    payload = {
+        "date": trading_date.isoformat(),
+        "contracts": {code: [ex, name, ref] for code, (ex, _, name, ref) in index.items()},
+    }
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+    except Exception as e:
+        print(f"⚠️ 寫入合約索引失敗: {e}")
+
+
+def load_contract_index(trading_date: datetime.date, path=None) -> Optional[Dict[str, Tuple]]:
+    """
+    讀取磁碟上的合約索引 (僅限同一交易日)，Contract 物件於查詢時才綁定
+    
+    Returns:
+        Dict[code] -> (exchange, None, name, reference)，若檔案不存在或已過期則回傳 None
+    """
+    path = path or config.CONTRACT_INDEX_PATH
+    try:
+        if not path.exists():
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        if payload.get("date") != trading_date.isoformat():
+            return None
+        return {code: (ex, None, name, ref) for code, (ex, name, ref) in payload["contracts"].items()}
+    except Exception as e:
+        print(f"⚠️ 讀取合約索引失敗: {e}")
+        return None
+
+
+def get_contract_index(api, persist: bool = False, path=None) -> Dict[str, Tuple]:
+    """
+    取得當日合約索引 (每個 API 實例每個交易日只建立一次)
+    
+    Args:
+        api: Shioaji API 實例
+        persist: 是否使用磁碟快取 (config.CONTRACT_INDEX_PATH)
+        path: 自訂磁碟快取路徑
+    """
+    today = datetime.date.today()
+    key = (id(api), today)
+    if _index_cache["key"] == key:
+        return _index_cache["index"]
+
+    index = load_contract_index(today, path) if persist else None
+    if not index:
+        index = build_contract_index(api)
+        if persist and index:
+            save_contract_index(index, today, path)
+
+    _index_cache["key"] = key
+    _index_cache["index"] = index
+    return index
+
+
+def lookup_contract(api, code: str, index: Optional[Dict[str, Tuple]] = None) -> Optional[Tuple]:
+    """
+    查詢單一代碼的合約 (索引命中為 O(1)，未命中才逐一嘗試 TSE/OTC)
+    
+    Returns:
+        (exchange, contract, name, reference) 或 None
+    """
+    if index is None:
+        index = get_contract_index(api)
+
+    entry = index.get(code)
+    if entry is not None and entry[1] is not None:
+        return entry
+
+    # 索引未命中 (或由磁碟載入尚未綁定 Contract 物件)
+    exchanges = (entry[0],) if entry is not None else EXCHANGES
+    for exchange in exchanges:
+        c = getattr(getattr(api.Contracts.Stocks, exchange), f"{exchange}{code}", None)
+        if c:
+            entry = (exchange, c, c.name, float(c.reference) if c.reference else 0.0)
+            index[code] = entry
+            return entry
+    return None
+
+
+def load_futures_codes(csv_path=None, show_warnings: bool = False) -> frozenset:
+    """
+    讀取股票期貨清單，回傳有股期的股票代碼集合
+    
+    結果依檔案 mtime 快取於模組層級，檔案未變更時不再重新讀檔。
+    
+    Args:
+        csv_path: 期貨清單路徑 (預設 config.STOCK_FUTURES_LIST_PATH)
+        show_warnings: 是否顯示警告訊息
+    """
+    csv_path = csv_path or config.STOCK_FUTURES_LIST_PATH
+    try:
+        if not csv_path.exists():
+            if show_warnings:
+                print(f"⚠️ 無法找到期貨清單檔案: {csv_path}")
+            return frozenset()
+
+        mtime = csv_path.stat().st_mtime_ns
+        if _futures_cache["path"] == str(csv_path) and _futures_cache["mtime"] == mtime:
+            return _futures_cache["codes"]
+
+        import pandas as pd
+        df = pd.read_csv(csv_path)
+
+        # The CSV header has newlines which might be tricky in pandas.
+        # Access columns by position: Col 0 = Code, Col 2 = Future Flag ("●")
+        has_future = df.iloc[:, 2].astype(str).str.contains("●", regex=False)
+        codes = frozenset(df.iloc[:, 0][has_future].astype(str).str.strip())
+
+        _futures_cache.update(path=str(csv_path), mtime=mtime, codes=codes)
+        return codes
+
+    except Exception as e:
+        if show_warnings:
+            print(f"⚠️ 讀取期貨清單失敗: {e}")
+        return frozenset()
 
 
 def resolve_contracts(api, stock_codes: List[str], show_warnings: bool = False) -> Tuple[List, Dict]:
@@ -19,62 +182,27 @@ def resolve_contracts(api, stock_codes: List[str], show_warnings: bool = False)
         - contracts: Contract 物件列表
         - contract_info: Dict[code] -> {name, reference}
     """
+    start = time.perf_counter()
     contracts = []
     contract_info = {}
     failed_codes = []
     
-    # 1. Build a set of stocks that have futures (From Local CSV)
-    stocks_with_futures = set()
-    try:
-        import pandas as pd
-        from pathlib import Path
-        
-        # Path to the CSV (Assuming it is in data/stock_futures_list.csv relative to project root)
-        # Check commonly known relative paths
-        csv_path = Path(__file__).resolve().parent.parent / "data" / "stock_futures_list.csv"
-        
-        if csv_path.exists():
-            # Read CSV
-            df = pd.read_csv(csv_path)
-            
-            # Clean column names (remove newlines and spaces for safety, or access by index)
-            # The CSV header has newlines which might be tricky in pandas.
-            # Let's inspect columns by index to be safe: Col 0 = Code, Col 2 = Future Flag
-            
-            # Iterate rows
-            for _, row in df.iterrows():
-                # Check 3rd column (index 2) for "●" or non-empty
-                # Use .iloc just to be safe about column naming quirks
-                has_future_flag = str(row.iloc[2]).strip()
-                if "●" in has_future_flag:
-                    # Clean code (remove non-digits if any, though likely clean)
-                    code_str = str(row.iloc[0]).strip()
-                    stocks_with_futures.add(code_str)
-        else:
-            if show_warnings:
-                print(f"⚠️ 無法找到期貨清單檔案: {csv_path}")
+    # 1. Set of stocks that have futures (From Local CSV, memoized by mtime)
+    stocks_with_futures = load_futures_codes(show_warnings=show_warnings)
 
-    except Exception as e:
-        if show_warnings:
-            print(f"⚠️ 讀取期貨清單失敗: {e}")
+    index = get_contract_index(api)
 
     for code in stock_codes:
         try:
-            # Try TSE first (上市)
-            symbol = f"TSE{code}"
-            c = getattr(api.Contracts.Stocks.TSE, symbol, None)
-            
-            if not c:
-                # Try OTC (上櫃)
-                symbol = f"OTC{code}"
-                c = getattr(api.Contracts.Stocks.OTC, symbol, None)
+            entry = lookup_contract(api, code, index)
             
-            if c:
+            if entry:
+                _, c, name, reference = entry
                 contracts.append(c)
                 has_fut = code in stocks_with_futures
                 contract_info[code] = {
-                    "name": c.name,
-                    "reference": float(c.reference) if c.reference else 0.0,
+                    "name": name,
+                    "reference": reference,
                     "has_future": has_fut
                 }
             else:
@@ -92,4 +220,6 @@ def resolve_contracts(api, stock_codes: List[str], show_warnings: bool = False)
         if len(failed_codes) > 10:
             print(f"   ... 及其他 {len(failed_codes) - 10} 檔")
     
+    tracker.record("resolve_contracts", time.perf_counter() - start,
+                   codes=len(stock_codes), failed=len(failed_codes))
     return contracts, contract_info
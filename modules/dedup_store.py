@@ -0,0 +1,91 @@
+"""
+Dedup Store Module
+通知去重紀錄：以 (交易日, 代碼) 為鍵存於 SQLite，程式重啟後仍不會重複推播
+"""
+import datetime
+import sqlite3
+import threading
+from pathlib import Path
+import config
+
+
+class SentStore:
+    """
+    當日已通知代碼集合 (取代記憶體中的 sent_today set)
+
+    - 查詢走記憶體中的當日集合 (O(1))，新增時同步寫入 SQLite
+    - 啟動時載入當日紀錄；跨日自動切換並清除 keep_days 以前的紀錄
+
+    Args:
+        path: SQLite 檔案路徑 (預設 config.NOTIFY_DEDUP_PATH)；":memory:" 則不落地
+        keep_days: 保留天數
+    """
+
+    def __init__(self, path=None, keep_days=7):
+        self.path = str(path or config.NOTIFY_DEDUP_PATH)
+        self.keep_days = keep_days
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sent ("
+            " trade_date TEXT NOT NULL,"
+            " code TEXT NOT NULL,"
+            " sent_at TEXT NOT NULL,"
+            " PRIMARY KEY (trade_date, code))"
+        )
+        self._conn.commit()
+        self.trade_date = None
+        self._codes = set()
+        self._rollover()
+
+    def _rollover(self, today=None):
+        """
+        交易日切換：載入當日紀錄並清除過期資料
+        """
+        today = today or datetime.date.today()
+        if today == self.trade_date:
+            return
+        cutoff = (today - datetime.timedelta(days=self.keep_days)).isoformat()
+        rows = self._conn.execute("SELECT code FROM sent WHERE trade_date = ?", (today.isoformat(),)).fetchall()
+        self._conn.execute("DELETE FROM sent WHERE trade_date < ?", (cutoff,))
+        self._conn.commit()
+        self.trade_date = today
+        self._codes = {code for (code,) in rows}
+
+    def __contains__(self, code):
+        with self._lock:
+            self._rollover()
+            return code in self._codes
+
+    def __len__(self):
+        with self._lock:
+            self._rollover()
+            return len(self._codes)
+
+    def add(self, code):
+        with self._lock:
+            self._rollover()
+            if code in self._codes:
+                return
+            self._conn.execute(
+                "INSERT OR IGNORE INTO sent (trade_date, code, sent_at) VALUES (?, ?, ?)",
+                (self.trade_date.isoformat(), code, datetime.datetime.now().isoformat(timespec="seconds")),
+            )
+            self._conn.commit()
+            self._codes.add(code)
+
+    def clear(self):
+        """
+        清除當日紀錄 (手動重置)
+        """
+        with self._lock:
+            self._rollover()
+            self._conn.execute("DELETE FROM sent WHERE trade_date = ?", (self.trade_date.isoformat(),))
+            self._conn.commit()
+            self._codes.clear()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,186 @@
+"""
+FinLab Cache Module
+FinLab 資料表本地快取：Parquet 存檔，每個資料表每天最多下載一次，之後以 memory map 讀取
+"""
+import datetime
+import json
+import logging
+import threading
+from pathlib import Path
+import pandas as pd
+import config
+
+logger = logging.getLogger(__name__)
+
+# 同一行程內的重複讀取直接共用: (root, name, lookback, columns, dtype) -> (meta, DataFrame)
+_memory_cache = {}
+_lock = threading.Lock()
+
+
+def expected_data_date(now=None):
+    """
+    此刻 FinLab 應已提供的最新交易日
+
+    收盤資料於 config.FINLAB_UPDATE_TIME 後更新；之前則為前一個平日 (休市日由 fetched_at 避免重抓)
+    """
+    now = now or datetime.datetime.now()
+    day = now.date()
+    if day.weekday() < 5 and now.time() >= config.FINLAB_UPDATE_TIME:
+        return day
+    day -= datetime.timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= datetime.timedelta(days=1)
+    return day
+
+
+def _paths(name, root):
+    stem = name.replace(":", "__").replace("/", "_")
+    return root / f"{stem}.parquet", root / f"{stem}.json"
+
+
+def _covers(meta, lookback):
+    """
+    快取是否已涵蓋所需天數 (rows 為 None 代表存的是完整資料表)
+    """
+    rows = meta.get("rows")
+    return rows is None or (lookback is not None and rows >= lookback)
+
+
+def _fetch_start(lookback, now):
+    """
+    下載起始日：lookback 個交易日換算成日曆天 (每週 5 個交易日) 並預留連假緩衝
+    """
+    if not lookback:
+        return None
+    return expected_data_date(now) - datetime.timedelta(days=lookback * 7 // 5 + 30)
+
+
+def _is_fresh(meta, now):
+    """
+    快取已涵蓋應有的最新交易日，或下載時應有的最新交易日與現在相同
+    (休市日資料不會更新，不需重抓；盤前抓的資料在 FINLAB_UPDATE_TIME 後即過期)
+    """
+    if not meta:
+        return False
+    expected = expected_data_date(now)
+    last_date = meta.get("last_date")
+    if last_date is not None and last_date >= expected.isoformat():
+        return True
+    fetched_at = meta.get("fetched_at")
+    return fetched_at is not None and expected_data_date(datetime.datetime.fromisoformat(fetched_at)) >= expected
+
+
+def _fetch_from_finlab(name, start=None):
+    from finlab import data
+    if start is None:
+        return data.get(name)
+    # truncate_start 為 finlab 模組層級設定，僅在本次下載期間生效 (呼叫端持有 _lock)
+    previous = data.truncate_start
+    data.truncate_start = start.isoformat()
+    try:
+        return data.get(name)
+    finally:
+        data.truncate_start = previous
+
+
+def _slim(df, lookback=None, columns=None, dtype=None):
+    """
+    只保留最近 lookback 天、指定代碼，並轉換 dtype
+    """
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    if lookback:
+        df = df.iloc[-lookback:]
+    if dtype is not None:
+        df = df.astype(dtype)
+    return df
+
+
+def _read_cached(path, lookback=None, columns=None):
+    """
+    以 memory map 開啟 Parquet，只解碼涵蓋最近 lookback 天的 row group 與指定欄位
+    """
+    import pyarrow.parquet as pq
+
+    pf = pq.ParquetFile(path, memory_map=True)
+    groups = list(range(pf.num_row_groups))
+    if lookback:
+        rows = 0
+        first = len(groups)
+        while first > 0 and rows < lookback:
+            first -= 1
+            rows += pf.metadata.row_group(first).num_rows
+        groups = groups[first:]
+    if columns is not None:
+        available = set(pf.schema_arrow.names)
+        columns = [c for c in columns if c in available]
+    table = pf.read_row_groups(groups, columns=columns, use_pandas_metadata=True)
+    return table.to_pandas()
+
+
+def get_dataset(name, root=None, fetcher=None, now=None, lookback=None, columns=None, dtype=None):
+    """
+    取得 FinLab 資料表 (優先使用本地快取)
+
+    Args:
+        name: 資料表名稱，例如 'price:收盤價'
+        root: 快取目錄 (預設 config.FINLAB_CACHE_DIR)
+        fetcher: 下載函式 fetcher(name, start) (預設 finlab.data.get，start 以 truncate_start 限制下載範圍)
+        now: 目前時間 (測試用)
+        lookback: 只下載 / 保存 / 回傳最近 N 個交易日
+        columns: 只回傳指定代碼 (快取仍存完整代碼，讓不同呼叫端共用同一份資料表)
+        dtype: 轉換數值型別 (例如 'float32')
+
+    Returns:
+        pd.DataFrame (index=日期, columns=代碼)
+    """
+    root = Path(root or config.FINLAB_CACHE_DIR)
+    now = now or datetime.datetime.now()
+    if columns is not None:
+        columns = list(columns)
+    data_path, meta_path = _paths(name, root)
+
+    with _lock:
+        key = (str(root), name, lookback, tuple(columns) if columns is not None else None, str(dtype))
+        cached = _memory_cache.get(key)
+        if cached and _is_fresh(cached[0], now) and _covers(cached[0], lookback):
+            return cached[1]
+
+        meta = None
+        if meta_path.exists() and data_path.exists():
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            except Exception as e:
+                logger.warning(f"Invalid FinLab cache metadata for {name}: {e}")
+
+        if _is_fresh(meta, now) and _covers(meta, lookback):
+            try:
+                df = _slim(_read_cached(data_path, lookback, columns), lookback, columns, dtype)
+                _memory_cache[key] = (meta, df)
+                logger.info(f"FinLab cache hit: {name} (last_date={meta.get('last_date')})")
+                return df
+            except Exception as e:
+                logger.warning(f"Failed to read FinLab cache for {name}: {e}")
+
+        logger.info(f"Fetching FinLab dataset: {name}")
+        df = (fetcher or _fetch_from_finlab)(name, _fetch_start(lookback, now))
+        # 先裁切再存檔：不保存 / 不複製用不到的歷史
+        df = _slim(df, lookback)
+        meta = {
+            "name": name,
+            "fetched_at": now.isoformat(timespec="seconds"),
+            "last_date": pd.Timestamp(df.index[-1]).date().isoformat() if len(df) else None,
+            "rows": lookback or None,
+        }
+        try:
+            root.mkdir(parents=True, exist_ok=True)
+            tmp_path = data_path.with_name(data_path.name + ".tmp")
+            df.to_parquet(tmp_path, row_group_size=config.FINLAB_CACHE_ROW_GROUP_SIZE)
+            tmp_path.replace(data_path)
+            meta_path.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        except Exception as e:
+            logger.warning(f"Failed to write FinLab cache for {name}: {e}")
+
+        df = _slim(df, columns=columns, dtype=dtype)
+        _memory_cache[key] = (meta, df)
+        return df
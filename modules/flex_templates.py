@@ -0,0 +1,293 @@
+"""
+Flex Templates Module
+預先編譯的 LINE Flex 版型：版型只序列化一次，之後每則訊息只填入變動欄位
+"""
+import json
+import re
+
+_SLOT_MARK = "\x00slot:{}\x00"
+# json.dumps 會將 \x00 轉義為 \u0000，以此定位預留欄位
+_SLOT_PATTERN = re.compile(r'"\\u0000slot:(\w+)\\u0000"')
+
+
+class Slot:
+    """版型中的變動欄位 (渲染時以 JSON 值取代)"""
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+
+class RawJSON(str):
+    """已序列化的 JSON 片段 (填入 Slot 時原樣嵌入，不再重新序列化)"""
+    __slots__ = ()
+
+
+def _dumps(value):
+    if isinstance(value, RawJSON):
+        return value
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class FlexTemplate:
+    """
+    將含 Slot 的 dict 樹編譯為 [常數片段, 欄位, 常數片段, ...]，
+    render 時只需序列化欄位值並串接字串
+
+    Args:
+        tree: Flex 版型 (dict / list)，變動處以 Slot("name") 標示
+    """
+
+    def __init__(self, tree):
+        compiled = json.dumps(tree, ensure_ascii=False, separators=(",", ":"),
+                              default=lambda o: _SLOT_MARK.format(o.name))
+        parts = _SLOT_PATTERN.split(compiled)
+        self._literals = parts[0::2]
+        self._slots = parts[1::2]
+        self.slots = frozenset(self._slots)
+
+    def render(self, **values):
+        """
+        填入欄位並回傳 RawJSON (可直接作為另一個版型的欄位值或 HTTP body)
+        """
+        out = [self._literals[0]]
+        for name, literal in zip(self._slots, self._literals[1:]):
+            out.append(_dumps(values[name]))
+            out.append(literal)
+        return RawJSON("".join(out))
+
+
+def raw_list(items):
+    """將多個 RawJSON 串成 JSON 陣列"""
+    return RawJSON("[" + ",".join(items) + "]")
+
+
+# ---------- Messaging API envelopes ----------
+
+PUSH = FlexTemplate({"to": Slot("to"), "messages": Slot("messages")})
+TEXT_MESSAGE = FlexTemplate({"type": "text", "text": Slot("text")})
+FLEX_MESSAGE = FlexTemplate({"type": "flex", "altText": Slot("alt_text"), "contents": Slot("contents")})
+CAROUSEL = FlexTemplate({"type": "carousel", "contents": Slot("contents")})
+
+
+# ---------- Signal bubble (LineNotifier.notify_signal) ----------
+
+def _badge(text, color, width):
+    # text 元件沒有 backgroundColor，以 Box 包住 Text 做出徽章
+    return {
+        "type": "box",
+        "layout": "vertical",
+        "contents": [
+            {"type": "text", "text": text, "color": "#FFFFFF", "size": "xs", "weight": "bold", "align": "center"}
+        ],
+        "backgroundColor": color,
+        "cornerRadius": "2px",
+        "paddingAll": "2px",
+        "width": width,
+        "height": "20px",
+        "justifyContent": "center",
+        "alignItems": "center",
+        "margin": "sm"
+    }
+
+
+FUTURE_BADGE = _badge("期", "#E65100", "20px")
+LONG_BADGE = _badge("多方", "#C62828", "35px")
+
+# 徽章組合固定，預先序列化
+SIGNAL_BADGES = {
+    True: RawJSON(_dumps([FUTURE_BADGE, LONG_BADGE])),
+    False: RawJSON(_dumps([LONG_BADGE])),
+}
+
+SIGNAL_BUBBLE = FlexTemplate({
+    "type": "bubble",
+    "size": Slot("size"),
+    "header": {
+        "type": "box",
+        "layout": "vertical",
+        "contents": [
+            {
+                "type": "box",
+                "layout": "horizontal",
+                "contents": [
+                    {"type": "text", "text": "🚨 訊號觸發", "color": "#ffffff", "weight": "bold", "size": "lg"},
+                    {"type": "text", "text": Slot("time"), "color": "#ffffff", "size": "sm",
+                     "align": "end", "gravity": "center"}
+                ]
+            }
+        ],
+        "backgroundColor": Slot("header_color"),
+        "paddingAll": "12px"
+    },
+    "body": {
+        "type": "box",
+        "layout": "vertical",
+        "contents": [
+            {
+                "type": "box",
+                "layout": "horizontal",
+                "contents": [
+                    {"type": "text", "text": Slot("title"), "weight": "bold", "size": "xl", "flex": 1,
+                     "color": "#000000"}
+                ],
+                "alignItems": "center"
+            },
+            {"type": "box", "layout": "horizontal", "contents": Slot("badges"), "margin": "sm"},
+            {"type": "separator", "margin": "md", "color": "#BDBDBD"},
+            {
+                "type": "box",
+                "layout": "vertical",
+                "margin": "md",
+                "spacing": "sm",
+                "contents": [
+                    {
+                        "type": "box",
+                        "layout": "baseline",
+                        "contents": [
+                            {"type": "text", "text": "現價", "color": "#757575", "size": "sm", "flex": 2},
+                            {"type": "text", "text": Slot("price"), "weight": "bold", "size": "lg", "flex": 4,
+                             "color": "#D32F2F"},
+                            {"type": "text", "text": Slot("gap"), "size": "sm", "color": "#D32F2F", "flex": 3,
+                             "align": "end"}
+                        ]
+                    },
+                    {
+                        "type": "box",
+                        "layout": "baseline",
+                        "contents": [
+                            {"type": "text", "text": "P-Loc", "color": "#757575", "size": "sm", "flex": 2},
+                            {"type": "text", "text": Slot("p_loc"), "weight": "bold", "size": "md", "flex": 4,
+                             "color": Slot("p_loc_color")}
+                        ]
+                    },
+                    {
+                        "type": "box",
+                        "layout": "baseline",
+                        "contents": [
+                            {"type": "text", "text": "量能", "color": "#757575", "size": "sm", "flex": 2},
+                            {"type": "text", "text": Slot("volume"), "size": "sm", "flex": 4, "color": "#424242"},
+                            {"type": "text", "text": Slot("amount"), "size": "sm", "flex": 3, "align": "end",
+                             "color": "#616161"}
+                        ]
+                    }
+                ]
+            }
+        ]
+    },
+    "footer": {
+        "type": "box",
+        "layout": "vertical",
+        "contents": [
+            {
+                "type": "button",
+                "action": {"type": "uri", "label": "查看 K 線圖 (Trend)", "uri": Slot("chart_uri")},
+                "style": "secondary",
+                "height": "sm",
+                "color": "#E0E0E0"
+            }
+        ],
+        "paddingAll": "10px"
+    },
+    "styles": {"footer": {"separator": False}}
+})
+
+
+def signal_values(stock_code, name, price, gap, p_loc, volume, amount, has_future, time_str):
+    """
+    計算訊號 bubble 的欄位值 (顏色規則與文字格式)
+    """
+    amt_e = round(amount / 100_000_000, 2)
+    gap_pct = round(gap * 100, 2)
+    return {
+        "time": time_str,
+        # High urgency Red if >3%, else Orange
+        "header_color": "#D32F2F" if gap_pct >= 3 else "#F57C00",
+        "title": f"{stock_code} {name}",
+        "badges": SIGNAL_BADGES[bool(has_future)],
+        "price": f"{price}",
+        "gap": f"(+{gap_pct}%)",
+        "p_loc": f"{p_loc:.2f}",
+        # Green for strong, Blue for normal
+        "p_loc_color": "#2E7D32" if p_loc > 0.8 else "#1976D2",
+        "volume": f"{int(volume):,}張",
+        "amount": f"({amt_e}億)",
+        "chart_uri": f"https://www.cnyes.com/twstock/{stock_code}/charts/technical-history",
+    }
+
+
+# ---------- TSMC ADR premium bubble (TSMPremiumMonitor.send_notification) ----------
+
+def _kv_row(label, key):
+    return {
+        "type": "box",
+        "layout": "horizontal",
+        "contents": [
+            {"type": "text", "text": label, "size": "sm", "color": "#555555", "flex": 1},
+            {"type": "text", "text": Slot(key), "size": "sm", "weight": "bold", "align": "end", "flex": 1}
+        ]
+    }
+
+
+TSM_PREMIUM_BUBBLE = FlexTemplate({
+    "type": "bubble",
+    "body": {
+        "type": "box",
+        "layout": "vertical",
+        "contents": [
+            {"type": "text", "text": "TSMC ADR 溢價監控", "weight": "bold", "size": "xl", "color": "#1DB446"},
+            {"type": "separator", "margin": "md"},
+            # Section 1: Data
+            {
+                "type": "box",
+                "layout": "vertical",
+                "margin": "md",
+                "contents": [
+                    _kv_row("TSM Close", "tsm_price"),
+                    _kv_row("USD/TWD", "twd_rate"),
+                    _kv_row("2330 Close", "tw_price"),
+                ]
+            },
+            {"type": "separator", "margin": "md"},
+            # Section 2: Premium & Channel
+            {
+                "type": "box",
+                "layout": "vertical",
+                "margin": "md",
+                "contents": [
+                    {"type": "text", "text": Slot("premium"), "size": "xl", "weight": "bold", "align": "center",
+                     "color": Slot("theme_color")},
+                    {"type": "text", "text": Slot("channel"), "size": "xxs", "color": "#aaaaaa", "align": "center",
+                     "margin": "sm"}
+                ]
+            },
+            {"type": "separator", "margin": "md"},
+            # Section 3: Advice
+            {
+                "type": "box",
+                "layout": "vertical",
+                "margin": "md",
+                "contents": [
+                    {"type": "text", "text": Slot("advice"), "weight": "bold", "size": "md",
+                     "color": Slot("theme_color"), "wrap": True},
+                    {"type": "text", "text": Slot("desc"), "size": "sm", "color": "#666666", "wrap": True,
+                     "margin": "sm"}
+                ]
+            },
+            # Section 4: Risk
+            {
+                "type": "box",
+                "layout": "vertical",
+                "margin": "md",
+                "backgroundColor": "#FFEBEE",
+                "cornerRadius": "md",
+                "paddingAll": "md",
+                "contents": [
+                    {"type": "text", "text": "風險預警", "weight": "bold", "size": "xs", "color": "#D32F2F"},
+                    {"type": "text", "text": "停損參考 (MDD): 多 -2.02% / 空 -2.75%", "size": "xxs",
+                     "color": "#D32F2F", "wrap": True}
+                ]
+            }
+        ]
+    }
+})
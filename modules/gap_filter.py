@@ -2,11 +2,78 @@
 Gap Filter Module
 處理開盤跳空篩選邏輯
 """
+import numpy as np
 import pandas as pd
-import streamlit as st
-import datetime
+import config
 from .contract_resolver import resolve_contracts
 from .api_manager import fetch_snapshots_parallel
+from .tick_clock import TickClock, ts_to_time_str
+
+
+GAP_COLUMNS = ["代碼", "名稱", "策略", "開盤", "昨收", "漲幅%", "資料時間"]
+
+
+def format_strategy_tag(raw_tag, sep=" + "):
+    """
+    盤前策略標籤轉為顯示文字 (bias|ma_conv -> 低基期 + 均線糾結)
+    """
+    if not isinstance(raw_tag, str):
+        return ""
+    return raw_tag.replace("bias", "低基期").replace("ma_conv", "均線糾結").replace("|", sep)
+
+
+def screen_gaps(snapshots, contract_info, clock=None, threshold=config.GAP_THRESHOLD,
+                check_freshness=True, strategy_map=None):
+    """
+    向量化開盤跳空篩選：開盤價相對參考價 (昨收) 漲幅 >= threshold
+
+    Args:
+        snapshots: SnapshotFrame
+        contract_info: Dict[code] -> {name, reference}
+        clock: TickClock (資料日期核對用，預設為現在時間)
+        threshold: 跳空門檻 (比例，預設 config.GAP_THRESHOLD)
+        check_freshness: 是否過濾非今日的快照 (模擬環境關閉)
+        strategy_map: Dict[code] -> strategy_tag (可選，填入「策略」欄)
+
+    Returns:
+        (gap_list, gap_df, stale_count)
+        - gap_list: 符合條件的代碼 (依快照順序)
+        - gap_df: GAP_COLUMNS 數值表 (漲幅% 為比例，顯示格式於繪製時套用)
+        - stale_count: 被過濾的非今日快照筆數
+    """
+    clock = clock or TickClock()
+    n = len(snapshots)
+    codes = np.asarray(snapshots.codes, dtype=object)
+    ts_arr = snapshots["ts"]
+    open_arr = snapshots["open"]
+
+    if check_freshness:
+        fresh = clock.is_today(ts_arr)
+    else:
+        fresh = np.ones(n, dtype=bool)
+    stale_count = int(n - fresh.sum())
+
+    # Use Static Reference from Contract
+    infos = [contract_info.get(code, {}) for code in codes]
+    ref_arr = np.fromiter((info.get("reference", 0.0) for info in infos), dtype=np.float64, count=n)
+
+    valid = fresh & (ref_arr > 0) & (open_arr > 0)
+    pct = np.zeros(n, dtype=np.float64)
+    np.divide(open_arr - ref_arr, ref_arr, out=pct, where=valid)
+    hit = np.flatnonzero(valid & (pct >= threshold))
+
+    gap_list = codes[hit].tolist()
+    strategy_map = strategy_map or {}
+    gap_df = pd.DataFrame({
+        "代碼": codes[hit],
+        "名稱": np.array([infos[i].get("name", codes[i]) for i in hit], dtype=object),
+        "策略": np.array([format_strategy_tag(strategy_map.get(codes[i], "")) for i in hit], dtype=object),
+        "開盤": open_arr[hit],
+        "昨收": ref_arr[hit],
+        "漲幅%": pct[hit],
+        "資料時間": np.array([ts_to_time_str(ts) for ts in ts_arr[hit].tolist()], dtype=object),
+    }, columns=GAP_COLUMNS)
+    return gap_list, gap_df, stale_count
 
 
 def run_gap_filter(api, candidate_list_path, status_widget=None):
@@ -45,72 +112,40 @@ def run_gap_filter(api, candidate_list_path, status_widget=None):
     
     # Step 3: Fetch Snapshots
     write_status(f"☁️ 正在抓取個股報價 (Snapshots，共 {len(contracts)} 檔)...")
-    snapshots = fetch_snapshots_parallel(api, contracts, chunk_size=300, max_workers=2)
+    fetch_report = {}
+    snapshots = fetch_snapshots_parallel(api, contracts, report=fetch_report)
     
     if not snapshots:
         write_status("⚠️ 取得 0 筆行情，可能是非盤中時間")
         return [], pd.DataFrame()
     
     write_status(f"✅ 成功取得 {len(snapshots)} 筆行情資料")
+    dropped_codes = fetch_report.get("dropped_codes", [])
+    if dropped_codes:
+        write_status(f"⚠️ {len(dropped_codes)} 檔行情抓取失敗 (已重試): {', '.join(dropped_codes[:10])}")
     
     # Step 4: Filter Logic
     write_status("⚡ 執行跳空邏輯運算...")
     
     # 防呆機制 1: 時間檢查
-    now = datetime.datetime.now()
-    if now.time() < datetime.time(9, 0, 0):
-        write_status(f"⚠️ 注意: 目前時間 {now.strftime('%H:%M')} 尚未開盤 (09:00)，過濾器將嚴格檢查資料日期")
-
-    gap_list = []
-    gap_data = []
-    stale_count = 0
-    today_str = now.strftime('%Y-%m-%d')
+    clock = TickClock()
+    if clock.before(9, 0, 0):
+        write_status(f"⚠️ 注意: 目前時間 {clock.now.strftime('%H:%M')} 尚未開盤 (09:00)，過濾器將嚴格檢查資料日期")
+
+    today_str = clock.today.isoformat()
     
     # Create lookup map for strategy tags
     strategy_map = dict(zip(candidates_df['stock_code'].astype(str), candidates_df['strategy_tag']))
 
-    for snap in snapshots:
-        # 防呆機制 2: 資料日期核對 (Data Freshness Check)
-        # Snapshot ts is in nanoseconds
-        ts_date = datetime.datetime.fromtimestamp(snap.ts / 1_000_000_000).strftime('%Y-%m-%d')
-        
-        # 只有在非模擬模式下，才強制過濾過期資料
-        if not api.simulation and ts_date != today_str:
-            stale_count += 1
-            continue
-
-        code = snap.code
-        open_ = snap.open
-        
-        # Use Static Reference from Contract
-        info = contract_info.get(code, {})
-        ref_price = info.get("reference", 0.0)
-        name = info.get("name", code)
-        
-        if ref_price > 0 and open_ > 0:
-            pct = (open_ - ref_price) / ref_price
-            if pct >= 0.01:
-                gap_list.append(code)
-                
-                # Get strategy tag and format it
-                raw_tag = strategy_map.get(code, "")
-                tag_display = raw_tag.replace("bias", "低基期").replace("ma_conv", "均線糾結").replace("|", " + ")
-
-                gap_data.append({
-                    "代碼": code,
-                    "名稱": name,
-                    "策略": tag_display,
-                    "開盤": open_,
-                    "昨收": ref_price,
-                    "漲幅%": f"{pct*100:.2f}%",
-                    "資料時間": str(datetime.datetime.fromtimestamp(snap.ts / 1_000_000_000).time())
-                })
+    # 防呆機制 2: 資料日期核對 (Data Freshness Check)
+    # 只有在非模擬模式下，才強制過濾過期資料
+    gap_list, gap_df, stale_count = screen_gaps(snapshots, contract_info, clock=clock,
+                                                check_freshness=not api.simulation,
+                                                strategy_map=strategy_map)
     
     if stale_count > 0:
         write_status(f"🛡️ 已自動過濾 {stale_count} 筆非今日 ({today_str}) 之過期資料")
     
-    gap_df = pd.DataFrame(gap_data)
-    
     if gap_df.empty and stale_count > 0:
          write_status(f"✅ 篩選完成! (過濾掉所有舊資料，目前無今日跳空標的)")
     else:
@@ -0,0 +1,81 @@
+"""
+Kbar Store Module
+本地 K 線快取：以 (代碼, 日期) 為鍵將 1 分 K 存成 Parquet，歷史日期只需下載一次
+"""
+import datetime
+import importlib.util
+from pathlib import Path
+import pandas as pd
+import config
+
+KBAR_COLUMNS = ["ts", "Open", "High", "Low", "Close", "Volume", "Amount"]
+
+# 未安裝 pyarrow 時退回 pickle (同樣保留 dtype，僅檔案較大)
+_HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+
+class KbarStore:
+    """
+    以 {root}/{YYYY-MM-DD}/{code}.parquet 儲存單日 K 線
+
+    - 僅快取已收盤的歷史日期 (當日資料仍在變動)
+    - 空資料不寫入：API 偶發回傳空值時不能永久蓋掉該 (代碼, 日期)，下次執行會重新查詢
+
+    Args:
+        root: 快取根目錄 (預設 config.KBAR_CACHE_DIR)
+    """
+
+    def __init__(self, root=None):
+        self.root = Path(root or config.KBAR_CACHE_DIR)
+        self.suffix = ".parquet" if _HAS_PYARROW else ".pkl"
+
+    def path(self, code, target_date):
+        return self.root / target_date.isoformat() / f"{code}{self.suffix}"
+
+    @staticmethod
+    def cacheable(target_date):
+        """
+        只有今天以前的交易日資料不會再變動
+        """
+        return target_date < datetime.date.today()
+
+    def get(self, code, target_date):
+        """
+        讀取快取
+
+        Returns:
+            pd.DataFrame，未快取 (或舊版留下的空檔) 則回傳 None
+        """
+        path = self.path(code, target_date)
+        if not path.exists():
+            return None
+        try:
+            if _HAS_PYARROW:
+                df = pd.read_parquet(path)
+            else:
+                df = pd.read_pickle(path)
+        except Exception as e:
+            print(f"⚠️ 讀取 K 線快取失敗 ({code} {target_date}): {e}")
+            return None
+        return df if not df.empty else None
+
+    def put(self, code, target_date, df):
+        """
+        寫入快取 (非歷史日期與空資料略過)；寫入暫存檔後再改名，避免中斷時留下半個檔案
+        """
+        if not self.cacheable(target_date) or df is None or df.empty:
+            return
+        path = self.path(code, target_date)
+        tmp_path = path.with_name(path.name + ".tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if _HAS_PYARROW:
+                df.to_parquet(tmp_path, index=False)
+            else:
+                df.to_pickle(tmp_path)
+            tmp_path.replace(path)
+        except Exception as e:
+            print(f"⚠️ 寫入 K 線快取失敗 ({code} {target_date}): {e}")
+
+
+default_store = KbarStore()
@@ -2,13 +2,21 @@
 Monitor Loop Module
 處理主監控回圈邏輯
 """
-import datetime
+import time
+import numpy as np
 import pandas as pd
 import strategy
 from line_notifier import notifier
+from .snapshot_frame import SnapshotFrame
+from .api_manager import default_scheduler
+from .telemetry import tracker, tick_span
+from .tick_clock import TickClock
 
+MONITOR_COLUMNS = ["時間", "代碼", "名稱", "現價", "跳空%", "P-Loc", "乖離率", "量能", "特徵"]
 
-def run_monitoring_iteration(api, monitoring_list, prev_high_map, bias_map, contract_info, snapshots, session_state):
+
+def run_monitoring_iteration(api, monitoring_list, prev_high_map, bias_map, contract_info, snapshots, session_state,
+                             notify=True, clock=None):
     """
     執行一次監控掃描迭代
     
@@ -18,89 +26,149 @@ def run_monitoring_iteration(api, monitoring_list, prev_high_map, bias_map, cont
         prev_high_map: Dict[code] -> prev_high
         bias_map: Dict[code] -> bias
         contract_info: Dict[code] -> {name, reference}
-        snapshots: 快照資料列表
+        snapshots: SnapshotFrame (或快照資料列表，會自動轉換)
         session_state: Streamlit session state
+        notify: 是否發送 LINE 通知 (回測時關閉)
+        clock: TickClock (同一輪掃描的各批次共用；預設為現在時間)
     
     Returns:
         (active_df, watchlist_df, gap_df)
+        三者皆為同一張數值表 (MONITOR_COLUMNS) 依布林遮罩取出的檢視；
+        跳空% / 乖離率為比例 (0.05 = 5%)、量能為整數張數，顯示格式由 ui_components 於繪製時套用
     """
-    active_data = []
-    watchlist_data = []
-    gap_candidates_data = []
-    
     # Initialize triggered_history if not exists
     if 'triggered_history' not in session_state:
         session_state.triggered_history = set()
     
-    for snap in snapshots:
-        code = snap.code
-        
-        # Get contract info
-        info = contract_info.get(code, {})
-        ref_price = info.get("reference", 0.0)
-        name = info.get("name", code)
-        
-        close = snap.close
-        open_ = snap.open
-        high = snap.high
-        low = snap.low
-        vol = snap.total_volume
-        amt = snap.total_amount
-        
-        if close == 0:
-            # No data yet, but still show in gap list
-            row = {
-                "時間": datetime.datetime.now().strftime("%H:%M:%S"),
-                "代碼": code, "名稱": name, "現價": 0, "跳空%": "0.00%", "P-Loc": "0.00", "乖離率": "0.00%", "量能": "0張", "特徵": "等待開盤"
-            }
-            gap_candidates_data.append(row)
+    clock = clock or TickClock()
+    frame = SnapshotFrame.from_snapshots(snapshots)
+    eval_start = time.perf_counter()
+    codes = frame.codes
+    close_arr = frame["close"]
+    open_arr = frame["open"]
+    vol_arr = frame["total_volume"]
+    amt_arr = frame["total_amount"]
+    
+    # Resolve per-row reference data, then evaluate the strategy for the whole set at once
+    infos = [contract_info.get(code, {}) for code in codes]
+    ref_arr = np.array([info.get("reference", 0.0) for info in infos], dtype=np.float64)
+    prev_closes = np.where(ref_arr > 0, ref_arr, close_arr - frame["change_price"])
+    prev_highs = [prev_high_map.get(code, pc) for code, pc in zip(codes, prev_closes)]
+    has_futures = [info.get("has_future", False) for info in infos]
+    
+    criteria = strategy.check_criteria_batch(
+        open_arr,
+        frame["high"],
+        frame["low"],
+        close_arr,
+        vol_arr,
+        amt_arr,
+        prev_highs,
+        has_futures,
+    )
+    build_start = time.perf_counter()
+    tracker.record("evaluate", build_start - eval_start, rows=len(frame))
+    
+    # Typed columns, filled once per tick (no per-row dicts / string formatting)
+    n = len(frame)
+    opened = close_arr != 0
+    gap_arr = np.zeros(n, dtype=np.float64)
+    np.divide(open_arr - prev_closes, prev_closes, out=gap_arr, where=opened & (prev_closes != 0))
+    p_loc_arr = np.where(opened, criteria["p_loc"], 0.0)
+    bias_arr = np.where(opened, np.fromiter((bias_map.get(code, 0) for code in codes), dtype=np.float64, count=n), 0.0)
+    
+    triggered = session_state.triggered_history
+    active_mask = opened & criteria["active"]
+    watchlist_mask = opened & ~active_mask & np.fromiter((code in triggered for code in codes), dtype=bool, count=n)
+    
+    feature_arr = np.empty(n, dtype=object)
+    for i in range(n):
+        if not opened[i]:
+            feature_arr[i] = "等待開盤"
             continue
-        
-        
-        # Get prev_close and prev_high
-        prev_close = ref_price if ref_price > 0 else (close - (snap.change_price or 0))
-        prev_high = prev_high_map.get(code, prev_close)
-        bias_val = bias_map.get(code, 0)
-        has_future = info.get("has_future", False)
-        
-        # Check criteria using strategy module
-        is_active, features, p_loc, cond_gap = strategy.check_criteria(snap, prev_high, bias_val, has_future)
-        
-        row = {
-            "時間": datetime.datetime.now().strftime("%H:%M:%S"),
-            "代碼": code,
-            "名稱": name,
-            "現價": close,
-            "跳空%": f"{((open_ - prev_close)/prev_close)*100:.2f}%",
-            "P-Loc": f"{p_loc:.2f}",
-            "乖離率": f"{bias_val:.2%}",
-            "量能": f"{int(vol)}張",
-            "特徵": " ".join(features)
-        }
-        
-        # 1. 永遠加入符合跳空區 (固定觀察池)
-        gap_candidates_data.append(row)
-        
-        # 2. 強勢區邏輯 (目前的狀態)
-        if is_active:
-            # 觸發 LINE 通知
-            gap_val = (open_ - prev_close) / prev_close if prev_close != 0 else 0
-            notifier.notify_signal(code, name, close, gap_val, p_loc, vol, amt, has_future)
-            
-            active_data.append(row)
-            session_state.triggered_history.add(code)
-        
-        # 3. 轉弱區邏輯 (曾經符合但目前不符合)
-        elif code in session_state.triggered_history:
-            if not features:
-                row['特徵'] = "(轉弱觀察)"
-            watchlist_data.append(row)
-    
-    # Create DataFrames
-    columns = ["時間", "代碼", "名稱", "現價", "跳空%", "P-Loc", "乖離率", "量能", "特徵"]
-    active_df = pd.DataFrame(active_data) if active_data else pd.DataFrame(columns=columns)
-    watchlist_df = pd.DataFrame(watchlist_data) if watchlist_data else pd.DataFrame(columns=columns)
-    gap_df = pd.DataFrame(gap_candidates_data) if gap_candidates_data else pd.DataFrame(columns=columns)
-    
-    return active_df, watchlist_df, gap_df
+        labels = strategy.feature_labels(criteria["features"][i])
+        if not labels and watchlist_mask[i]:
+            feature_arr[i] = "(轉弱觀察)"
+        else:
+            feature_arr[i] = " ".join(labels)
+    
+    names = np.array([info.get("name", code) for info, code in zip(infos, codes)], dtype=object)
+    monitor_df = pd.DataFrame({
+        "時間": clock.time_str,
+        "代碼": np.asarray(codes, dtype=object),
+        "名稱": names,
+        "現價": close_arr.astype(np.float64, copy=False),
+        "跳空%": gap_arr,
+        "P-Loc": p_loc_arr,
+        "乖離率": bias_arr,
+        "量能": np.where(opened, vol_arr, 0).astype(np.int64),
+        "特徵": feature_arr,
+    }, columns=MONITOR_COLUMNS)
+    
+    # 1. 強勢區 (目前的狀態)：記錄觸發並發送 LINE 通知
+    active_idx = np.flatnonzero(active_mask)
+    triggered.update(codes[i] for i in active_idx)
+    notify_start = time.perf_counter()
+    if notify:
+        for i in active_idx:
+            notifier.notify_signal(codes[i], names[i], close_arr[i].item(), gap_arr[i].item(),
+                                   p_loc_arr[i].item(), vol_arr[i].item(), amt_arr[i].item(), has_futures[i])
+    notify_seconds = time.perf_counter() - notify_start
+    
+    # build_frames 含欄位組裝與 DataFrame 建構 (扣除通知時間)
+    tracker.record("build_frames", notify_start - build_start, rows=n)
+    if notify and len(active_idx):
+        tracker.record("notify", notify_seconds, signals=len(active_idx))
+    
+    # 2. 轉弱區 (曾經符合但目前不符合) / 3. 跳空區 (固定觀察池) 皆為同一張表的檢視
+    return monitor_df[active_mask], monitor_df[watchlist_mask], monitor_df
+
 
+def run_monitoring_pipeline(api, monitoring_list, prev_high_map, bias_map, contract_info, contracts,
+                            session_state, scheduler=None, on_chunk=None, universe=None, report=None):
+    """
+    抓取與評估重疊執行的監控掃描：每個快照批次抵達即執行 run_monitoring_iteration
+    (含 LINE 通知)，首個訊號的延遲取決於最快的批次而非最慢的批次
+    
+    Args:
+        api: Shioaji API 實例
+        monitoring_list: 監控中的股票代碼列表
+        prev_high_map, bias_map, contract_info: 同 run_monitoring_iteration
+        contracts: 要抓取快照的 Contract 物件列表
+        session_state: Streamlit session state
+        scheduler: SnapshotScheduler (預設使用共用的 default_scheduler)
+        on_chunk: 每批次處理後的回調 on_chunk(chunk_id, frame, active_df)，可選
+        universe: UniverseManager，可選；只抓取仍存活的代碼，並以本輪快照剔除已不可能符合條件者
+        report: dict，可選；填入本輪快照抓取統計 (見 SnapshotScheduler.iter_fetch)
+    
+    Returns:
+        (active_df, watchlist_df, gap_df)：所有批次合併結果
+    """
+    scheduler = scheduler or default_scheduler
+    active_parts, watchlist_parts, gap_parts = [], [], []
+    
+    clock = TickClock()
+    if universe is not None:
+        contracts = universe.filter_contracts(contracts)
+        min_ts = None if getattr(api, "simulation", False) else clock.day_start_ns
+    
+    with tick_span(contracts=len(contracts)):
+        for chunk_id, frame in scheduler.iter_fetch(api, contracts, report=report):
+            active_df, watchlist_df, gap_df = run_monitoring_iteration(
+                api, monitoring_list, prev_high_map, bias_map, contract_info, frame, session_state, clock=clock
+            )
+            active_parts.append(active_df)
+            watchlist_parts.append(watchlist_df)
+            gap_parts.append(gap_df)
+            if universe is not None:
+                universe.update(frame, session_state.triggered_history, min_ts=min_ts)
+            if on_chunk:
+                on_chunk(chunk_id, frame, active_df)
+    
+    def merge(parts):
+        parts = [p for p in parts if not p.empty]
+        if not parts:
+            return pd.DataFrame(columns=MONITOR_COLUMNS)
+        return pd.concat(parts, ignore_index=True)
+    
+    return merge(active_parts), merge(watchlist_parts), merge(gap_parts)
@@ -0,0 +1,278 @@
+"""
+Monitor Worker Module
+背景監控執行緒：持有掃描迴圈 (名單、合約、動態樣本只準備一次)，UI 只讀取最新結果重繪
+"""
+import collections
+import datetime
+import logging
+import threading
+import time
+import pandas as pd
+import config
+from .api_manager import default_scheduler
+from .contract_resolver import resolve_contracts
+from .monitor_loop import run_monitoring_pipeline, MONITOR_COLUMNS
+from .universe import UniverseManager
+from .session_state import MockSessionState
+from .telemetry import tracker
+
+logger = logging.getLogger(__name__)
+
+LOG_MAX_LINES = 200
+
+# 每個行程只保留一個監控執行緒 (Streamlit 每個 session / rerun 都會重新執行腳本，不能各自建立)
+_current_worker = None
+_registry_lock = threading.Lock()
+
+
+class MonitorWorker:
+    """
+    盤中監控背景執行緒
+
+    - 啟動時讀取候選清單、建立 bias / prev_high 對照、轉換合約並建立 UniverseManager (只做一次)
+    - 之後每 interval 秒執行一次 run_monitoring_pipeline，結果以 latest() 提供給 UI
+    - 單輪掃描失敗只記錄錯誤，下一輪繼續 (與 headless_monitor 相同)
+    - 每輪掃描前向 api_provider 取得 API (提供者負責健康檢查)；連續失敗
+      config.MONITOR_API_MAX_FAILURES 輪則要求重建連線，換了 API 就重新轉換合約
+
+    Args:
+        api_provider: 取得 API 的函式 api_provider(refresh=False)，於背景執行緒呼叫，
+                      不可使用 st.* (例如 api_manager.ApiProvider)
+        candidate_list_path: 候選清單 CSV 路徑
+        monitoring_list: 監控代碼 (預設為候選清單全部)
+        interval: 掃描週期秒數
+        scheduler: SnapshotScheduler (預設使用共用的 default_scheduler)
+    """
+
+    def __init__(self, api_provider, candidate_list_path, monitoring_list=None,
+                 interval=config.MONITOR_INTERVAL_SECONDS, scheduler=None):
+        self.api_provider = api_provider
+        self.api = None
+        self.candidate_list_path = candidate_list_path
+        self.monitoring_list = list(monitoring_list or [])
+        self.interval = interval
+        self.scheduler = scheduler or default_scheduler
+
+        # Streamlit session_state 只能在腳本執行緒存取，背景執行緒使用自己的 state
+        self.session_state = MockSessionState(triggered_history=set())
+        self.universe = None
+        self._inputs = None
+        self._contracts = None
+        self._failures = 0
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._logs = collections.deque(maxlen=LOG_MAX_LINES)
+        self._latest = {
+            "active_df": pd.DataFrame(columns=MONITOR_COLUMNS),
+            "watchlist_df": pd.DataFrame(columns=MONITOR_COLUMNS),
+            "gap_df": pd.DataFrame(columns=MONITOR_COLUMNS),
+            "fetch_report": {},
+            "universe": None,
+            "updated_at": None,
+            "scan_count": 0,
+            "error": None,
+        }
+
+    # ---------- Lifecycle ----------
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """啟動背景執行緒 (已在執行中則不重複啟動)"""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="monitor-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        要求停止並等待目前這輪掃描結束
+
+        Returns:
+            bool: 執行緒是否已結束
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.running
+
+    # ---------- Results ----------
+
+    def latest(self):
+        """
+        最新一輪掃描結果 (淺拷貝，可在 UI 執行緒安全讀取)
+
+        Returns:
+            dict: active_df, watchlist_df, gap_df, fetch_report, universe (stats),
+                  updated_at, scan_count, error, running
+        """
+        with self._lock:
+            result = dict(self._latest)
+        result["running"] = self.running
+        return result
+
+    def logs(self):
+        """系統訊息 (時間, 等級, 訊息)，最新在後"""
+        with self._lock:
+            return list(self._logs)
+
+    def _log(self, level, message):
+        logger.log(level, message)
+        with self._lock:
+            self._logs.append((datetime.datetime.now().strftime("%H:%M:%S"), logging.getLevelName(level), message))
+
+    # ---------- Scan loop ----------
+
+    def prepare(self):
+        """
+        讀取候選清單並轉換合約 (整個監控期間只執行一次)
+        """
+        candidates_df = pd.read_csv(self.candidate_list_path)
+        stock_codes = candidates_df['stock_code'].astype(str).str.strip().tolist()
+        bias_map = dict(zip(candidates_df['stock_code'].astype(str), candidates_df['bias']))
+
+        if 'prev_high' in candidates_df.columns:
+            prev_high_map = dict(zip(candidates_df['stock_code'].astype(str), candidates_df['prev_high']))
+        else:
+            self._log(logging.WARNING, "監控清單缺少 'prev_high' 欄位，請重新執行盤前運算。目前暫用昨收代替。")
+            prev_high_map = {}
+
+        codes = self.monitoring_list or stock_codes
+        self._inputs = (codes, prev_high_map, bias_map)
+        self._connect()
+        _, contract_info = self._contracts
+        self.universe = UniverseManager(codes, prev_high_map, contract_info)
+        self._log(logging.INFO, f"載入監控名單 {len(codes)} 檔，取得 Contract {len(self._contracts[0])} 筆")
+
+    def _connect(self, refresh=False):
+        """
+        向 api_provider 取得 API；換了新的 API 實例時重新轉換合約
+        """
+        api = self.api_provider(refresh=refresh)
+        if api is None:
+            raise RuntimeError("無法取得可用的 API 連線")
+        if api is self.api:
+            return
+
+        codes = self._inputs[0]
+        contracts, contract_info = resolve_contracts(api, codes)
+        if not contracts:
+            raise RuntimeError(f"找不到任何 Contract 物件 (監控清單: {len(codes)} 筆)")
+        if self.api is not None:
+            self._log(logging.WARNING, "API 連線已重建，重新轉換合約")
+        self.api = api
+        self._contracts = (contracts, contract_info)
+
+    def scan_once(self):
+        """
+        執行一輪掃描並更新最新結果
+        """
+        refresh = self._failures >= config.MONITOR_API_MAX_FAILURES
+        if refresh:
+            self._log(logging.WARNING, f"連續 {self._failures} 輪掃描失敗，重建 API 連線")
+            self._failures = 0
+        self._connect(refresh=refresh)
+
+        codes, prev_high_map, bias_map = self._inputs
+        contracts, contract_info = self._contracts
+        report = {}
+        active_df, watchlist_df, gap_df = run_monitoring_pipeline(
+            self.api,
+            codes,
+            prev_high_map,
+            bias_map,
+            contract_info,
+            contracts,
+            self.session_state,
+            scheduler=self.scheduler,
+            universe=self.universe,
+            report=report
+        )
+        if report.get("dropped"):
+            self._log(logging.WARNING, f"{len(report['dropped'])} 個批次抓取失敗 ({len(report['dropped_codes'])} 檔): "
+                                       f"{', '.join(report['dropped_codes'][:10])}")
+
+        with self._lock:
+            # 0 筆行情時保留上一輪結果 (與原本 UI 行為一致)
+            if report.get("snapshots", 0) > 0:
+                self._latest.update(active_df=active_df, watchlist_df=watchlist_df, gap_df=gap_df)
+            self._latest.update(
+                fetch_report=report,
+                universe=self.universe.stats(),
+                updated_at=datetime.datetime.now(),
+                scan_count=self._latest["scan_count"] + 1,
+                error=None,
+            )
+        self._log(logging.INFO, f"掃描完成: 強勢 {len(active_df)} 檔 | 觀察 {len(watchlist_df)} 檔 | "
+                                f"跳空候選 {len(gap_df)} 檔 | 行情 {report.get('snapshots', 0)} 筆 ({report.get('elapsed', 0):.1f}s)")
+
+    def _set_error(self, message):
+        self._log(logging.ERROR, message)
+        with self._lock:
+            self._latest["error"] = message
+
+    def _run(self):
+        try:
+            self.prepare()
+        except Exception as e:
+            self._set_error(f"監控初始化失敗: {e}")
+            return
+
+        while not self._stop.is_set():
+            start = time.monotonic()
+            try:
+                self.scan_once()
+                self._failures = 0
+            except Exception as e:
+                self._failures += 1
+                self._set_error(f"監控過程發生錯誤: {e}")
+            # 固定週期：扣除本輪掃描耗時
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - start)))
+
+        tracker.log_summary()
+        self._log(logging.INFO, "監控已停止")
+
+
+def current_worker():
+    """
+    目前行程中的監控執行緒 (可能已停止)，尚未啟動過則為 None
+    """
+    return _current_worker
+
+
+def start_worker(worker, timeout=config.MONITOR_STOP_TIMEOUT_SECONDS):
+    """
+    以 worker 取代目前的監控執行緒：先停止並等待舊執行緒結束，再啟動新的
+
+    Args:
+        worker: 新的 MonitorWorker
+        timeout: 等待舊執行緒結束的秒數
+
+    Raises:
+        RuntimeError: 舊執行緒在 timeout 內未結束 (不啟動新的，避免兩個掃描迴圈重疊)
+    """
+    global _current_worker
+    with _registry_lock:
+        previous = _current_worker
+        if previous is not None and previous is not worker and not previous.stop(timeout):
+            raise RuntimeError(f"前一個監控執行緒在 {timeout} 秒內未結束，請稍後再試")
+        _current_worker = worker
+        worker.start()
+    return worker
+
+
+def stop_worker(timeout=config.MONITOR_STOP_TIMEOUT_SECONDS):
+    """
+    停止目前的監控執行緒並等待本輪掃描結束
+
+    Returns:
+        bool: 執行緒是否已結束 (沒有執行緒時為 True)
+    """
+    with _registry_lock:
+        worker = _current_worker
+    return worker.stop(timeout) if worker is not None else True
@@ -0,0 +1,249 @@
+"""
+Quote Stream Module
+以推播 (訂閱 Tick) 取代定時快照輪詢：維護每檔即時 OHLCV 狀態並於每筆更新時評估策略
+"""
+import datetime
+import threading
+import logging
+import pandas as pd
+import strategy
+from line_notifier import notifier
+from .snapshot_frame import SnapshotFrame, SNAPSHOT_FIELDS
+
+logger = logging.getLogger(__name__)
+
+
+class QuoteState:
+    """
+    單一股票的盤中滾動 OHLCV 狀態 (欄位名稱與 Snapshot 相同，可直接傳入 strategy.check_criteria)
+    """
+    __slots__ = ("code",) + SNAPSHOT_FIELDS
+
+    def __init__(self, code):
+        self.code = code
+        for field in SNAPSHOT_FIELDS:
+            setattr(self, field, 0)
+
+    def update(self, ts, close, volume=0, amount=0, open_=None, high=None, low=None,
+               total_volume=None, total_amount=None):
+        """
+        套用一筆成交 (Shioaji Tick 帶有當日 open/high/low/total_*；回放 K 棒只帶單根數值，採累加)
+        """
+        self.ts = ts
+        if not self.open:
+            self.open = open_ or close
+        self.high = max(self.high, high or close)
+        self.low = min(self.low, low or close) if self.low else (low or close)
+        self.close = close
+        self.total_volume = total_volume if total_volume is not None else self.total_volume + volume
+        self.total_amount = total_amount if total_amount is not None else self.total_amount + amount
+
+
+def _to_float(value):
+    return float(value) if value not in (None, "") else None
+
+
+def _tick_ts(tick):
+    dt = getattr(tick, "datetime", None)
+    if dt is None:
+        return 0
+    return pd.Timestamp(dt).value
+
+
+class QuoteStreamMonitor:
+    """
+    事件驅動監控：每筆 Tick 更新該檔狀態並立即執行策略判斷
+
+    Args:
+        codes: 監控股票代碼 (通常為跳空清單)
+        prev_high_map: Dict[code] -> prev_high
+        bias_map: Dict[code] -> bias
+        contract_info: Dict[code] -> {name, reference, has_future}
+        session_state: 需有 triggered_history (與 run_monitoring_iteration 共用)
+        on_signal: 首次觸發時的回調 on_signal(event_dict)，可選
+        notify: 是否發送 LINE 通知 (每次符合條件都交給 notifier，由其 pending / SentStore 去重，
+                推播失敗時下一筆 Tick 會重試；與 run_monitoring_iteration 相同)
+    """
+
+    def __init__(self, codes, prev_high_map, bias_map, contract_info, session_state,
+                 on_signal=None, notify=True):
+        self.codes = list(codes)
+        self.prev_high_map = prev_high_map
+        self.bias_map = bias_map
+        self.contract_info = contract_info
+        self.session_state = session_state
+        self.on_signal = on_signal
+        self.notify = notify
+
+        if 'triggered_history' not in session_state:
+            session_state.triggered_history = set()
+
+        self.states = {code: QuoteState(code) for code in self.codes}
+        self.events = []
+        self.tick_count = 0
+        self._lock = threading.Lock()
+
+    # ---------- Shioaji wiring ----------
+
+    def subscribe(self, api, contracts):
+        """
+        註冊 Tick 回調並訂閱合約
+        """
+        from shioaji.constant import QuoteType, QuoteVersion
+
+        api.quote.set_on_tick_stk_v1_callback(self.on_tick)
+        for contract in contracts:
+            api.quote.subscribe(contract, quote_type=QuoteType.Tick, version=QuoteVersion.v1)
+        logger.info(f"Subscribed tick stream for {len(contracts)} contracts.")
+
+    def unsubscribe(self, api, contracts):
+        from shioaji.constant import QuoteType, QuoteVersion
+
+        for contract in contracts:
+            try:
+                api.quote.unsubscribe(contract, quote_type=QuoteType.Tick, version=QuoteVersion.v1)
+            except Exception as e:
+                logger.warning(f"Unsubscribe {contract.code} failed: {e}")
+
+    # ---------- Event handling ----------
+
+    def on_tick(self, *args):
+        """
+        Tick 回調 (相容 callback(tick) 與 callback(exchange, tick) 兩種簽名)
+
+        盤前 / 收盤集合競價的試撮 Tick (simtrade) 不是成交，直接略過；
+        LINE 通知與 on_signal 在釋放鎖之後才執行，避免阻塞其他 Tick 與 frame()
+        """
+        tick = args[-1]
+        if getattr(tick, "simtrade", False):
+            return
+        close = _to_float(getattr(tick, "close", None))
+        if not close:
+            return
+
+        with self._lock:
+            state = self.states.get(tick.code)
+            if state is None:
+                return
+            self.tick_count += 1
+            state.update(
+                ts=_tick_ts(tick),
+                close=close,
+                volume=getattr(tick, "volume", 0) or 0,
+                amount=_to_float(getattr(tick, "amount", None)) or 0,
+                open_=_to_float(getattr(tick, "open", None)),
+                high=_to_float(getattr(tick, "high", None)),
+                low=_to_float(getattr(tick, "low", None)),
+                total_volume=getattr(tick, "total_volume", None),
+                total_amount=_to_float(getattr(tick, "total_amount", None)),
+            )
+            signal = self._evaluate(state)
+
+        if signal is not None:
+            self._dispatch(*signal)
+
+    def _evaluate(self, state):
+        """
+        持鎖狀態下判斷是否符合條件；符合時回傳 (event, has_future, first) 供鎖外通知
+
+        triggered_history / events 只記錄首次觸發 (first)，通知去重交給 notifier
+        """
+        code = state.code
+        info = self.contract_info.get(code, {})
+        ref_price = info.get("reference", 0.0)
+        if not ref_price or ref_price <= 0:
+            # 無參考價 (昨收) 無法計算跳空，與 screen_gaps 相同直接略過
+            return None
+        prev_close = ref_price
+        prev_high = self.prev_high_map.get(code, prev_close)
+        bias_val = self.bias_map.get(code, 0)
+        has_future = info.get("has_future", False)
+
+        is_active, features, p_loc, cond_gap = strategy.check_criteria(state, prev_high, bias_val, has_future)
+        if not is_active:
+            return None
+
+        first = code not in self.session_state.triggered_history
+        name = info.get("name", code)
+        gap_val = (state.open - prev_close) / prev_close
+        event = {
+            "time": pd.Timestamp(state.ts) if state.ts else pd.Timestamp(datetime.datetime.now()),
+            "code": code,
+            "name": name,
+            "close": state.close,
+            "gap": gap_val,
+            "p_loc": p_loc,
+            "volume": state.total_volume,
+            "amount": state.total_amount,
+            "features": " ".join(features),
+        }
+        if first:
+            self.session_state.triggered_history.add(code)
+            self.events.append(event)
+        return event, has_future, first
+
+    def _dispatch(self, event, has_future, first):
+        if self.notify:
+            notifier.notify_signal(event["code"], event["name"], event["close"], event["gap"], event["p_loc"],
+                                   event["volume"], event["amount"], has_future)
+        if first and self.on_signal:
+            self.on_signal(event)
+
+    def frame(self):
+        """
+        目前所有狀態的 SnapshotFrame (可交給 run_monitoring_iteration 產生表格)
+        """
+        with self._lock:
+            states = list(self.states.values())
+            return SnapshotFrame.from_snapshots(states)
+
+
+class ReplayFeed:
+    """
+    本地回放來源：將 1 分 K 線依時間順序轉為 Tick 事件 (測試與離線驗證用)
+
+    Args:
+        kbars_dict: Dict[code] -> DataFrame (ts, Open, High, Low, Close, Volume, Amount)
+    """
+
+    def __init__(self, kbars_dict):
+        frames = []
+        for code, df in kbars_dict.items():
+            if df is None or df.empty:
+                continue
+            part = df[["ts", "Open", "High", "Low", "Close", "Volume", "Amount"]].copy()
+            part["code"] = code
+            frames.append(part)
+        if frames:
+            self.bars = pd.concat(frames, ignore_index=True).sort_values("ts", kind="stable")
+        else:
+            self.bars = pd.DataFrame(columns=["ts", "Open", "High", "Low", "Close", "Volume", "Amount", "code"])
+
+    def __iter__(self):
+        for row in self.bars.itertuples(index=False):
+            yield _ReplayTick(row)
+
+    def run(self, callback):
+        """
+        依序將每根 K 棒送入 callback，回傳事件數
+        """
+        count = 0
+        for tick in self:
+            callback(tick)
+            count += 1
+        return count
+
+
+class _ReplayTick:
+    """K 棒轉換的 Tick (僅帶單根數值，不含當日累計欄位)"""
+    __slots__ = ("code", "datetime", "open", "high", "low", "close", "volume", "amount")
+
+    def __init__(self, row):
+        self.code = row.code
+        self.datetime = row.ts
+        self.open = row.Open
+        self.high = row.High
+        self.low = row.Low
+        self.close = row.Close
+        self.volume = row.Volume
+        self.amount = row.Amount
@@ -0,0 +1,12 @@
+"""
+Session State Module
+無 Streamlit 環境 (headless、回測、背景執行緒) 使用的 session state
+"""
+
+
+class MockSessionState(dict):
+    """支援屬性存取的 dict，介面與 st.session_state 相同 (缺少的 key 回傳 None)"""
+    def __getattr__(self, key):
+        return self.get(key)
+    def __setattr__(self, key, value):
+        self[key] = value
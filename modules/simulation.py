@@ -2,92 +2,226 @@
 Simulation Module
 處理盤後回測邏輯，使用歷史 K 線資料重現盤中走勢
 """
-import datetime
 import time
+import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
 import pandas as pd
 import streamlit as st
+import config
 from .monitor_loop import run_monitoring_iteration
+from .contract_resolver import lookup_contract
+from .snapshot_frame import SnapshotFrame
+from .kbar_store import default_store
+from .api_manager import RateLimiter
 
 
-def fetch_intraday_kbars(api, stock_codes, contract_info, target_date, progress_callback=None):
+def _download_kbars(api, contract, target_date, limiter, max_retries=config.KBAR_MAX_RETRIES,
+                    base_backoff=0.5, max_backoff=8.0):
     """
-    抓取指定日期的 1 分 K 線資料
+    下載單檔 K 線 (於 worker 執行緒執行；暫時性錯誤採 jitter 指數退避重試)
+
+    Returns:
+        pd.DataFrame (API 回傳空資料時為 None)
+    """
+    day = target_date.strftime('%Y-%m-%d')  # Use date-only format
+    for attempt in range(max_retries):
+        limiter.acquire()
+        try:
+            kbars = api.kbars(contract=contract, start=day, end=day)
+            if not kbars:
+                return None
+            # Convert to DataFrame
+            df = pd.DataFrame({**kbars})
+            df['ts'] = pd.to_datetime(df['ts'])
+            return df
+        except Exception as e:
+            # 參數錯誤重試也不會成功
+            if 'invalid date format' in str(e) or attempt == max_retries - 1:
+                raise
+            time.sleep(random.uniform(0, min(max_backoff, base_backoff * (2 ** attempt))))
+
+
+def fetch_intraday_kbars(api, stock_codes, contract_info, target_date, progress_callback=None,
+                         store=None, use_cache=True, max_workers=config.KBAR_MAX_WORKERS,
+                         requests_per_second=config.KBAR_REQUESTS_PER_SECOND):
+    """
+    抓取指定日期的 1 分 K 線資料 (歷史日期優先讀取本地快取，只有缺少的代碼才呼叫 API)
+    
+    缺少的代碼交由有上限的執行緒池並行下載，並以 RateLimiter 控制每秒請求數；
+    progress_callback 只在呼叫端執行緒觸發 (可安全更新 Streamlit 元件)。
     
     Args:
         api: Shioaji API 實例
         stock_codes: 股票代碼列表
         contract_info: 合約資訊字典
         target_date: 目標日期 (datetime.date)
-        progress_callback: 進度回調函式
+        progress_callback: 進度回調函式 progress_callback(current, total, message)
+        store: KbarStore 實例 (預設 kbar_store.default_store)
+        use_cache: 是否使用本地快取
+        max_workers: 同時下載的執行緒數
+        requests_per_second: 每秒最多 API 請求數
     
     Returns:
-        Dict[code] -> pd.DataFrame: 每檔股票的 K 線資料
+        Dict[code] -> pd.DataFrame: 每檔股票的 K 線資料 (依 stock_codes 順序)
     """
-    from shioaji.constant import Exchange
-    
-    # 設定時間範圍
-    start_time = datetime.datetime.combine(target_date, datetime.time(9, 0))
-    end_time = datetime.datetime.combine(target_date, datetime.time(13, 30))
-    
-    kbars_dict = {}
+    results = {}
     total = len(stock_codes)
+    store = store or default_store
+    use_cache = use_cache and store.cacheable(target_date)
     
-    for idx, code in enumerate(stock_codes):
-        if progress_callback:
-            progress_callback(idx, total, f"正在抓取 {code} 的 K 線資料...")
-        
-        try:
-            # Get contract
-            info = contract_info.get(code, {})
-            
-            # Try TSE first
-            symbol = f"TSE{code}"
-            contract = getattr(api.Contracts.Stocks.TSE, symbol, None)
-            if not contract:
-                # Try OTC
-                symbol = f"OTC{code}"
-                contract = getattr(api.Contracts.Stocks.OTC, symbol, None)
-            
-            if not contract:
-                # 找不到合約 (可能是 ETF 或其他非 TSE/OTC 標的)
-                if progress_callback:
-                    progress_callback(idx, total, f"⚠️ {code} 跳過: 非 TSE/OTC 標的 (可能為 ETF)")
+    # 1. 本地快取與合約查詢 (皆不需網路)
+    pending = []
+    for code in stock_codes:
+        if use_cache:
+            cached = store.get(code, target_date)
+            if cached is not None:
+                results[code] = cached
                 continue
-            
-            # Fetch kbars
-            kbars = api.kbars(
-                contract=contract,
-                start=target_date.strftime('%Y-%m-%d'),  # Use date-only format
-                end=target_date.strftime('%Y-%m-%d')
-            )
-            
-            if kbars:
-                # Convert to DataFrame
-                df = pd.DataFrame({**kbars})
-                df['ts'] = pd.to_datetime(df['ts'])
-                kbars_dict[code] = df
-            else:
-                # API 回傳空資料
-                if progress_callback:
-                    progress_callback(idx, total, f"⚠️ {code} 無 K 線資料 (可能為新上市或當日無交易)")
-                
-        except Exception as e:
-            # API 呼叫錯誤
-            error_msg = str(e)
-            if 'invalid date format' in error_msg:
-                if progress_callback:
-                    progress_callback(idx, total, f"⚠️ {code} 抓取失敗: 日期格式錯誤 - {error_msg}")
-            else:
-                if progress_callback:
-                    progress_callback(idx, total, f"⚠️ {code} 抓取失敗: {error_msg}")
+        
+        # TSE/OTC lookup via the daily contract index
+        entry = lookup_contract(api, code)
+        contract = entry[1] if entry else None
+        if not contract:
+            # 找不到合約 (可能是 ETF 或其他非 TSE/OTC 標的)
+            if progress_callback:
+                progress_callback(0, total, f"⚠️ {code} 跳過: 非 TSE/OTC 標的 (可能為 ETF)")
             continue
+        pending.append((code, contract))
+    
+    done = total - len(pending)
+    if progress_callback and pending:
+        progress_callback(done, total, f"正在抓取 {len(pending)} 檔 K 線資料...")
     
-    return kbars_dict
+    # 2. 並行下載缺少的代碼
+    if pending:
+        limiter = RateLimiter(requests_per_second)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as executor:
+            futures = {
+                executor.submit(_download_kbars, api, contract, target_date, limiter): code
+                for code, contract in pending
+            }
+            for future in as_completed(futures):
+                code = futures[future]
+                done += 1
+                try:
+                    df = future.result()
+                except Exception as e:
+                    # API 呼叫錯誤 (重試後仍失敗，不寫入快取)
+                    error_msg = str(e)
+                    if progress_callback:
+                        if 'invalid date format' in error_msg:
+                            progress_callback(done, total, f"⚠️ {code} 抓取失敗: 日期格式錯誤 - {error_msg}")
+                        else:
+                            progress_callback(done, total, f"⚠️ {code} 抓取失敗: {error_msg}")
+                    continue
+                
+                if use_cache:
+                    # 空資料不快取 (可能是暫時性的空回應)，下次執行重新查詢
+                    store.put(code, target_date, df)
+                if df is not None:
+                    results[code] = df
+                    if progress_callback:
+                        progress_callback(done, total, f"已取得 {code} 的 K 線資料")
+                elif progress_callback:
+                    progress_callback(done, total, f"⚠️ {code} 無 K 線資料 (可能為新上市或當日無交易)")
+    
+    return {code: results[code] for code in stock_codes if code in results}
+
+
+class CumulativeBarEngine:
+    """
+    預先計算每檔股票的累計 K 線欄位 (開盤、累計最高/最低、累計量/額)，
+    之後任一時間點的快照只需 searchsorted 查表，不必重複切片重算
+    
+    Args:
+        kbars_dict: Dict[code] -> DataFrame (ts, Open, High, Low, Close, Volume, Amount)
+        contract_info: 合約資訊字典
+    """
+
+    def __init__(self, kbars_dict, contract_info):
+        codes, segments = [], []
+        for code, df in kbars_dict.items():
+            if df is None or df.empty:
+                continue
+            segments.append(df.sort_values('ts', kind='stable'))
+            codes.append(code)
+
+        self.codes = np.asarray(codes, dtype=object)
+        self.reference = np.array(
+            [contract_info.get(code, {}).get('reference', 0.0) for code in codes], dtype=np.float64
+        )
+
+        ts_parts, open_parts, high_parts, low_parts = [], [], [], []
+        close_parts, vol_parts, amt_parts = [], [], []
+        for df in segments:
+            ts_parts.append(df['ts'].to_numpy(dtype='datetime64[ns]').view(np.int64))
+            open_parts.append(np.full(len(df), df['Open'].iloc[0], dtype=np.float64))  # First bar's open
+            high_parts.append(np.fmax.accumulate(df['High'].to_numpy(dtype=np.float64)))
+            low_parts.append(np.fmin.accumulate(df['Low'].to_numpy(dtype=np.float64)))
+            close_parts.append(df['Close'].to_numpy(dtype=np.float64))
+            vol_parts.append(np.nancumsum(df['Volume'].to_numpy(dtype=np.float64)))   # KBar Volume (張)
+            amt_parts.append(np.nancumsum(df['Amount'].to_numpy(dtype=np.float64)))   # KBar Amount is raw Yuan
+
+        def flat(parts, dtype=np.float64):
+            return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+        self._ts = flat(ts_parts, np.int64)
+        self._open = flat(open_parts)
+        self._high = flat(high_parts)
+        self._low = flat(low_parts)
+        self._close = flat(close_parts)
+        self._volume = flat(vol_parts)
+        self._amount = flat(amt_parts)
+
+        # Global timeline and, per stock, the flat row of its latest bar at each timeline point (-1 = none yet)
+        self.timeline_ns = np.unique(self._ts)
+        self._rows = np.full((len(segments), len(self.timeline_ns)), -1, dtype=np.int64)
+        offset = 0
+        for i, ts in enumerate(ts_parts):
+            pos = np.searchsorted(ts, self.timeline_ns, side='right') - 1
+            self._rows[i] = np.where(pos >= 0, pos + offset, -1)
+            offset += len(ts)
+
+    @property
+    def timeline(self):
+        """所有 K 棒時間點 (已排序，pd.DatetimeIndex)"""
+        return pd.DatetimeIndex(self.timeline_ns.view('datetime64[ns]'))
+
+    def snapshot_at(self, timestamp):
+        """
+        取得指定時間點的累計快照
+        
+        Returns:
+            SnapshotFrame: 只包含該時間點前已有 K 棒的股票
+        """
+        ts_ns = pd.Timestamp(timestamp).value
+        g = np.searchsorted(self.timeline_ns, ts_ns, side='right') - 1
+        if g < 0 or len(self.codes) == 0:
+            return SnapshotFrame.empty()
+
+        rows = self._rows[:, g]
+        valid = rows >= 0
+        rows = rows[valid]
+        close = self._close[rows]
+        reference = self.reference[valid]
+
+        return SnapshotFrame(self.codes[valid], {
+            "ts": np.full(len(rows), ts_ns, dtype=np.int64),
+            "open": self._open[rows],
+            "high": self._high[rows],
+            "low": self._low[rows],
+            "close": close,
+            "total_volume": self._volume[rows],
+            "total_amount": self._amount[rows],
+            "change_price": np.where(reference > 0, close - reference, 0.0),
+        })
 
 
 def kbars_to_snapshots(kbars_dict, timestamp, contract_info):
     """
     將 K 線資料轉換為 Snapshot 格式
+    (單次查詢；回放多個時間點請直接建立 CumulativeBarEngine 重複使用)
     
     Args:
         kbars_dict: K 線資料字典
@@ -95,65 +229,49 @@ def kbars_to_snapshots(kbars_dict, timestamp, contract_info):
         contract_info: 合約資訊字典
     
     Returns:
-        List[MockSnapshot]: 模擬的快照資料
+        SnapshotFrame: 模擬的快照資料 (欄位式)
     """
-    class MockSnapshot:
-        def __init__(self, code, open_, high, low, close, volume, amount, change_price, name, reference):
-            self.code = code
-            self.open = open_
-            self.high = high
-            self.low = low
-            self.close = close
-            self.total_volume = volume
-            self.total_amount = amount
-            self.change_price = change_price
-            self.name = name
-            self.reference = reference
+    return CumulativeBarEngine(kbars_dict, contract_info).snapshot_at(timestamp)
+
+
+def replay_day(engine, monitoring_list, prev_high_map, bias_map, contract_info, session_state, notify=True):
+    """
+    依時間序列回放一日 K 線，每個時間點執行 run_monitoring_iteration (不含任何 UI 或等待)
     
-    snapshots = []
+    Args:
+        engine: CumulativeBarEngine
+        monitoring_list, prev_high_map, bias_map, contract_info: 同 run_monitoring_iteration
+        session_state: 需支援 triggered_history 的 session state
+        notify: 是否發送 LINE 通知
     
-    for code, df in kbars_dict.items():
-        # Find data at this timestamp
-        mask = df['ts'] <= timestamp
-        if not mask.any():
-            continue
-        
-        # Get latest data up to this timestamp
-        latest_row = df[mask].iloc[-1]
-        
-        # Get cumulative data up to this timestamp
-        cumulative_df = df[mask]
-        
-        info = contract_info.get(code, {})
-        reference = info.get('reference', 0.0)
-        name = info.get('name', code)
+    Yields:
+        (idx, timestamp, active_df, watchlist_df, gap_df, new_triggers)
+        new_triggers: 此時間點首次進入強勢區的代碼列表
+    """
+    for idx, timestamp in enumerate(engine.timeline):
+        # Convert kbars to snapshots at this timestamp
+        snapshots = engine.snapshot_at(timestamp)
         
-        # Calculate current values
-        open_ = cumulative_df.iloc[0]['Open']  # First bar's open
-        high = cumulative_df['High'].max()
-        low = cumulative_df['Low'].min()
-        close = latest_row['Close']
-        volume = cumulative_df['Volume'].sum()    # KBar Volume is usually in cent-sheets (0.1張) -> Convert to Sheets
-        amount = cumulative_df['Amount'].sum()         # KBar Amount is raw Yuan
+        if not snapshots:
+            continue
         
-        change_price = close - reference if reference > 0 else 0
+        triggered_before = set(getattr(session_state, 'triggered_history', None) or ())
         
-        snapshot = MockSnapshot(
-            code=code,
-            open_=open_,
-            high=high,
-            low=low,
-            close=close,
-            volume=volume,
-            amount=amount,
-            change_price=change_price,
-            name=name,
-            reference=reference
+        # Run monitoring logic
+        active_df, watchlist_df, gap_df = run_monitoring_iteration(
+            None,
+            monitoring_list,
+            prev_high_map,
+            bias_map,
+            contract_info,
+            snapshots,
+            session_state,
+            notify=notify
         )
         
-        snapshots.append(snapshot)
-    
-    return snapshots
+        new_triggers = [code for code in active_df['代碼'] if code not in triggered_before]
+        
+        yield idx, timestamp, active_df, watchlist_df, gap_df, new_triggers
 
 
 def run_simulation(api, monitoring_list, prev_high_map, bias_map, 
@@ -216,12 +334,9 @@ def run_simulation(api, monitoring_list, prev_high_map, bias_map,
     # Step 2: Generate time series
     write_status("⏰ Step 2: 建立時間序列...")
     
-    # Get all unique timestamps
-    all_timestamps = set()
-    for df in kbars_dict.values():
-        all_timestamps.update(df['ts'].tolist())
-    
-    time_series = sorted(list(all_timestamps))
+    # Precompute cumulative bars once; get all unique timestamps
+    engine = CumulativeBarEngine(kbars_dict, contract_info)
+    time_series = engine.timeline
     write_status(f"✅ Step 2 完成: 共 {len(time_series)} 個時間點")
     
     # Step 3: Playback
@@ -238,29 +353,14 @@ def run_simulation(api, monitoring_list, prev_high_map, bias_map,
         "timeline": []
     }
     
-    for idx, timestamp in enumerate(time_series):
+    replay = replay_day(engine, monitoring_list, prev_high_map, bias_map, contract_info, session_state)
+    
+    for idx, timestamp, active_df, watchlist_df, gap_df, _ in replay:
         # Update progress
         progress = (idx + 1) / len(time_series)
         simulation_progress.progress(progress)
         simulation_text.text(f"⏰ 回放進度: {timestamp.strftime('%H:%M')} ({idx+1}/{len(time_series)})")
         
-        # Convert kbars to snapshots at this timestamp
-        snapshots = kbars_to_snapshots(kbars_dict, timestamp, contract_info)
-        
-        if not snapshots:
-            continue
-        
-        # Run monitoring logic
-        active_df, watchlist_df, gap_df = run_monitoring_iteration(
-            api,
-            monitoring_list,
-            prev_high_map,
-            bias_map,
-            contract_info,
-            snapshots,
-            session_state
-        )
-        
         # Update session state
         session_state.active_df = active_df
         session_state.watchlist_df = watchlist_df
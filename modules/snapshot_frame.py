@@ -0,0 +1,107 @@
+"""
+Snapshot Frame Module
+將 Shioaji Snapshot 物件列表轉換為欄位式 (struct-of-arrays) 資料結構
+"""
+import numpy as np
+import pandas as pd
+
+# 快照數值欄位 (ts 為奈秒整數，其餘為浮點數)
+SNAPSHOT_FIELDS = ("ts", "open", "high", "low", "close", "total_volume", "total_amount", "change_price")
+
+
+class SnapshotFrame:
+    """
+    一次 tick 的快照資料，以 NumPy 陣列依欄位儲存
+
+    Attributes:
+        codes: 股票代碼陣列 (object)
+        columns: Dict[field] -> np.ndarray
+        index: Dict[code] -> row
+    """
+
+    def __init__(self, codes, columns):
+        self.codes = np.asarray(codes, dtype=object)
+        self.columns = {}
+        for field in SNAPSHOT_FIELDS:
+            dtype = np.int64 if field == "ts" else np.float64
+            values = columns.get(field)
+            if values is None:
+                values = np.zeros(len(self.codes), dtype=dtype)
+            self.columns[field] = np.asarray(values, dtype=dtype)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+
+    @classmethod
+    def from_snapshots(cls, snapshots):
+        """
+        由 Snapshot 物件列表建立 (支援 Shioaji Snapshot 與各種 MockSnapshot)
+        """
+        if isinstance(snapshots, cls):
+            return snapshots
+
+        snapshots = list(snapshots or [])
+        n = len(snapshots)
+        codes = [s.code for s in snapshots]
+        columns = {}
+        for field in SNAPSHOT_FIELDS:
+            dtype = np.int64 if field == "ts" else np.float64
+            columns[field] = np.fromiter(
+                ((getattr(s, field, 0) or 0) for s in snapshots), dtype=dtype, count=n
+            )
+        return cls(codes, columns)
+
+    @classmethod
+    def empty(cls):
+        return cls([], {})
+
+    @classmethod
+    def concat(cls, frames):
+        """
+        合併多個 SnapshotFrame (例如多個 chunk 的抓取結果)
+        """
+        frames = [f for f in frames if f is not None and len(f) > 0]
+        if not frames:
+            return cls.empty()
+        if len(frames) == 1:
+            return frames[0]
+        codes = np.concatenate([f.codes for f in frames])
+        columns = {field: np.concatenate([f.columns[field] for f in frames]) for field in SNAPSHOT_FIELDS}
+        return cls(codes, columns)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+    def __contains__(self, code):
+        return code in self.index
+
+    def take(self, rows):
+        """
+        依布林遮罩或位置陣列取出子集
+        """
+        rows = np.asarray(rows)
+        if rows.dtype != bool:
+            rows = rows.astype(np.intp)
+        return SnapshotFrame(self.codes[rows], {field: values[rows] for field, values in self.columns.items()})
+
+    def select(self, codes):
+        """
+        依代碼取出子集 (保持傳入順序，不存在的代碼略過)
+        """
+        rows = [self.index[c] for c in codes if c in self.index]
+        return self.take(np.asarray(rows, dtype=np.intp))
+
+    def row(self, i):
+        """
+        取得第 i 列為 dict (除錯與顯示用)
+        """
+        record = {"code": self.codes[i]}
+        for field, values in self.columns.items():
+            record[field] = values[i].item()
+        return record
+
+    def to_dataframe(self):
+        df = pd.DataFrame(self.columns)
+        df.insert(0, "code", self.codes)
+        return df
@@ -0,0 +1,112 @@
+"""
+Telemetry Module
+監控流程各階段耗時：span 計時、結構化日誌與滾動 p50/p95/p99 統計
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+import config
+
+logger = logging.getLogger("gaptrading.telemetry")
+
+
+class LatencyTracker:
+    """
+    每個階段保留最近 window 筆耗時 (毫秒)，提供百分位數摘要
+
+    Args:
+        window: 每階段保留的樣本數
+    """
+
+    def __init__(self, window=config.TELEMETRY_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, **fields):
+        ms = seconds * 1000.0
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.window)
+            samples.append(ms)
+            self._counts[stage] = self._counts.get(stage, 0) + 1
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps({"event": "span", "stage": stage, "ms": round(ms, 2), **fields},
+                                    ensure_ascii=False, default=str))
+
+    def summary(self):
+        """
+        Returns:
+            Dict[stage] -> {count, p50, p95, p99, max} (毫秒)
+        """
+        with self._lock:
+            snapshot = {stage: (np.fromiter(samples, dtype=np.float64), self._counts[stage])
+                        for stage, samples in self._samples.items()}
+        result = {}
+        for stage, (values, count) in snapshot.items():
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            result[stage] = {
+                "count": count,
+                "p50": round(float(p50), 2),
+                "p95": round(float(p95), 2),
+                "p99": round(float(p99), 2),
+                "max": round(float(values.max()), 2),
+            }
+        return result
+
+    def log_summary(self):
+        """
+        以單行 JSON 輸出目前的百分位數摘要
+        """
+        summary = self.summary()
+        if summary:
+            logger.info(json.dumps({"event": "latency_summary", "stages": summary}, ensure_ascii=False))
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+
+# 同一行程共用 (Streamlit session / headless job)
+tracker = LatencyTracker()
+
+
+@contextmanager
+def span(stage, tracker_=None, **fields):
+    """
+    計時區塊：with span("evaluate", rows=300): ...
+
+    Args:
+        stage: 階段名稱
+        tracker_: 指定 LatencyTracker (預設共用 tracker)
+        fields: 附加於結構化日誌的欄位
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        (tracker_ or tracker).record(stage, time.perf_counter() - start, **fields)
+
+
+@contextmanager
+def tick_span(budget=config.SCAN_BUDGET_SECONDS, tracker_=None, **fields):
+    """
+    整輪掃描計時；超過預算時輸出警告
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        (tracker_ or tracker).record("tick", elapsed, **fields)
+        if elapsed > budget:
+            logger.warning(json.dumps({"event": "tick_over_budget", "seconds": round(elapsed, 2),
+                                       "budget": budget, **fields}, ensure_ascii=False, default=str))
@@ -0,0 +1,54 @@
+"""
+Tick Clock Module
+每輪掃描只取一次現在時間：預先算好當日起訖的奈秒邊界，資料新鮮度以整數比較判斷
+"""
+import datetime
+import numpy as np
+
+NS_PER_SECOND = 1_000_000_000
+
+
+class TickClock:
+    """
+    單輪掃描的時間基準 (同一輪內所有批次共用同一個 now)
+
+    快照 ts 為 epoch 奈秒，與 datetime.fromtimestamp 使用相同的本地時區換算，
+    因此「ts 是否為今日」等同於 day_start_ns <= ts < day_end_ns，不需逐筆轉成日期字串。
+
+    Args:
+        now: 指定現在時間 (預設為 datetime.now()，測試時可注入)
+    """
+
+    def __init__(self, now=None):
+        self.now = now or datetime.datetime.now()
+        self.today = self.now.date()
+        self.time_str = self.now.strftime("%H:%M:%S")
+
+        day_start = datetime.datetime.combine(self.today, datetime.time())
+        self.day_start_ns = int(day_start.timestamp()) * NS_PER_SECOND
+        self.day_end_ns = int((day_start + datetime.timedelta(days=1)).timestamp()) * NS_PER_SECOND
+
+    def is_today(self, ts):
+        """
+        判斷 ts (奈秒) 是否落在今日
+
+        Args:
+            ts: 單一整數或 NumPy 陣列 (如 SnapshotFrame["ts"])
+
+        Returns:
+            bool 或布林遮罩
+        """
+        if isinstance(ts, np.ndarray):
+            return (ts >= self.day_start_ns) & (ts < self.day_end_ns)
+        return self.day_start_ns <= ts < self.day_end_ns
+
+    def before(self, hour, minute=0, second=0):
+        """現在時間是否早於當日 hour:minute:second"""
+        return self.now.time() < datetime.time(hour, minute, second)
+
+
+def ts_to_time_str(ts):
+    """
+    奈秒 ts 轉為 HH:MM:SS (僅供顯示用)
+    """
+    return datetime.datetime.fromtimestamp(ts / NS_PER_SECOND).strftime("%H:%M:%S")
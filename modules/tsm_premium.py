@@ -14,9 +14,11 @@ try:
 except ImportError:
     notifier = None
 
+from modules.finlab_cache import get_dataset
+from modules.flex_templates import TSM_PREMIUM_BUBBLE
+
 try:
     import finlab
-    from finlab import data
     finlab.login(config.CONFIG.get("finlab_token"))
 except ImportError:
     finlab = None
@@ -56,9 +58,10 @@ class TSMPremiumMonitor:
             if finlab:
                 # Fetch meaningful history for BB calculation (Need at least 20 days)
                 # However, for the premium HISTORY calculate, we need aligned data.
-                # Let's fetch 60 days to be safe.
-                tw_close = data.get('price:收盤價')
-                tw_2330 = tw_close['2330'].dropna()
+                # Same cache entry as pre_process (covers the 3mo yfinance history); keep only 2330.
+                tw_close = get_dataset('price:收盤價', lookback=config.PREPROCESS_LOOKBACK_DAYS,
+                                       columns=[self.tw_stock_id])
+                tw_2330 = tw_close[self.tw_stock_id].dropna()
                 last_2330 = tw_2330.iloc[-1]
                 last_date_tw = tw_2330.index[-1]
             else:
@@ -175,140 +178,17 @@ class TSMPremiumMonitor:
         }
         theme_color = color_map.get(signal, "#000000")
         
-        # Construct Flex Message
-        contents = {
-            "type": "bubble",
-            "body": {
-                "type": "box",
-                "layout": "vertical",
-                "contents": [
-                    {
-                        "type": "text",
-                        "text": "TSMC ADR 溢價監控",
-                        "weight": "bold",
-                        "size": "xl",
-                        "color": "#1DB446"
-                    },
-                    {
-                        "type": "separator",
-                        "margin": "md"
-                    },
-                    # Section 1: Data
-                    {
-                        "type": "box",
-                        "layout": "vertical",
-                        "margin": "md",
-                        "contents": [
-                             {
-                                "type": "box",
-                                "layout": "horizontal",
-                                "contents": [
-                                    {"type": "text", "text": "TSM Close", "size": "sm", "color": "#555555", "flex": 1},
-                                    {"type": "text", "text": f"{raw_data['tsm_price']:.2f}", "size": "sm", "weight": "bold", "align": "end", "flex": 1}
-                                ]
-                             },
-                             {
-                                "type": "box",
-                                "layout": "horizontal",
-                                "contents": [
-                                    {"type": "text", "text": "USD/TWD", "size": "sm", "color": "#555555", "flex": 1},
-                                    {"type": "text", "text": f"{raw_data['twd_rate']:.2f}", "size": "sm", "weight": "bold", "align": "end", "flex": 1}
-                                ]
-                             },
-                             {
-                                "type": "box",
-                                "layout": "horizontal",
-                                "contents": [
-                                    {"type": "text", "text": "2330 Close", "size": "sm", "color": "#555555", "flex": 1},
-                                    {"type": "text", "text": f"{raw_data['tw_price']:.0f}", "size": "sm", "weight": "bold", "align": "end", "flex": 1}
-                                ]
-                             }
-                        ]
-                    },
-                    {
-                        "type": "separator",
-                        "margin": "md"
-                    },
-                    # Section 2: Premium & Channel
-                    {
-                        "type": "box",
-                        "layout": "vertical",
-                        "margin": "md",
-                        "contents": [
-                            {
-                                "type": "text",
-                                "text": f"溢價率: {current_premium:.2f}%",
-                                "size": "xl",
-                                "weight": "bold",
-                                "align": "center",
-                                "color": theme_color
-                            },
-                             {
-                                "type": "text",
-                                "text": f"MA20: {hist['MA20']:.2f}% | Upper: {hist['Upper']:.2f}% | Lower: {hist['Lower']:.2f}%",
-                                "size": "xxs",
-                                "color": "#aaaaaa",
-                                "align": "center",
-                                "margin": "sm"
-                            }
-                        ]
-                    },
-                    {
-                        "type": "separator",
-                        "margin": "md"
-                    },
-                    # Section 3: Advice
-                     {
-                        "type": "box",
-                        "layout": "vertical",
-                        "margin": "md",
-                        "contents": [
-                            {
-                                "type": "text",
-                                "text": advice,
-                                "weight": "bold",
-                                "size": "md",
-                                "color": theme_color,
-                                "wrap": True
-                            },
-                            {
-                                "type": "text",
-                                "text": desc,
-                                "size": "sm",
-                                "color": "#666666",
-                                "wrap": True,
-                                "margin": "sm"
-                            }
-                        ]
-                    },
-                     # Section 4: Risk
-                    {
-                        "type": "box",
-                        "layout": "vertical",
-                        "margin": "md",
-                        "backgroundColor": "#FFEBEE",
-                        "cornerRadius": "md",
-                        "paddingAll": "md",
-                        "contents": [
-                             {
-                                "type": "text",
-                                "text": "風險預警",
-                                "weight": "bold",
-                                "size": "xs",
-                                "color": "#D32F2F"
-                            },
-                             {
-                                "type": "text",
-                                "text": "停損參考 (MDD): 多 -2.02% / 空 -2.75%",
-                                "size": "xxs",
-                                "color": "#D32F2F",
-                                "wrap": True
-                            }
-                        ]
-                    }
-                ]
-            }
-        }
+        # Fill the precompiled Flex layout
+        contents = TSM_PREMIUM_BUBBLE.render(
+            tsm_price=f"{raw_data['tsm_price']:.2f}",
+            twd_rate=f"{raw_data['twd_rate']:.2f}",
+            tw_price=f"{raw_data['tw_price']:.0f}",
+            premium=f"溢價率: {current_premium:.2f}%",
+            channel=f"MA20: {hist['MA20']:.2f}% | Upper: {hist['Upper']:.2f}% | Lower: {hist['Lower']:.2f}%",
+            theme_color=theme_color,
+            advice=advice,
+            desc=desc,
+        )
         
         notifier.send_flex_message(f"TSMC ADR 溢價: {current_premium:.2f}% - {advice}", contents)
 
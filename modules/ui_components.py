@@ -1,4 +1,5 @@
 
+import pandas as pd
 import streamlit as st
 
 def apply_custom_styles():
@@ -135,3 +136,36 @@ def render_header():
             </p>
         </div>
     """, unsafe_allow_html=True)
+
+
+# 監控表格的顯示格式 (run_monitoring_iteration 輸出為數值欄位，僅於繪製時格式化)
+MONITOR_FORMATS = {
+    "現價": "{:.2f}",
+    "跳空%": "{:.2%}",
+    "P-Loc": "{:.2f}",
+    "乖離率": "{:.2%}",
+    "量能": "{:d}張",
+    "開盤": "{:.2f}",
+    "昨收": "{:.2f}",
+    "漲幅%": "{:.2%}",
+}
+
+
+def style_monitor_table(df):
+    """
+    套用監控表格顯示格式 (只格式化存在的數值欄位，其餘欄位原樣顯示)
+
+    Args:
+        df: run_monitoring_iteration 或 screen_gaps 的輸出
+
+    Returns:
+        pandas Styler
+    """
+    formats = {col: fmt for col, fmt in MONITOR_FORMATS.items()
+               if col in df.columns and pd.api.types.is_numeric_dtype(df[col])}
+    return df.style.format(formats, na_rep="")
+
+
+def render_monitor_table(df, height=300):
+    """Renders a monitoring table with display formatting applied at render time."""
+    st.dataframe(style_monitor_table(df), use_container_width=True, height=height, hide_index=True)
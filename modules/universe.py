@@ -0,0 +1,98 @@
+"""
+Universe Module
+盤中動態縮減監控名單：開盤後已不可能符合跳空條件的股票永久剔除，之後不再查詢
+"""
+import numpy as np
+
+DROP_NO_GAP = "no_gap"          # 開盤價未跳空 (Open <= PrevHigh * 1.01)，開盤價不會再變
+DROP_GAP_FILLED = "gap_filled"  # 最低價已跌破昨高 (Low < PrevHigh)，當日最低只會更低
+
+
+class UniverseManager:
+    """
+    維護當日仍需監控的股票集合
+
+    - 尚未開盤 (成交量為 0 或資料非今日) 的股票保留，等待下一輪
+    - 已開盤但無跳空、或缺口已被回補的股票永久剔除
+    - 已觸發過的股票 (triggered_history) 一律保留，供轉弱觀察區顯示
+
+    Args:
+        codes: 初始監控名單
+        prev_high_map: Dict[code] -> prev_high
+        contract_info: Dict[code] -> {name, reference, has_future}
+    """
+
+    def __init__(self, codes, prev_high_map, contract_info):
+        self.codes = list(codes)
+        self.prev_high_map = prev_high_map
+        self.contract_info = contract_info
+        self.dropped = {}
+
+    @property
+    def alive(self):
+        """目前仍在監控中的代碼 (維持原始順序)"""
+        return [code for code in self.codes if code not in self.dropped]
+
+    def __len__(self):
+        return len(self.codes) - len(self.dropped)
+
+    def __contains__(self, code):
+        return code not in self.dropped
+
+    def filter_contracts(self, contracts):
+        """只保留仍在監控中的 Contract"""
+        return [c for c in contracts if c.code not in self.dropped]
+
+    def update(self, frame, triggered=(), min_ts=None):
+        """
+        依最新快照剔除不可能再符合條件的股票
+
+        Args:
+            frame: SnapshotFrame
+            triggered: 已觸發過的代碼 (不剔除)
+            min_ts: 快照時間 (ns) 早於此值視為尚未開盤 (過濾前一交易日的資料)
+
+        Returns:
+            List[str]: 本次新剔除的代碼
+        """
+        if len(frame) == 0:
+            return []
+
+        codes = frame.codes
+        close = frame["close"]
+        ref = np.array([self.contract_info.get(code, {}).get("reference", 0.0) for code in codes],
+                       dtype=np.float64)
+        prev_close = np.where(ref > 0, ref, close - frame["change_price"])
+        prev_high = np.array([self.prev_high_map.get(code, pc) for code, pc in zip(codes, prev_close)],
+                             dtype=np.float64)
+
+        opened = (frame["total_volume"] > 0) & (frame["open"] > 0)
+        if min_ts is not None:
+            opened &= frame["ts"] >= min_ts
+
+        no_gap = opened & (frame["open"] <= prev_high * 1.01)
+        gap_filled = opened & ~no_gap & (frame["low"] < prev_high)
+
+        newly_dropped = []
+        for mask, reason in ((no_gap, DROP_NO_GAP), (gap_filled, DROP_GAP_FILLED)):
+            for i in np.flatnonzero(mask):
+                code = codes[i]
+                if code in triggered or code in self.dropped:
+                    continue
+                self.dropped[code] = reason
+                newly_dropped.append(code)
+        return newly_dropped
+
+    def stats(self):
+        """
+        Returns:
+            dict: total, alive, dropped_no_gap, dropped_gap_filled
+        """
+        reasons = list(self.dropped.values())
+        return {
+            "total": len(self.codes),
+            "alive": len(self),
+            "dropped_no_gap": reasons.count(DROP_NO_GAP),
+            "dropped_gap_filled": reasons.count(DROP_GAP_FILLED),
+        }
+
@@ -1,35 +1,75 @@
 import pandas as pd
-import finlab
-from finlab import data
 import config
-from pathlib import Path
+from modules.finlab_cache import get_dataset
 
-def get_candidates():
-    print("Connecting to FinLab...")
-    # Try to log in if API token is in config, otherwise rely on environment
+try:
+    import finlab
+except ImportError:
+    finlab = None
+
+MA_WINDOWS = (5, 10, 20)
+
+
+def window_size():
+    """計算指標需要的收盤價天數 (MA60 與 MA5/10/20 取最大)"""
+    return max((config.BIAS_WINDOW,) + MA_WINDOWS)
+
+
+def drop_inactive(close):
+    """
+    移除最新一天沒有收盤價的代碼 (其乖離率與均線必為 NaN，不影響選股結果)
+    """
+    return close.loc[:, close.iloc[-1].notna()] if len(close) else close
+
+
+def compute_latest_indicators(window):
+    """
+    由最近 window_size() 天的收盤價計算最新一天的乖離率與均線
+    
+    與 close.rolling(n).mean().iloc[-1] 相同：視窗內有缺值 (或不足 n 天) 即為 NaN
+    
+    Returns:
+        (latest_bias, ma_df)
+    """
+    def latest_ma(n):
+        if len(window) < n:
+            return pd.Series(float("nan"), index=window.columns)
+        return window.iloc[-n:].astype('float64').mean(skipna=False)
+
+    ma60 = latest_ma(config.BIAS_WINDOW)
+    latest_close = window.iloc[-1]
+    latest_bias = ((latest_close - ma60) / ma60).dropna()
+
+    ma_df = pd.concat([latest_ma(n) for n in MA_WINDOWS], axis=1)
+    ma_df.columns = [f"MA{n}" for n in MA_WINDOWS]
+    return latest_bias, ma_df
+
+
+def login_finlab():
+    """以 config 中的 finlab_token 登入 (未設定則沿用環境變數)"""
     if "finlab_token" in config.CONFIG:
         finlab.login(config.CONFIG["finlab_token"])
 
-    print("Fetching data...")
-    # Get Close Price and High Price
-    close = data.get('price:收盤價')
-    high = data.get('price:最高價')
-    
-    # --- Strategy 1: Bias Selection ---
-    # Calculate MA60
-    ma60 = close.rolling(config.BIAS_WINDOW).mean()
-    
-    # Calculate Bias (乖離率)
-    bias = (close - ma60) / ma60
-    
-    # Get the latest bias values properties
-    latest_bias = bias.iloc[-1].dropna()
-    
-    # 確保 high 的索引與 latest_bias 一致 (Yesterday's High)
-    # 這裡直接取最後一天的 High (作為這策略判斷的基準日)
-    latest_high = high.iloc[-1]
 
-    print(f"Total stocks with valid bias: {len(latest_bias)}")
+def select_candidates(window, latest_high, verbose=True):
+    """
+    由收盤價視窗與基準日最高價選出候選股 (乖離率 + 均線糾結)
+
+    只使用 window 最後一天 (基準日) 以前的資料，因此回測可傳入「截至某日」的視窗重建當日名單。
+
+    Args:
+        window: 收盤價視窗 (最後一列為基準日)
+        latest_high: 基準日最高價 (Series, index=代碼)，作為隔日的 prev_high
+        verbose: 是否印出各策略入選數量
+
+    Returns:
+        pd.DataFrame: stock_code, bias, prev_high, strategy_tag, data_date
+    """
+    log = print if verbose else (lambda *args: None)
+
+    latest_bias, ma_df = compute_latest_indicators(window)
+
+    log(f"Total stocks with valid bias: {len(latest_bias)}")
     
     # Rank stocks by Bias (ascending)
     ranked_bias = latest_bias.sort_values()
@@ -37,17 +77,10 @@ def get_candidates():
     # Select bottom 60%
     n_candidates_bias = int(len(ranked_bias) * config.BIAS_PERCENTILE)
     candidates_bias = ranked_bias.head(n_candidates_bias).index.tolist()
-    print(f"Selected {len(candidates_bias)} candidates from Bias Strategy (Bottom {config.BIAS_PERCENTILE:.0%}).")
+    log(f"Selected {len(candidates_bias)} candidates from Bias Strategy (Bottom {config.BIAS_PERCENTILE:.0%}).")
 
     # --- Strategy 2: MA Convergence ---
-    ma5 = close.rolling(5).mean().iloc[-1]
-    ma10 = close.rolling(10).mean().iloc[-1]
-    ma20 = close.rolling(20).mean().iloc[-1]
-    
-    # Concat MAs to calculate convergence
     # We want stocks where (Max(MA) - Min(MA)) / Min(MA) <= Threshold
-    ma_df = pd.concat([ma5, ma10, ma20], axis=1)
-    ma_df.columns = ['MA5', 'MA10', 'MA20']
     ma_df = ma_df.dropna()
     
     max_ma = ma_df.max(axis=1)
@@ -56,11 +89,11 @@ def get_candidates():
     
     threshold = getattr(config, 'MA_CONVERGENCE_THRESHOLD', 0.05)
     candidates_ma_conv = convergence_rate[convergence_rate <= threshold].index.tolist()
-    print(f"Selected {len(candidates_ma_conv)} candidates from MA Convergence Strategy (Threshold {threshold:.0%}).")
+    log(f"Selected {len(candidates_ma_conv)} candidates from MA Convergence Strategy (Threshold {threshold:.0%}).")
     
     # --- Merge Candidates ---
     all_candidates = list(set(candidates_bias + candidates_ma_conv))
-    print(f"Total unique candidates after merging: {len(all_candidates)}")
+    log(f"Total unique candidates after merging: {len(all_candidates)}")
     
     # Extract Data for Output
     # We need to make sure we have data for all selected candidates
@@ -91,17 +124,42 @@ def get_candidates():
         strategy_tags.append("|".join(tags))
 
     # Get date from latest data available
-    data_date = bias.index[-1].strftime('%Y-%m-%d')
-    print(f"Data Date: {data_date}")
+    data_date = window.index[-1].strftime('%Y-%m-%d')
+    log(f"Data Date: {data_date}")
 
-    # Output to CSV
-    output_df = pd.DataFrame({
+    return pd.DataFrame({
         'stock_code': all_candidates,
         'bias': final_bias.values,
         'prev_high': final_high.values,
         'strategy_tag': strategy_tags,
         'data_date': data_date
     })
+
+
+def get_candidates():
+    """
+    盤前選股 (乖離率 + 均線糾結)
+    """
+    print("Connecting to FinLab...")
+    # Try to log in if API token is in config, otherwise rely on environment
+    login_finlab()
+
+    print("Fetching data...")
+    # Get Close Price and High Price
+    # 只取需要的回看天數並轉為 float32；最高價只需最後一天 (保留原精度作為 prev_high)
+    close = get_dataset('price:收盤價', lookback=config.PREPROCESS_LOOKBACK_DAYS, dtype='float32')
+    high = get_dataset('price:最高價', lookback=1)
+    
+    # 最新一天無收盤價的代碼 (下市、停牌) 不可能入選，提早移除
+    close = drop_inactive(close)
+    
+    # 指標只需要最近 window_size() 天 (下載已限制在 PREPROCESS_LOOKBACK_DAYS 天內)
+    window = close.iloc[-window_size():]
+    del close
+    
+    # 確保 high 的索引與 latest_bias 一致 (Yesterday's High)
+    # 這裡直接取最後一天的 High (作為這策略判斷的基準日)
+    output_df = select_candidates(window, high.iloc[-1])
     
     # Ensure data directory exists
     config.DATA_DIR.mkdir(parents=True, exist_ok=True)
@@ -109,7 +167,7 @@ def get_candidates():
     output_df.to_csv(config.CANDIDATE_LIST_PATH, index=False)
     print(f"Saved candidate list to {config.CANDIDATE_LIST_PATH}")
     
-    return all_candidates
+    return output_df['stock_code'].tolist()
 
 if __name__ == "__main__":
     try:
@@ -1,9 +1,96 @@
+import numpy as np
 import config
 
+# Feature bit flags (check_criteria_batch 的特徵代碼)
+FEATURE_HAS_FUTURE = 1
+FEATURE_S6_STRONG = 2
+FEATURE_S6_BREAKOUT = 4
+
+FEATURE_LABELS = [
+    (FEATURE_HAS_FUTURE, "⚡有股期"),
+    (FEATURE_S6_STRONG, "🔥S6_極強勢"),
+    (FEATURE_S6_BREAKOUT, "S6_區間突破"),
+]
+
+
+def feature_labels(feature_code):
+    """
+    將 check_criteria_batch 的特徵代碼轉回標籤列表 (順序與 check_criteria 相同)
+    """
+    code = int(feature_code)
+    return [label for flag, label in FEATURE_LABELS if code & flag]
+
+
+def check_criteria_batch(open_, high, low, close, volume, amount, prev_high, has_future=None):
+    """
+    Vectorized version of check_criteria over whole column arrays.
+
+    Args:
+        open_, high, low, close (array-like): Snapshot prices.
+        volume (array-like): Total volume (張).
+        amount (array-like): Total amount (TWD).
+        prev_high (array-like): Yesterday's High per row.
+        has_future (array-like of bool, optional): Whether each stock has futures.
+
+    Returns:
+        dict of NumPy arrays:
+            - gap, ploc, volume, active: boolean masks
+            - p_loc: float P-Loc values
+            - features: int feature codes (see FEATURE_* flags / feature_labels)
+    """
+    close = np.asarray(close, dtype=np.float64)
+    open_ = np.asarray(open_, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    vol = np.asarray(volume, dtype=np.float64)
+    amt = np.asarray(amount, dtype=np.float64)
+    prev_high = np.asarray(prev_high, dtype=np.float64)
+    if has_future is None:
+        has_future = np.zeros(close.shape, dtype=bool)
+    else:
+        has_future = np.asarray(has_future, dtype=bool)
+
+    # Rows without a trade yet (close == 0) never qualify and carry no features
+    traded = close != 0
+
+    # 1. GAP Logic
+    # Strict Gap: Low >= PrevHigh AND Open > PrevHigh * 1.01
+    cond_gap = traded & (low >= prev_high) & (open_ > prev_high * 1.01)
+
+    # 2. P-Loc Logic
+    span = high - low
+    flat = span == 0
+    p_loc = np.zeros(close.shape, dtype=np.float64)
+    np.divide(close - low, span + 0.00001, out=p_loc, where=traded & ~flat)
+
+    cond_ploc = traded & (p_loc > config.P_LOC_THRESHOLD)
+
+    # 3. Volume Logic (張)
+    cond_vol = traded & (vol >= config.MIN_VOLUME_SHEETS) & (amt >= config.MIN_AMOUNT_TWD)
+
+    is_active = cond_gap & cond_ploc & cond_vol
+
+    # Features Tagging
+    features = np.zeros(close.shape, dtype=np.int8)
+    features[traded & has_future] |= FEATURE_HAS_FUTURE
+    features[traded & (p_loc >= 0.95)] |= FEATURE_S6_STRONG
+    features[traded & (p_loc >= 0.8) & (p_loc < 0.95)] |= FEATURE_S6_BREAKOUT
+
+    return {
+        "gap": cond_gap,
+        "ploc": cond_ploc,
+        "volume": cond_vol,
+        "active": is_active,
+        "p_loc": p_loc,
+        "features": features,
+    }
+
+
 def check_criteria(snapshot_data, prev_high, bias_val, has_future=False):
     """
     Evaluates if a stock snapshot meets the strategy criteria.
-    
+    Thin wrapper around check_criteria_batch for a single snapshot.
+
     Args:
         snapshot_data (dict or object): Must contain:
             - close, open, high, low, total_volume, total_amount, prev_close
@@ -11,56 +98,35 @@ def check_criteria(snapshot_data, prev_high, bias_val, has_future=False):
         prev_high (float): Yesterday's High.
         bias_val (float): Pre-calculated Bias.
         has_future (bool): Whether the stock has futures.
-        
+
     Returns:
-        tuple: (is_active, features_list, p_loc)
+        tuple: (is_active, features_list, p_loc, cond_gap)
     """
-    
+
     # Duck typing: support both dict and object (Shioaji Snapshot)
     def get_val(obj, key):
         if isinstance(obj, dict):
-            return obj.get(key)
+            return obj.get(key) or 0
         else:
-            return getattr(obj, key, 0)
-
-    close = get_val(snapshot_data, 'close')
-    if close == 0: return False, [], 0
-    
-    open_ = get_val(snapshot_data, 'open')
-    high = get_val(snapshot_data, 'high')
-    low = get_val(snapshot_data, 'low')
-    vol = get_val(snapshot_data, 'total_volume')
-    amt = get_val(snapshot_data, 'total_amount')
-    
-    # 1. GAP Logic
-    # Strict Gap: Low >= PrevHigh AND Open > PrevHigh * 1.01
-    cond_gap = (low >= prev_high) and (open_ > prev_high * 1.01)
-    
-    # 2. P-Loc Logic
-    if (high - low) == 0:
-        p_loc = 0.0
-    else:
-        p_loc = (close - low) / (high - low + 0.00001)
-        
-    cond_ploc = p_loc > config.P_LOC_THRESHOLD
-    
-    # 3. Volume Logic
-    # 這裡直接使用「張」進行比較 (根據測試，本系統傳入的 vol 基準已統一為「張」)
-    cond_vol = (vol >= config.MIN_VOLUME_SHEETS) and (amt >= config.MIN_AMOUNT_TWD)
-    
-    is_active = cond_gap and cond_ploc and cond_vol
-    
-    # Features Tagging
-    features = []
-    if has_future:
-        features.append("⚡有股期")
-
-    if p_loc >= 0.95:
-        features.append("🔥S6_極強勢")
-    elif p_loc >= 0.8:
-        features.append("S6_區間突破")
-        
+            return getattr(obj, key, 0) or 0
+
+    result = check_criteria_batch(
+        [get_val(snapshot_data, 'open')],
+        [get_val(snapshot_data, 'high')],
+        [get_val(snapshot_data, 'low')],
+        [get_val(snapshot_data, 'close')],
+        [get_val(snapshot_data, 'total_volume')],
+        [get_val(snapshot_data, 'total_amount')],
+        [prev_high],
+        [has_future],
+    )
+
     # Bias tagging (Optional, purely descriptive)
     # if bias_val < -0.2: features.append("極低基期")
-    
-    return is_active, features, p_loc, cond_gap
+
+    return (
+        bool(result["active"][0]),
+        feature_labels(result["features"][0]),
+        float(result["p_loc"][0]),
+        bool(result["gap"][0]),
+    )
@@ -0,0 +1,173 @@
+
+import unittest
+from unittest.mock import patch
+import sys
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# Setup path
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from modules import backtest, monitor_loop
+
+
+def make_kbars():
+    ts = pd.to_datetime(["2026-01-21 09:01", "2026-01-21 09:02", "2026-01-21 09:03", "2026-01-21 09:04"])
+    # 2330: gaps above prev_high 101, turns active at 09:02 and weakens at 09:04
+    strong = pd.DataFrame({"ts": ts, "Open": [103.0, 104.0, 105.0, 104.0], "High": [104.0, 105.0, 106.0, 106.0],
+                           "Low": [102.0, 103.5, 104.5, 102.5], "Close": [103.8, 104.9, 105.9, 102.6],
+                           "Volume": [300, 300, 300, 300], "Amount": [31e6, 31e6, 31e6, 31e6]})
+    # 2603: no gap
+    flat = pd.DataFrame({"ts": ts[1:], "Open": [100.0, 100.5, 100.2], "High": [100.5, 101.0, 100.6],
+                         "Low": [99.5, 100.0, 99.8], "Close": [100.2, 100.8, 100.1],
+                         "Volume": [400, 400, 400], "Amount": [40e6, 40e6, 40e6]})
+    return {"2330": strong, "2603": flat}
+
+
+class TestBacktest(unittest.TestCase):
+    def setUp(self):
+        self.contract_info = {"2330": {"name": "台積電", "reference": 100.0},
+                              "2603": {"name": "長榮", "reference": 100.0}}
+        self.prev_high_map = {"2330": 101.0, "2603": 101.0}
+
+    def test_run_backtest(self):
+        with patch.object(monitor_loop.notifier, "notify_signal") as notify, \
+                patch("time.sleep") as sleep:
+            timeline_df, events_df = backtest.run_backtest(
+                make_kbars(), ["2330", "2603"], self.prev_high_map, {}, self.contract_info,
+                trade_date=pd.Timestamp("2026-01-21").date()
+            )
+        notify.assert_not_called()
+        sleep.assert_not_called()
+
+        self.assertEqual(timeline_df["active"].tolist(), [0, 1, 1, 0])
+        self.assertEqual(timeline_df["watchlist"].tolist(), [0, 0, 0, 1])
+        self.assertEqual(timeline_df["gap"].tolist(), [1, 2, 2, 2])
+        self.assertEqual(events_df["代碼"].tolist(), ["2330"])
+        self.assertEqual(events_df["time"].iloc[0], pd.Timestamp("2026-01-21 09:02"))
+
+        stats = backtest.summarize_backtest(timeline_df, events_df)
+        self.assertEqual((stats["max_active"], stats["max_watchlist"], stats["triggers"]), (1, 1, 1))
+
+    def test_empty_input(self):
+        timeline_df, events_df = backtest.run_backtest({}, [], {}, {}, {})
+        self.assertTrue(timeline_df.empty and events_df.empty)
+        self.assertEqual(backtest.summarize_backtest(timeline_df, events_df)["first_trigger"], None)
+
+    def test_save_results(self):
+        timeline_df, events_df = backtest.run_backtest(
+            make_kbars(), ["2330", "2603"], self.prev_high_map, {}, self.contract_info
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = backtest.save_results(timeline_df, events_df, tmp, fmt="csv")
+            self.assertEqual(len(pd.read_csv(paths[0])), 4)
+
+
+def make_bar(day, o, h, l, c, volume=300, amount=31e6):
+    ts = pd.to_datetime([f"{day} 09:01", f"{day} 09:02"])
+    return pd.DataFrame({"ts": ts, "Open": [o, o], "High": [h, h], "Low": [l, l], "Close": [c, c],
+                         "Volume": [volume, volume], "Amount": [amount, amount]})
+
+
+def make_candidates(prev_high, reference, bias=-0.05):
+    return pd.DataFrame({"stock_code": ["2330"], "bias": [bias], "prev_high": [prev_high],
+                         "strategy_tag": ["bias"], "data_date": [""], "reference": [reference]})
+
+
+class TestCandidatesAsOf(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        dates = pd.bdate_range("2025-09-01", periods=90)
+        self.close = pd.DataFrame(100 + np.cumsum(rng.normal(0, 1, (90, 20)), axis=0),
+                                  index=dates, columns=[str(1000 + i) for i in range(20)])
+        self.high = self.close + 1.0
+
+    def test_uses_only_prior_days(self):
+        trade_date = self.close.index[80].date()
+        expected = backtest.candidates_as_of(self.close, self.high, trade_date)
+        self.assertEqual(expected["data_date"].iloc[0], str(self.close.index[79].date()))
+
+        # rewriting the trade date and everything after it must not change that morning's list
+        future = self.close.copy()
+        future.iloc[80:] = future.iloc[80:] * 3
+        actual = backtest.candidates_as_of(future, self.high * 2, trade_date)
+        self.assertEqual(sorted(actual["stock_code"]), sorted(expected["stock_code"]))
+        pd.testing.assert_series_equal(actual.set_index("stock_code")["bias"].sort_index(),
+                                       expected.set_index("stock_code")["bias"].sort_index())
+
+        row = expected.iloc[0]
+        self.assertEqual(row["reference"], self.close.iloc[79][row["stock_code"]])
+        self.assertEqual(row["prev_high"], self.high.iloc[79][row["stock_code"]])
+
+    def test_no_history_before_date(self):
+        self.assertTrue(backtest.candidates_as_of(self.close, self.high, self.close.index[0].date()).empty)
+
+
+class TestBacktestRange(unittest.TestCase):
+    def setUp(self):
+        d2, d3, d4 = (pd.Timestamp(f"2026-01-{d}").date() for d in (20, 21, 22))
+        self.kbars_by_date = {
+            d2: {"2330": make_bar(d2, 104, 105, 103.5, 104.8)},             # gaps over 101 -> trigger
+            d3: {},                                                          # holiday
+            d4: {"2330": make_bar(d4, 104.9, 105.5, 104.0, 105.0)},         # no gap over 105
+        }
+        self.candidates_by_date = {
+            d2: make_candidates(prev_high=101.0, reference=100.0),
+            d3: make_candidates(prev_high=105.0, reference=104.8),
+            d4: make_candidates(prev_high=105.0, reference=104.8),
+        }
+        self.contract_info = {"2330": {"name": "台積電"}}
+
+    def test_day_inputs_use_each_days_candidates(self):
+        day_inputs = list(backtest.iter_day_inputs(self.kbars_by_date.items(), self.candidates_by_date,
+                                                   self.contract_info))
+        self.assertEqual([d[0].day for d in day_inputs], [20, 22])
+        _, _, codes, prev_high_map, bias_map, info = day_inputs[1]
+        self.assertEqual(codes, ["2330"])
+        self.assertEqual(prev_high_map, {"2330": 105.0})
+        self.assertEqual(bias_map, {"2330": -0.05})
+        self.assertEqual(info["2330"], {"name": "台積電", "reference": 104.8})
+        self.assertNotIn("reference", self.contract_info["2330"])
+
+    def test_parallel_matches_serial(self):
+        day_inputs = list(backtest.iter_day_inputs(self.kbars_by_date.items(), self.candidates_by_date,
+                                                   self.contract_info))
+        serial = backtest.run_backtest_range(day_inputs, max_workers=1)
+        parallel = backtest.run_backtest_range(iter(day_inputs), max_workers=2)
+
+        for a, b in zip(serial, parallel):
+            pd.testing.assert_frame_equal(a, b)
+
+        timeline_df, events_df, stats_df = parallel
+        self.assertEqual(len(timeline_df), 4)
+        self.assertEqual(events_df["代碼"].tolist(), ["2330"])
+        self.assertEqual(stats_df["triggers"].tolist(), [1, 0])
+        self.assertEqual(stats_df["max_active"].tolist(), [1, 0])
+        self.assertEqual(stats_df["first_trigger"].iloc[0], pd.Timestamp("2026-01-20 09:02"))
+
+    def test_days_are_pulled_lazily(self):
+        loaded = []
+
+        def dated_kbars():
+            for trade_date, kbars_dict in self.kbars_by_date.items():
+                loaded.append(trade_date)
+                yield trade_date, kbars_dict
+
+        day_inputs = backtest.iter_day_inputs(dated_kbars(), self.candidates_by_date, self.contract_info)
+        self.assertEqual(loaded, [])  # nothing is downloaded up front
+        _, _, stats_df = backtest.run_backtest_range(day_inputs, max_workers=1)
+        self.assertEqual(len(loaded), 3)
+        self.assertEqual(len(stats_df), 2)
+
+
+class TestTradingDays(unittest.TestCase):
+    def test_weekday_holidays_skipped(self):
+        sessions = pd.DatetimeIndex(["2026-02-11", "2026-02-12", "2026-02-23", "2026-02-24"])  # Lunar New Year gap
+        days = backtest.trading_days(sessions, "2026-02-12", "2026-02-23")
+        self.assertEqual([d.isoformat() for d in days], ["2026-02-12", "2026-02-23"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+
+import unittest
+import sys
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# Setup path
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from modules.simulation import CumulativeBarEngine, kbars_to_snapshots
+
+
+def make_day(rng, n_bars=270, start="2026-01-21 09:01"):
+    ts = pd.date_range(start, periods=n_bars, freq="min")
+    close = 100 + np.cumsum(rng.normal(0, 0.3, n_bars))
+    return pd.DataFrame({
+        "ts": ts,
+        "Open": close + rng.normal(0, 0.1, n_bars),
+        "High": close + rng.uniform(0, 0.5, n_bars),
+        "Low": close - rng.uniform(0, 0.5, n_bars),
+        "Close": close,
+        "Volume": rng.integers(1, 50, n_bars).astype(float),
+        "Amount": rng.uniform(1e5, 5e6, n_bars),
+    })
+
+
+def brute_force(df, timestamp, reference):
+    """Original slice-and-recompute semantics."""
+    cum = df[df["ts"] <= timestamp]
+    close = cum.iloc[-1]["Close"]
+    return [cum.iloc[0]["Open"], cum["High"].max(), cum["Low"].min(), close,
+            cum["Volume"].sum(), cum["Amount"].sum(), close - reference if reference > 0 else 0]
+
+
+class TestCumulativeBarEngine(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.kbars = {
+            "2330": make_day(rng),
+            "2603": make_day(rng, n_bars=200, start="2026-01-21 09:30"),  # opens late
+            "8069": make_day(rng, n_bars=5),
+        }
+        self.info = {"2330": {"reference": 99.0}, "2603": {"reference": 0.0}}
+
+    def test_matches_slice_semantics(self):
+        engine = CumulativeBarEngine(self.kbars, self.info)
+        self.assertEqual(len(engine.timeline), 270)
+        for timestamp in list(engine.timeline[::37]) + [pd.Timestamp("2026-01-21 09:30:30")]:
+            frame = engine.snapshot_at(timestamp)
+            expected_codes = [c for c, df in self.kbars.items() if (df["ts"] <= timestamp).any()]
+            self.assertEqual(frame.codes.tolist(), expected_codes)
+            for code in expected_codes:
+                ref = self.info.get(code, {}).get("reference", 0.0)
+                row = frame.row(frame.index[code])
+                got = [row[f] for f in ("open", "high", "low", "close", "total_volume", "total_amount", "change_price")]
+                np.testing.assert_allclose(got, brute_force(self.kbars[code], timestamp, ref), rtol=1e-12)
+
+    def test_before_first_bar(self):
+        frame = kbars_to_snapshots(self.kbars, pd.Timestamp("2026-01-21 08:59"), self.info)
+        self.assertEqual(len(frame), 0)
+
+    def test_full_day_replay_speed(self):
+        rng = np.random.default_rng(1)
+        kbars = {str(1000 + i): make_day(rng) for i in range(300)}
+        start = time.perf_counter()
+        engine = CumulativeBarEngine(kbars, {})
+        total = sum(len(engine.snapshot_at(t)) for t in engine.timeline)
+        self.assertEqual(total, 300 * 270)
+        self.assertLess(time.perf_counter() - start, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+
+import unittest
+from unittest.mock import patch
+import sys
+import datetime
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+# Setup path
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from modules import contract_resolver
+
+
+class FakeGroup:
+    """Mimics a Shioaji ContractGroup: iterable and attribute-addressable."""
+    def __init__(self, exchange, contracts):
+        self._contracts = contracts
+        for c in contracts:
+            setattr(self, f"{exchange}{c.code}", c)
+
+    def __iter__(self):
+        return iter(self._contracts)
+
+
+def make_api():
+    tse = [SimpleNamespace(code="2330", name="台積電", reference=1000.0)]
+    otc = [SimpleNamespace(code="8069", name="元太", reference=200.0)]
+    stocks = SimpleNamespace(TSE=FakeGroup("TSE", tse), OTC=FakeGroup("OTC", otc))
+    return SimpleNamespace(Contracts=SimpleNamespace(Stocks=stocks))
+
+
+class TestContractIndex(unittest.TestCase):
+    def setUp(self):
+        contract_resolver._index_cache["key"] = None
+
+    def test_build_and_resolve(self):
+        api = make_api()
+        index = contract_resolver.build_contract_index(api)
+        self.assertEqual(index["2330"][0], "TSE")
+        self.assertEqual(index["8069"][0], "OTC")
+
+        contracts, info = contract_resolver.resolve_contracts(api, ["8069", "2330", "9999"])
+        self.assertEqual([c.code for c in contracts], ["8069", "2330"])
+        self.assertEqual(info["8069"]["reference"], 200.0)
+        self.assertNotIn("9999", info)
+
+    def test_index_cached_per_day(self):
+        api = make_api()
+        first = contract_resolver.get_contract_index(api)
+        self.assertIs(contract_resolver.get_contract_index(api), first)
+
+    def test_persisted_index_binds_lazily(self):
+        api = make_api()
+        today = datetime.date.today()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "contract_index.json"
+            contract_resolver.save_contract_index(contract_resolver.build_contract_index(api), today, path)
+
+            loaded = contract_resolver.load_contract_index(today, path)
+            self.assertEqual(loaded["2330"], ("TSE", None, "台積電", 1000.0))
+            self.assertIsNone(contract_resolver.load_contract_index(today - datetime.timedelta(days=1), path))
+
+            entry = contract_resolver.lookup_contract(api, "2330", loaded)
+            self.assertIs(entry[1], api.Contracts.Stocks.TSE.TSE2330)
+
+
+class TestFuturesCodes(unittest.TestCase):
+    def test_load_and_memoize(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "stock_futures_list.csv"
+            path.write_text('"證券\n代號",證券名稱,"股票期貨\n標的"\n2330,台積電,●\n2603,長榮, ● \n9999,未知股,\n', encoding="utf-8")
+
+            codes = contract_resolver.load_futures_codes(path)
+            self.assertEqual(codes, {"2330", "2603"})
+
+            with patch("pandas.read_csv") as read_csv:
+                self.assertIs(contract_resolver.load_futures_codes(path), codes)
+                read_csv.assert_not_called()
+
+    def test_missing_file(self):
+        self.assertEqual(contract_resolver.load_futures_codes(Path("/nonexistent/list.csv")), frozenset())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+
+import unittest
+from unittest.mock import patch
+import sys
+import datetime
+import tempfile
+from pathlib import Path
+
+# Setup path
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from modules import dedup_store
+from modules.dedup_store import SentStore
+
+
+class TestSentStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "sent.sqlite"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_survives_restart(self):
+        store = SentStore(self.path)
+        store.add("2330")
+        store.add("2330")
+        self.assertEqual(len(store), 1)
+        store.close()
+
+        reopened = SentStore(self.path)
+        self.assertIn("2330", reopened)
+        self.assertNotIn("2317", reopened)
+        reopened.close()
+
+    def test_daily_rollover(self):
+        day = {"today": datetime.date(2026, 1, 19)}
+
+        class FakeDate(datetime.date):
+            @classmethod
+            def today(cls):
+                return day["today"]
+
+        with patch.object(dedup_store.datetime, "date", FakeDate):
+            store = SentStore(self.path, keep_days=2)
+            store.add("2330")
+            day["today"] = datetime.date(2026, 1, 20)
+            self.assertNotIn("2330", store)
+            store.add("2317")
+
+            # rows older than keep_days are purged on rollover
+            day["today"] = datetime.date(2026, 1, 22)
+            self.assertEqual(len(store), 0)
+            rows = store._conn.execute("SELECT trade_date, code FROM sent").fetchall()
+            self.assertEqual(rows, [("2026-01-20", "2317")])
+            store.close()
+
+    def test_clear_today(self):
+        store = SentStore(self.path)
+        store.add("2330")
+        store.clear()
+        store.close()
+        self.assertNotIn("2330", SentStore(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+
+import unittest
+import sys
+import datetime
+import tempfile
+from pathlib import Path
+import pandas as pd
+
+# Setup path
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from modules import finlab_cache
+
+
+class CountingFetcher:
+    def __init__(self, last_date):
+        self.last_date = last_date
+        self.calls = 0
+        self.starts = []
+
+    def __call__(self, name, start=None):
+        self.calls += 1
+        self.starts.append(start)
+        index = pd.bdate_range(end=self.last_date, periods=5, name="date")
+        return pd.DataFrame({"2330": range(5), "2317": range(5, 10)}, index=index, dtype=float)
+
+
+class TestFinlabCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        finlab_cache._memory_cache.clear()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        finlab_cache._memory_cache.clear()
+
+    def get(self, fetcher, now):
+        return finlab_cache.get_dataset("price:收盤價", root=self.tmp.name, fetcher=fetcher, now=now)
+
+    def test_fetched_once_per_day(self):
+        morning = datetime.datetime(2026, 1, 21, 8, 30)  # Wednesday
+        fetcher = CountingFetcher("2026-01-20")
+        first = self.get(fetcher, morning)
+        finlab_cache._memory_cache.clear()  # new process: read from disk
+        second = self.get(fetcher, morning.replace(hour=8, minute=45))
+        self.assertEqual(fetcher.calls, 1)
+        pd.testing.assert_frame_equal(first, second, check_freq=False)
+
+        # Tuesday's data is still the latest expected before today's update
+        self.get(fetcher, morning.replace(hour=16))
+        self.assertEqual(fetcher.calls, 1)
+
+        # next morning: Wednesday's close is expected
+        fetcher.last_date = "2026-01-21"
+        self.get(fetcher, datetime.datetime(2026, 1, 22, 8, 30))
+        self.assertEqual(fetcher.calls, 2)
+
+    def test_holiday_does_not_refetch(self):
+        fetcher = CountingFetcher("2026-01-16")  # Friday; Monday is a holiday
+        tuesday = datetime.datetime(2026, 1, 20, 8, 30)
+        self.get(fetcher, tuesday)
+        self.get(fetcher, tuesday.replace(hour=9))
+        self.assertEqual(fetcher.calls, 1)
+
+    def test_morning_fetch_expires_after_update_time(self):
+        fetcher = CountingFetcher("2026-01-20")
+        self.get(fetcher, datetime.datetime(2026, 1, 21, 8, 30))
+        fetcher.last_date = "2026-01-21"
+        evening = self.get(fetcher, datetime.datetime(2026, 1, 21, 18, 30))  # memory cache must not serve it
+        self.assertEqual(fetcher.calls, 2)
+        self.assertEqual(evening.index[-1], pd.Timestamp("2026-01-21"))
+
+        finlab_cache._memory_cache.clear()
+        self.get(fetcher, datetime.datetime(2026, 1, 21, 20, 0))
+        self.assertEqual(fetcher.calls, 2)
+
+    def test_weekday_holiday_after_update_time(self):
+        fetcher = CountingFetcher("2026-01-20")  # Wednesday 21st is a holiday: no new row
+        self.get(fetcher, datetime.datetime(2026, 1, 21, 17, 30))
+        self.get(fetcher, datetime.datetime(2026, 1, 21, 18, 30))
+        self.assertEqual(fetcher.calls, 1)
+
+    def test_slim_reads(self):
+        morning = datetime.datetime(2026, 1, 21, 8, 30)
+        fetcher = CountingFetcher("2026-01-20")
+        full = self.get(fetcher, morning)
+        self.assertIsNone(fetcher.starts[-1])
+
+        finlab_cache._memory_cache.clear()
+        tail = finlab_cache.get_dataset("price:收盤價", root=self.tmp.name, fetcher=fetcher, now=morning,
+                                        lookback=2, dtype="float32")
+        self.assertEqual(fetcher.calls, 1)  # served from the full table on disk
+        self.assertEqual(tail["2330"].dtype, "float32")
+        self.assertEqual(tail.index.tolist(), full.index[-2:].tolist())
+
+    def test_lookback_limits_what_is_stored(self):
+        morning = datetime.datetime(2026, 1, 21, 8, 30)
+        fetcher = CountingFetcher("2026-01-20")
+
+        def get(lookback, columns=None):
+            finlab_cache._memory_cache.clear()
+            return finlab_cache.get_dataset("price:收盤價", root=self.tmp.name, fetcher=fetcher, now=morning,
+                                            lookback=lookback, columns=columns)
+
+        get(2)
+        self.assertEqual(fetcher.calls, 1)
+        self.assertIsNotNone(fetcher.starts[-1])  # download restricted to the lookback window
+        stored = list(Path(self.tmp.name).glob("*.parquet"))
+        self.assertEqual(len(stored), 1)
+        self.assertEqual(pd.read_parquet(stored[0]).shape, (2, 2))
+
+        self.assertEqual(len(get(1)), 1)
+        self.assertEqual(fetcher.calls, 1)  # shorter window is covered by the stored tail
+        self.assertEqual(len(get(3)), 3)
+        self.assertEqual(fetcher.calls, 2)  # longer window than stored -> refetch
+
+    def test_column_subset_shares_the_full_table(self):
+        morning = datetime.datetime(2026, 1, 21, 8, 30)
+        fetcher = CountingFetcher("2026-01-20")
+        finlab_cache.get_dataset("price:收盤價", root=self.tmp.name, fetcher=fetcher, now=morning, lookback=3)
+        tw = finlab_cache.get_dataset("price:收盤價", root=self.tmp.name, fetcher=fetcher, now=morning,
+                                      lookback=2, columns=["2330"])
+        self.assertEqual(fetcher.calls, 1)
+        self.assertEqual(list(tw.columns), ["2330"])
+        self.assertEqual(len(tw), 2)
+        self.assertEqual(len(list(Path(self.tmp.name).glob("*.parquet"))), 1)
+
+        # a column-restricted miss still stores every code for the next caller
+        finlab_cache._memory_cache.clear()
+        other = tempfile.TemporaryDirectory()
+        self.addCleanup(other.cleanup)
+        finlab_cache.get_dataset("price:收盤價", root=other.name, fetcher=fetcher, now=morning,
+                                 lookback=2, columns=["2330"])
+        full = finlab_cache.get_dataset("price:收盤價", root=other.name, fetcher=fetcher, now=morning, lookback=2)
+        self.assertEqual(fetcher.calls, 2)
+        self.assertEqual(sorted(full.columns), ["2317", "2330"])
+
+    def test_expected_data_date(self):
+        self.assertEqual(finlab_cache.expected_data_date(datetime.datetime(2026, 1, 19, 8, 0)),
+                         datetime.date(2026, 1, 16))
+        self.assertEqual(finlab_cache.expected_data_date(datetime.datetime(2026, 1, 19, 18, 0)),
+                         datetime.date(2026, 1, 19))
+        self.assertEqual(finlab_cache.expected_data_date(datetime.datetime(2026, 1, 18, 18, 0)),
+                         datetime.date(2026, 1, 16))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+
+import unittest
+import sys
+import json
+from pathlib import Path
+
+# Setup path
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from modules.flex_templates import (
+    FlexTemplate, Slot, RawJSON, raw_list, FLEX_MESSAGE, SIGNAL_BUBBLE, TSM_PREMIUM_BUBBLE, signal_values
+)
+
+
+class TestFlexTemplate(unittest.TestCase):
+    def test_render_escapes_values(self):
+        template = FlexTemplate({"type": "text", "text": Slot("text"), "flex": Slot("flex"), "wrap": True})
+        rendered = template.render(text='引號 "quoted" \\ 換行\n', flex=2)
+        self.assertIsInstance(rendered, RawJSON)
+        self.assertEqual(json.loads(rendered), {"type": "text", "text": '引號 "quoted" \\ 換行\n',
+                                                "flex": 2, "wrap": True})
+
+    def test_raw_json_is_embedded(self):
+        inner = FlexTemplate({"a": Slot("a")})
+        parts = [inner.render(a=i) for i in range(3)]
+        message = FLEX_MESSAGE.render(alt_text="alt", contents=raw_list(parts))
+        self.assertEqual(json.loads(message), {"type": "flex", "altText": "alt",
+                                               "contents": [{"a": 0}, {"a": 1}, {"a": 2}]})
+
+    def test_missing_value_raises(self):
+        with self.assertRaises(KeyError):
+            FlexTemplate({"a": Slot("a")}).render()
+
+    def test_signal_bubble(self):
+        values = signal_values("2330", "台積電", 105.5, 0.035, 0.9, 12345, 1.2345e9, True, "09:01:02")
+        bubble = json.loads(SIGNAL_BUBBLE.render(size="giga", **values))
+        self.assertEqual(bubble["size"], "giga")
+        self.assertEqual(bubble["header"]["backgroundColor"], "#D32F2F")
+        self.assertEqual(bubble["header"]["contents"][0]["contents"][1]["text"], "09:01:02")
+        badges = bubble["body"]["contents"][1]["contents"]
+        self.assertEqual([b["contents"][0]["text"] for b in badges], ["期", "多方"])
+        rows = bubble["body"]["contents"][3]["contents"]
+        self.assertEqual([c["text"] for c in rows[0]["contents"]], ["現價", "105.5", "(+3.5%)"])
+        self.assertEqual(rows[1]["contents"][1]["color"], "#2E7D32")
+        self.assertEqual([c["text"] for c in rows[2]["contents"]], ["量能", "12,345張", "(12.35億)"])
+
+        values = signal_values("2603", "長榮", 50, 0.012, 0.6, 600, 3e7, False, "09:05:00")
+        bubble = json.loads(SIGNAL_BUBBLE.render(size="mega", **values))
+        self.assertEqual(len(bubble["body"]["contents"][1]["contents"]), 1)
+        self.assertEqual(bubble["header"]["backgroundColor"], "#F57C00")
+
+    def test_tsm_premium_bubble(self):
+        self.assertEqual(TSM_PREMIUM_BUBBLE.slots, {"tsm_price", "twd_rate", "tw_price", "premium", "channel",
+                                                    "theme_color", "advice", "desc"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+
+import unittest
+import sys
+import time
+import datetime
+from pathlib import Path
+from types import SimpleNamespace
+import numpy as np
+
+# Setup path
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from modules.gap_filter import screen_gaps, format_strategy_tag
+from modules.snapshot_frame import SnapshotFrame
+from modules.tick_clock import TickClock, NS_PER_SECOND
+
+NOW = datetime.datetime(2026, 1, 21, 9, 1, 30)
+TODAY_NS = int(datetime.datetime(2026, 1, 21, 9, 0, 5).timestamp()) * NS_PER_SECOND
+YESTERDAY_NS = int(datetime.datetime(2026, 1, 20, 13, 30).timestamp()) * NS_PER_SECOND
+
+
+def make_frame(rows):
+    return SnapshotFrame.from_snapshots([
+        SimpleNamespace(code=code, ts=ts, open=open_, high=open_, low=open_, close=open_,
+                        total_volume=1, total_amount=open_ * 1000, change_price=0.0)
+        for code, open_, ts in rows
+    ])
+
+
+class TestScreenGaps(unittest.TestCase):
+    def setUp(self):
+        self.clock = TickClock(NOW)
+        self.info = {
+            "2330": {"name": "台積電", "reference": 100.0},
+            "2603": {"name": "長榮", "reference": 100.0},
+            "3008": {"name": "大立光", "reference": 100.0},
+            "8069": {"name": "元太", "reference": 0.0},
+            "1101": {"name": "台泥", "reference": 100.0},
+        }
+        self.frame = make_frame([
+            ("2330", 101.0, TODAY_NS),      # exactly 1% -> hit
+            ("2603", 100.9, TODAY_NS),      # below threshold
+            ("3008", 105.0, YESTERDAY_NS),  # stale
+            ("8069", 105.0, TODAY_NS),      # no reference
+            ("1101", 0.0, TODAY_NS),        # not open
+        ])
+
+    def test_screen(self):
+        gap_list, gap_df, stale = screen_gaps(self.frame, self.info, clock=self.clock,
+                                              strategy_map={"2330": "bias|ma_conv"})
+        self.assertEqual(gap_list, ["2330"])
+        self.assertEqual(stale, 1)
+        row = gap_df.iloc[0]
+        self.assertEqual((row["名稱"], row["策略"], row["資料時間"]), ("台積電", "低基期 + 均線糾結", "09:00:05"))
+        self.assertAlmostEqual(row["漲幅%"], 0.01)
+        self.assertEqual(str(gap_df["漲幅%"].dtype), "float64")
+
+    def test_simulation_skips_freshness(self):
+        gap_list, _, stale = screen_gaps(self.frame, self.info, clock=self.clock, check_freshness=False)
+        self.assertEqual(gap_list, ["2330", "3008"])
+        self.assertEqual(stale, 0)
+
+    def test_empty(self):
+        gap_list, gap_df, stale = screen_gaps(SnapshotFrame.empty(), self.info, clock=self.clock)
+        self.assertEqual((gap_list, len(gap_df), stale), ([], 0, 0))
+
+    def test_strategy_tag(self):
+        self.assertEqual(format_strategy_tag("bias|ma_conv", sep="+"), "低基期+均線糾結")
+        self.assertEqual(format_strategy_tag(float("nan")), "")
+
+    def test_full_universe_speed(self):
+        rng = np.random.default_rng(0)
+        codes = [str(1000 + i) for i in range(1800)]
+        info = {code: {"name": code, "reference": 100.0} for code in codes}
+        frame = make_frame([(code, float(rng.uniform(95, 106)), TODAY_NS) for code in codes])
+        start = time.perf_counter()
+        gap_list, _, _ = screen_gaps(frame, info, clock=self.clock)
+        elapsed = time.perf_counter() - start
+        expected = [code for code, o in zip(codes, frame["open"].tolist()) if (o - 100.0) / 100.0 >= 0.01]
+        self.assertEqual(gap_list, expected)
+        self.assertLess(elapsed, 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
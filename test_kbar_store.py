@@ -0,0 +1,136 @@
+
+import unittest
+from unittest.mock import patch
+import sys
+import time
+import threading
+import datetime
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+import pandas as pd
+
+# Setup path
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from modules import simulation
+from modules.kbar_store import KbarStore
+
+
+class FakeKbarApi:
+    """api.kbars stub: 2603 has no trades that day."""
+    def __init__(self):
+        self.calls = 0
+
+    def kbars(self, contract, start, end):
+        self.calls += 1
+        if contract.code == "2603":
+            return {}
+        ts = pd.date_range(f"{start} 09:01", periods=3, freq="min").astype("int64").tolist()
+        return {"ts": ts, "Open": [1.0, 2.0, 3.0], "High": [1.5, 2.5, 3.5], "Low": [0.5, 1.5, 2.5],
+                "Close": [1.2, 2.2, 3.2], "Volume": [10, 20, 30], "Amount": [12.0, 44.0, 96.0]}
+
+
+def fake_lookup(api, code):
+    return ("TSE", SimpleNamespace(code=code), code, 0.0)
+
+
+class TestKbarStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = KbarStore(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def fetch(self, api, codes, target_date):
+        with patch.object(simulation, "lookup_contract", side_effect=fake_lookup):
+            return simulation.fetch_intraday_kbars(api, codes, {}, target_date, store=self.store)
+
+    def test_second_run_hits_disk_only(self):
+        past = datetime.date(2026, 1, 21)
+        api = FakeKbarApi()
+        first = self.fetch(api, ["2330", "2603"], past)
+        self.assertEqual(api.calls, 2)
+        self.assertEqual(list(first), ["2330"])
+
+        api = FakeKbarApi()
+        second = self.fetch(api, ["2330", "2603"], past)
+        self.assertEqual(api.calls, 1)  # the empty reply for 2603 is not cached
+        pd.testing.assert_frame_equal(first["2330"], second["2330"])
+
+        # only the missing code goes to the API
+        api = FakeKbarApi()
+        self.fetch(api, ["2330", "2317"], past)
+        self.assertEqual(api.calls, 1)
+
+    def test_empty_reply_not_persisted(self):
+        past = datetime.date(2026, 1, 21)
+        self.store.put("2603", past, pd.DataFrame(columns=["ts"]))
+        self.store.put("2603", past, None)
+        self.assertFalse(self.store.path("2603", past).exists())
+
+        # an empty file left by an older version is treated as a miss
+        path = self.store.path("2603", past)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        empty = pd.DataFrame({"ts": pd.Series([], dtype="int64")})
+        if path.suffix == ".parquet":
+            empty.to_parquet(path, index=False)
+        else:
+            empty.to_pickle(path)
+        self.assertIsNone(self.store.get("2603", past))
+
+    def test_today_is_not_cached(self):
+        api = FakeKbarApi()
+        today = datetime.date.today()
+        self.fetch(api, ["2330"], today)
+        self.fetch(api, ["2330"], today)
+        self.assertEqual(api.calls, 2)
+        self.assertIsNone(self.store.get("2330", today))
+
+
+class SlowFlakyKbarApi(FakeKbarApi):
+    """Every call takes 50ms; 1101 fails once before succeeding, 1102 always fails."""
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._failed = set()
+
+    def kbars(self, contract, start, end):
+        time.sleep(0.05)
+        with self._lock:
+            if contract.code == "1101" and "1101" not in self._failed:
+                self._failed.add("1101")
+                self.calls += 1
+                raise TimeoutError("throttled")
+            if contract.code == "1102":
+                self.calls += 1
+                raise TimeoutError("throttled")
+        with self._lock:
+            return super().kbars(contract, start, end)
+
+
+class TestConcurrentDownload(unittest.TestCase):
+    def test_parallel_download_with_retry(self):
+        codes = [str(1100 + i) for i in range(20)]
+        api = SlowFlakyKbarApi()
+        progress = []
+        start = time.perf_counter()
+        with patch.object(simulation, "lookup_contract", side_effect=fake_lookup), \
+                patch.object(simulation.random, "uniform", return_value=0.0):
+            result = simulation.fetch_intraday_kbars(
+                api, codes, {}, datetime.date(2026, 1, 21), use_cache=False,
+                progress_callback=lambda *a: progress.append(a),
+                max_workers=5, requests_per_second=0
+            )
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(list(result), [c for c in codes if c != "1102"])
+        self.assertEqual(api.calls, 20 + 1 + 2)
+        self.assertLess(elapsed, 0.5)  # serial would take >= 1.15s
+        self.assertEqual(progress[-1][0], 20)
+        self.assertTrue(any("1102 抓取失敗" in p[2] for p in progress))
+
+
+if __name__ == '__main__':
+    unittest.main()
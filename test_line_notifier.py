@@ -0,0 +1,160 @@
+
+import unittest
+import sys
+import json
+import time
+import threading
+import tempfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Setup path
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from line_notifier import LineNotifier
+
+
+class StubLineServer:
+    """Local stand-in for the push endpoint: scripted status codes, optional delay."""
+    def __init__(self, statuses=(200,), delay=0.0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                stub.requests.append((dict(self.headers), json.loads(body)))
+                time.sleep(stub.delay)
+                status = stub.statuses.pop(0) if len(stub.statuses) > 1 else stub.statuses[0]
+                self.send_response(status)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v2/bot/message/push"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestLineNotifier(unittest.TestCase):
+    def make_notifier(self, server, **kwargs):
+        params = dict(token="t", user_id="U1", push_url=server.url, base_backoff=0.01, coalesce_window=0.05,
+                      dedup_path=":memory:")
+        params.update(kwargs)
+        return LineNotifier(**params)
+
+    def test_notify_signal_does_not_block(self):
+        server = StubLineServer(delay=0.5)
+        self.addCleanup(server.close)
+        notifier = self.make_notifier(server)
+
+        start = time.perf_counter()
+        notifier.notify_signal("2330", "台積電", 105.0, 0.03, 0.9, 1200, 1.26e8, has_future=True)
+        notifier.notify_signal("2330", "台積電", 105.5, 0.03, 0.9, 1300, 1.37e8)  # duplicate
+        self.assertLess(time.perf_counter() - start, 0.1)
+
+        self.assertTrue(notifier.flush(timeout=5))
+        self.assertEqual(len(server.requests), 1)
+        headers, payload = server.requests[0]
+        self.assertEqual(headers["Authorization"], "Bearer t")
+        self.assertEqual(payload["to"], "U1")
+        self.assertEqual(payload["messages"][0]["type"], "flex")
+        self.assertEqual(payload["messages"][0]["contents"]["type"], "bubble")
+        self.assertEqual(payload["messages"][0]["contents"]["size"], "giga")
+
+    def test_burst_is_coalesced_into_carousels(self):
+        server = StubLineServer()
+        self.addCleanup(server.close)
+        notifier = self.make_notifier(server, coalesce_window=0.3)
+
+        for i in range(70):
+            notifier.notify_signal(str(1000 + i), "測試", 50.0, 0.02, 0.7, 600, 3e7)
+        self.assertTrue(notifier.flush(timeout=5))
+
+        self.assertEqual(len(server.requests), 2)
+        first, second = (payload["messages"] for _, payload in server.requests)
+        self.assertEqual(len(first), 5)
+        self.assertEqual(len(second), 1)
+        self.assertEqual([len(m["contents"]["contents"]) for m in first + second], [12] * 5 + [10])
+        self.assertTrue(all(m["contents"]["type"] == "carousel" for m in first))
+        self.assertEqual(first[0]["contents"]["contents"][0]["size"], "mega")
+        self.assertTrue(first[0]["altText"].startswith("觸發 12 檔: 1000 測試"))
+        self.assertLessEqual(max(len(m["altText"]) for m in first + second), 400)
+
+    def test_retries_server_errors_with_same_retry_key(self):
+        server = StubLineServer(statuses=(500, 429, 200))
+        self.addCleanup(server.close)
+        notifier = self.make_notifier(server)
+
+        notifier.send_message("hello")
+        self.assertTrue(notifier.flush(timeout=5))
+        self.assertEqual(len(server.requests), 3)
+        self.assertEqual(len({h["X-Line-Retry-Key"] for h, _ in server.requests}), 1)
+
+    def test_client_error_is_not_retried(self):
+        server = StubLineServer(statuses=(400,))
+        self.addCleanup(server.close)
+        notifier = self.make_notifier(server)
+
+        notifier.send_message("bad")
+        self.assertTrue(notifier.flush(timeout=5))
+        self.assertEqual(len(server.requests), 1)
+
+    def test_timeout_is_retried(self):
+        server = StubLineServer(delay=0.3)
+        self.addCleanup(server.close)
+        notifier = self.make_notifier(server, timeout=(1, 0.1), max_retries=2)
+
+        notifier.send_message("slow")
+        self.assertTrue(notifier.flush(timeout=5))
+        self.assertEqual(len(server.requests), 2)
+
+    def test_restart_does_not_renotify(self):
+        server = StubLineServer()
+        self.addCleanup(server.close)
+        with tempfile.TemporaryDirectory() as tmp:
+            dedup_path = Path(tmp) / "sent.sqlite"
+            notifier = self.make_notifier(server, dedup_path=dedup_path)
+            notifier.notify_signal("2330", "台積電", 105.0, 0.03, 0.9, 1200, 1.26e8)
+            self.assertTrue(notifier.flush(timeout=5))
+            notifier.sent_today.close()
+
+            restarted = self.make_notifier(server, dedup_path=dedup_path)
+            restarted.notify_signal("2330", "台積電", 106.0, 0.03, 0.9, 1500, 1.5e8)
+            restarted.notify_signal("2317", "鴻海", 200.0, 0.02, 0.8, 900, 1.8e8)
+            self.assertTrue(restarted.flush(timeout=5))
+            restarted.sent_today.close()
+
+        codes = [p["messages"][0]["altText"].split()[1] for _, p in server.requests]
+        self.assertEqual(codes, ["2330", "2317"])
+
+    def test_failed_push_is_not_marked_sent(self):
+        server = StubLineServer(statuses=(400, 200))
+        self.addCleanup(server.close)
+        notifier = self.make_notifier(server)
+
+        notifier.notify_signal("2330", "台積電", 105.0, 0.03, 0.9, 1200, 1.26e8)
+        self.assertNotIn("2330", notifier.sent_today)  # queued, not yet delivered
+        notifier.notify_signal("2330", "台積電", 105.0, 0.03, 0.9, 1200, 1.26e8)  # pending -> not re-queued
+        self.assertTrue(notifier.flush(timeout=5))
+        self.assertEqual(len(server.requests), 1)
+        self.assertNotIn("2330", notifier.sent_today)
+
+        # the next trigger retries and is marked only after the 200
+        notifier.notify_signal("2330", "台積電", 105.0, 0.03, 0.9, 1200, 1.26e8)
+        self.assertTrue(notifier.flush(timeout=5))
+        self.assertEqual(len(server.requests), 2)
+        self.assertIn("2330", notifier.sent_today)
+
+
+if __name__ == '__main__':
+    unittest.main()
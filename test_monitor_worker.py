@@ -0,0 +1,213 @@
+
+import unittest
+from unittest.mock import patch
+import sys
+import threading
+import time
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+import pandas as pd
+
+# Setup path
+sys.path.append(str(Path(__file__).resolve().parent))
+
+import config
+from modules.api_manager import SnapshotScheduler, ApiProvider
+from modules import monitor_worker, monitor_loop
+from modules.monitor_worker import MonitorWorker
+
+
+class FakeApi:
+    """2330 gaps and holds; 2603 opens without a gap."""
+    simulation = True
+
+    def snapshots(self, chunk):
+        data = {"2330": (103.0, 102.0, 105.0), "2603": (100.5, 100.0, 101.0)}
+        return [SimpleNamespace(code=c.code, ts=0, open=data[c.code][0], high=data[c.code][2],
+                                low=data[c.code][1], close=data[c.code][2], total_volume=1200,
+                                total_amount=120_000_000, change_price=0.0) for c in chunk]
+
+
+def fake_resolve(api, codes):
+    contracts = [SimpleNamespace(code=code) for code in codes]
+    return contracts, {code: {"name": code, "reference": 100.0} for code in codes}
+
+
+def provide(api):
+    return lambda refresh=False: api
+
+
+class TestMonitorWorker(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.csv = Path(self.tmp.name) / "candidates.csv"
+        pd.DataFrame({"stock_code": ["2330", "2603"], "bias": [0.01, 0.02],
+                      "prev_high": [101.0, 101.0]}).to_csv(self.csv, index=False)
+        self.scheduler = SnapshotScheduler(chunk_size=50, max_workers=1, requests_per_second=0,
+                                           base_backoff=0.0, adaptive=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def wait_for(self, worker, scans, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while worker.latest()["scan_count"] < scans and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_background_scans(self):
+        with patch.object(monitor_worker, "resolve_contracts", side_effect=fake_resolve) as resolve, \
+                patch.object(monitor_loop.notifier, "notify_signal"):
+            worker = MonitorWorker(provide(FakeApi()), self.csv, interval=0.01, scheduler=self.scheduler)
+            worker.start()
+            self.wait_for(worker, 3)
+            self.assertTrue(worker.stop(timeout=5))
+
+        latest = worker.latest()
+        self.assertGreaterEqual(latest["scan_count"], 3)
+        self.assertFalse(latest["running"])
+        self.assertEqual(resolve.call_count, 1)  # list / contracts prepared once
+        self.assertEqual(latest["active_df"]["代碼"].tolist(), ["2330"])
+        self.assertEqual(latest["universe"]["dropped_no_gap"], 1)
+        self.assertEqual(worker.session_state.triggered_history, {"2330"})
+
+    def test_scan_error_keeps_running(self):
+        with patch.object(monitor_worker, "resolve_contracts", side_effect=fake_resolve), \
+                patch.object(monitor_worker, "run_monitoring_pipeline", side_effect=[RuntimeError("boom"), (
+                    pd.DataFrame(), pd.DataFrame(), pd.DataFrame())] * 10):
+            worker = MonitorWorker(provide(FakeApi()), self.csv, interval=0.01, scheduler=self.scheduler)
+            worker.start()
+            self.wait_for(worker, 1)
+            worker.stop(timeout=5)
+
+        self.assertGreaterEqual(worker.latest()["scan_count"], 1)
+        self.assertTrue(any("boom" in message for _, level, message in worker.logs() if level == "ERROR"))
+
+    def test_prepare_failure_stops(self):
+        with patch.object(monitor_worker, "resolve_contracts", return_value=([], {})):
+            worker = MonitorWorker(provide(FakeApi()), self.csv, interval=0.01, scheduler=self.scheduler)
+            worker.start()
+            worker._thread.join(5)
+        self.assertIn("初始化失敗", worker.latest()["error"])
+        self.assertFalse(worker.running)
+
+    def test_api_rebuilt_after_repeated_failures(self):
+        apis = [FakeApi(), FakeApi()]
+        refreshes = []
+
+        def provider(refresh=False):
+            refreshes.append(refresh)
+            return apis[1] if any(refreshes) else apis[0]
+
+        def pipeline_result(*args, **kwargs):
+            if args[0] is apis[0]:
+                raise RuntimeError("boom")
+            return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+
+        with patch.object(monitor_worker, "resolve_contracts", side_effect=fake_resolve) as resolve, \
+                patch.object(monitor_worker, "run_monitoring_pipeline", side_effect=pipeline_result) as pipeline:
+            worker = MonitorWorker(provider, self.csv, interval=0.0, scheduler=self.scheduler)
+            worker.start()
+            self.wait_for(worker, 1)
+            worker.stop(timeout=5)
+
+        self.assertEqual(refreshes.count(True), 1)
+        self.assertEqual([call.args[0] for call in pipeline.call_args_list].count(apis[0]),
+                         config.MONITOR_API_MAX_FAILURES)
+        self.assertEqual(resolve.call_count, 2)  # contracts re-resolved for the new session
+        self.assertIs(worker.api, apis[1])
+        self.assertIs(pipeline.call_args_list[-1].args[0], apis[1])
+
+
+class HealthApi:
+    def __init__(self, healthy=True):
+        self.healthy = healthy
+        self.logged_out = False
+        self.Contracts = SimpleNamespace(Stocks=self)
+
+    def __getitem__(self, code):
+        if not self.healthy:
+            raise KeyError(code)
+        return SimpleNamespace(code=code)
+
+    def logout(self):
+        self.logged_out = True
+
+
+class TestApiProvider(unittest.TestCase):
+    def test_reuses_healthy_and_replaces_unhealthy(self):
+        initial = HealthApi()
+        logins = [HealthApi(), HealthApi()]
+        provider = ApiProvider(initial, login=lambda: logins.pop(0))
+
+        self.assertIs(provider(), initial)
+        initial.healthy = False
+        first = provider()
+        self.assertIsNot(first, initial)
+        self.assertFalse(initial.logged_out)  # shared session from the UI thread is left alone
+
+        second = provider(refresh=True)
+        self.assertIsNot(second, first)
+        self.assertTrue(first.logged_out)  # its own replaced session is released
+        self.assertIs(provider(), second)
+
+
+class SlowApi(FakeApi):
+    """Records overlapping snapshot calls across workers."""
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+
+    def snapshots(self, chunk):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        time.sleep(0.05)
+        self.active -= 1
+        return super().snapshots(chunk)
+
+
+class TestWorkerRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.csv = Path(self.tmp.name) / "candidates.csv"
+        pd.DataFrame({"stock_code": ["2330"], "bias": [0.01], "prev_high": [101.0]}).to_csv(self.csv, index=False)
+        self.scheduler = SnapshotScheduler(chunk_size=50, max_workers=1, requests_per_second=0,
+                                           base_backoff=0.0, adaptive=False)
+
+    def tearDown(self):
+        monitor_worker.stop_worker(timeout=5)
+        monitor_worker._current_worker = None
+        self.tmp.cleanup()
+
+    def test_start_replaces_and_joins_previous(self):
+        api = SlowApi()
+        with patch.object(monitor_worker, "resolve_contracts", side_effect=fake_resolve), \
+                patch.object(monitor_loop.notifier, "notify_signal"):
+            first = monitor_worker.start_worker(MonitorWorker(provide(api), self.csv, interval=0.0, scheduler=self.scheduler))
+            time.sleep(0.1)
+            second = monitor_worker.start_worker(MonitorWorker(provide(api), self.csv, interval=0.0, scheduler=self.scheduler))
+            self.assertFalse(first.running)
+            self.assertTrue(second.running)
+            self.assertIs(monitor_worker.current_worker(), second)
+            time.sleep(0.1)
+            self.assertTrue(monitor_worker.stop_worker(timeout=5))
+        self.assertEqual(api.max_active, 1)  # scans never overlapped
+        self.assertFalse(second.running)
+
+    def test_start_refused_while_previous_still_running(self):
+        stuck = MonitorWorker(provide(FakeApi()), self.csv, scheduler=self.scheduler)
+        release = threading.Event()
+        stuck._thread = threading.Thread(target=release.wait)
+        stuck._thread.start()
+        monitor_worker._current_worker = stuck
+        try:
+            with self.assertRaises(RuntimeError):
+                monitor_worker.start_worker(MonitorWorker(provide(FakeApi()), self.csv, scheduler=self.scheduler), timeout=0.05)
+            self.assertIs(monitor_worker.current_worker(), stuck)
+        finally:
+            release.set()
+            stuck._thread.join(5)
+
+
+if __name__ == '__main__':
+    unittest.main()
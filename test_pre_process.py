@@ -0,0 +1,60 @@
+
+import unittest
+import sys
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# Setup path
+sys.path.append(str(Path(__file__).resolve().parent))
+
+import config
+import pre_process
+
+
+def make_close(n_days=150, n_stocks=30, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2025-06-02", periods=n_days)
+    close = pd.DataFrame(100 + np.cumsum(rng.normal(0, 1, (n_days, n_stocks)), axis=0),
+                         index=dates, columns=[str(1000 + i) for i in range(n_stocks)])
+    close.iloc[:120, 0] = np.nan           # newly listed: < 60 days of history
+    close.iloc[130, 1] = np.nan            # suspended one day inside the MA60 window
+    close.iloc[-1, 2] = np.nan             # no trade on the latest day
+    return close
+
+
+def full_history(close):
+    ma60 = close.rolling(config.BIAS_WINDOW).mean()
+    bias = ((close - ma60) / ma60).iloc[-1].dropna()
+    ma_df = pd.concat([close.rolling(n).mean().iloc[-1] for n in (5, 10, 20)], axis=1)
+    ma_df.columns = ["MA5", "MA10", "MA20"]
+    return bias, ma_df
+
+
+class TestPreProcessIndicators(unittest.TestCase):
+    def test_tail_window_matches_full_history(self):
+        close = make_close()
+        for end in (100, 131, 150):
+            window = close.iloc[:end].iloc[-pre_process.window_size():]
+            self.assertEqual(len(window), 60)
+            bias, ma_df = pre_process.compute_latest_indicators(window)
+            expected_bias, expected_ma = full_history(close.iloc[:end])
+            pd.testing.assert_series_equal(bias, expected_bias, check_names=False)
+            pd.testing.assert_frame_equal(ma_df, expected_ma)
+
+    def test_slim_inputs_select_same_stocks(self):
+        close = make_close()
+        expected_bias, expected_ma = full_history(close)
+
+        slim = pre_process.drop_inactive(close.iloc[-config.PREPROCESS_LOOKBACK_DAYS:].astype("float32"))
+        self.assertNotIn("1002", slim.columns)
+        window = slim.iloc[-pre_process.window_size():]
+        bias, ma_df = pre_process.compute_latest_indicators(window)
+
+        self.assertEqual(bias.index.tolist(), expected_bias.index.tolist())
+        pd.testing.assert_series_equal(bias, expected_bias, check_names=False, rtol=0, atol=1e-6)
+        pd.testing.assert_frame_equal(ma_df.dropna(), expected_ma.dropna(), rtol=1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+
+import unittest
+from unittest.mock import patch
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+import pandas as pd
+
+# Setup path
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from modules import quote_stream
+from modules.quote_stream import QuoteStreamMonitor, ReplayFeed
+
+
+class MockSessionState(dict):
+    def __getattr__(self, key):
+        return self.get(key)
+    def __setattr__(self, key, value):
+        self[key] = value
+
+
+def make_kbars():
+    ts = pd.to_datetime(["2026-01-21 09:01", "2026-01-21 09:02", "2026-01-21 09:03"])
+    # 2330: gaps above prev_high 101, volume crosses 500 張 on the 2nd bar
+    strong = pd.DataFrame({"ts": ts, "Open": [103.0, 104.0, 105.0], "High": [104.0, 105.0, 106.0],
+                           "Low": [102.0, 103.5, 104.5], "Close": [103.8, 104.9, 105.9],
+                           "Volume": [300, 300, 300], "Amount": [31_000_000, 31_000_000, 31_000_000]})
+    # 2603: opens with a gap but breaks below prev_high
+    weak = pd.DataFrame({"ts": ts, "Open": [103.0, 101.0, 100.0], "High": [103.5, 101.5, 100.5],
+                         "Low": [102.0, 100.0, 99.0], "Close": [102.5, 100.5, 99.5],
+                         "Volume": [400, 400, 400], "Amount": [40_000_000, 40_000_000, 40_000_000]})
+    return {"2330": strong, "2603": weak}
+
+
+class TestQuoteStream(unittest.TestCase):
+    def test_replay_triggers_on_update(self):
+        contract_info = {"2330": {"name": "台積電", "reference": 100.0, "has_future": True},
+                         "2603": {"name": "長榮", "reference": 100.0}}
+        prev_high_map = {"2330": 101.0, "2603": 101.0}
+        state = MockSessionState()
+        seen = []
+        monitor = QuoteStreamMonitor(["2330", "2603"], prev_high_map, {}, contract_info, state,
+                                     on_signal=seen.append, notify=False)
+
+        count = ReplayFeed(make_kbars()).run(monitor.on_tick)
+
+        self.assertEqual(count, 6)
+        self.assertEqual(state.triggered_history, {"2330"})
+        self.assertEqual(len(seen), 1)
+        self.assertEqual(seen[0]["time"], pd.Timestamp("2026-01-21 09:02"))
+        self.assertEqual(monitor.states["2330"].total_volume, 900)
+        self.assertEqual(monitor.states["2603"].low, 99.0)
+
+        frame = monitor.frame()
+        self.assertEqual(frame["high"].tolist(), [106.0, 103.5])
+
+    def test_shioaji_tick_uses_day_fields(self):
+        monitor = QuoteStreamMonitor(["2330"], {"2330": 101.0}, {}, {"2330": {"reference": 100.0}},
+                                     MockSessionState(), notify=False)
+        tick = SimpleNamespace(code="2330", datetime=pd.Timestamp("2026-01-21 09:05"), open="103", high="106",
+                               low="102", close="105.5", volume=5, amount="527500",
+                               total_volume=1500, total_amount="156000000")
+        with patch.object(quote_stream.notifier, "notify_signal") as notify:
+            monitor.notify = True
+            monitor.on_tick("TSE", tick)
+        state = monitor.states["2330"]
+        self.assertEqual((state.open, state.high, state.low, state.total_volume), (103.0, 106.0, 102.0, 1500))
+        notify.assert_called_once()
+
+    def test_notify_retried_while_active(self):
+        seen = []
+        monitor = QuoteStreamMonitor(["2330"], {"2330": 101.0}, {}, {"2330": {"reference": 100.0}},
+                                     MockSessionState(), on_signal=seen.append, notify=True)
+        tick = SimpleNamespace(code="2330", datetime=pd.Timestamp("2026-01-21 09:05"), open="103", high="106",
+                               low="102", close="105.5", volume=5, amount="527500",
+                               total_volume=1500, total_amount="156000000")
+        with patch.object(quote_stream.notifier, "notify_signal") as notify:
+            monitor.on_tick("TSE", tick)
+            monitor.on_tick("TSE", tick)  # e.g. the first push failed: the notifier decides whether to resend
+        self.assertEqual(notify.call_count, 2)
+        self.assertEqual(len(seen), 1)
+        self.assertEqual(len(monitor.events), 1)
+
+    def test_simtrade_ignored_and_notify_outside_lock(self):
+        monitor = QuoteStreamMonitor(["2330"], {"2330": 101.0}, {}, {"2330": {"reference": 100.0}},
+                                     MockSessionState(), notify=True)
+        tick = SimpleNamespace(code="2330", datetime=pd.Timestamp("2026-01-21 08:59"), open="103", high="106",
+                               low="102", close="105.5", volume=5, amount="527500",
+                               total_volume=1500, total_amount="156000000", simtrade=1)
+        lock_held = []
+        with patch.object(quote_stream.notifier, "notify_signal",
+                          side_effect=lambda *a: lock_held.append(monitor._lock.locked())) as notify:
+            monitor.on_tick("TSE", tick)
+            self.assertEqual(monitor.tick_count, 0)
+            notify.assert_not_called()
+
+            tick.simtrade = 0
+            tick.datetime = pd.Timestamp("2026-01-21 09:05")
+            monitor.on_tick("TSE", tick)
+        self.assertEqual(lock_held, [False])
+
+    def test_missing_reference_skipped(self):
+        state = MockSessionState()
+        monitor = QuoteStreamMonitor(["2330"], {"2330": 101.0}, {}, {"2330": {"name": "台積電"}},
+                                     state, notify=False)
+        ReplayFeed({"2330": make_kbars()["2330"]}).run(monitor.on_tick)
+        self.assertEqual(monitor.states["2330"].total_volume, 900)
+        self.assertEqual(state.triggered_history, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+
+import unittest
+from unittest.mock import patch
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Setup path
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from modules.snapshot_frame import SnapshotFrame
+from modules import monitor_loop
+
+
+class MockSessionState(dict):
+    def __getattr__(self, key):
+        return self.get(key)
+    def __setattr__(self, key, value):
+        self[key] = value
+
+
+def make_snap(code, open_, high, low, close, vol, amt, ts=1_769_130_000_000_000_000):
+    return SimpleNamespace(code=code, ts=ts, open=open_, high=high, low=low, close=close,
+                           total_volume=vol, total_amount=amt, change_price=0.0)
+
+
+class TestSnapshotFrame(unittest.TestCase):
+    def setUp(self):
+        self.snaps = [
+            make_snap("2330", 103.0, 106.0, 102.0, 105.9, 1200, 120_000_000),
+            make_snap("2603", 103.0, 106.0, 99.0, 105.0, 1200, 120_000_000),
+            make_snap("8069", 0, 0, 0, 0, 0, 0),
+        ]
+
+    def test_from_snapshots(self):
+        frame = SnapshotFrame.from_snapshots(self.snaps)
+        self.assertEqual(len(frame), 3)
+        self.assertEqual(frame.index["2603"], 1)
+        self.assertEqual(frame["close"].tolist(), [105.9, 105.0, 0.0])
+        self.assertEqual(frame.row(0)["code"], "2330")
+        self.assertIs(SnapshotFrame.from_snapshots(frame), frame)
+
+    def test_select_and_concat(self):
+        frame = SnapshotFrame.from_snapshots(self.snaps)
+        sub = frame.select(["8069", "9999", "2330"])
+        self.assertEqual(sub.codes.tolist(), ["8069", "2330"])
+        merged = SnapshotFrame.concat([sub, SnapshotFrame.empty(), frame.take(frame["close"] > 105.5)])
+        self.assertEqual(merged.codes.tolist(), ["8069", "2330", "2330"])
+        self.assertEqual(len(SnapshotFrame.concat([])), 0)
+
+    def test_monitoring_iteration_on_frame(self):
+        frame = SnapshotFrame.from_snapshots(self.snaps)
+        contract_info = {
+            "2330": {"name": "台積電", "reference": 100.0, "has_future": True},
+            "2603": {"name": "長榮", "reference": 100.0, "has_future": False},
+            "8069": {"name": "元太", "reference": 100.0, "has_future": False},
+        }
+        prev_high_map = {"2330": 101.0, "2603": 101.0, "8069": 101.0}
+        state = MockSessionState()
+        with patch.object(monitor_loop.notifier, "notify_signal") as notify:
+            active_df, watchlist_df, gap_df = monitor_loop.run_monitoring_iteration(
+                None, list(contract_info), prev_high_map, {}, contract_info, frame, state
+            )
+        self.assertEqual(active_df["代碼"].tolist(), ["2330"])
+        self.assertEqual(len(gap_df), 3)
+        self.assertEqual(len(watchlist_df), 0)
+        self.assertEqual(state.triggered_history, {"2330"})
+        notify.assert_called_once()
+
+        # Numeric columns stay typed; formatting happens at render time
+        row = gap_df.set_index("代碼").loc["2330"]
+        self.assertAlmostEqual(row["跳空%"], 0.03)
+        self.assertEqual(row["量能"], 1200)
+        self.assertEqual(gap_df.set_index("代碼").loc["8069", "特徵"], "等待開盤")
+        self.assertEqual(str(gap_df["量能"].dtype), "int64")
+
+        # A previously triggered name that no longer qualifies shows up in the watchlist view
+        state.triggered_history.add("2603")
+        _, watchlist_df, _ = monitor_loop.run_monitoring_iteration(
+            None, list(contract_info), prev_high_map, {}, contract_info, frame, state, notify=False
+        )
+        self.assertEqual(watchlist_df["代碼"].tolist(), ["2603"])
+        self.assertEqual(watchlist_df["特徵"].tolist(), ["S6_區間突破"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+
+import unittest
+import sys
+import time
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+# Setup path
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from modules.api_manager import SnapshotScheduler, RateLimiter, fetch_snapshots_parallel
+from modules import monitor_loop
+
+
+def make_contracts(n):
+    return [SimpleNamespace(code=str(1000 + i)) for i in range(n)]
+
+
+class FakeApi:
+    """api.snapshots stub: fails permanently for chunks containing a code in `broken`."""
+    def __init__(self, broken=(), flaky_once=False):
+        self.broken = set(broken)
+        self.flaky_once = flaky_once
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._failed = set()
+
+    def snapshots(self, chunk):
+        with self._lock:
+            self.calls += 1
+            key = chunk[0].code
+            if self.flaky_once and key not in self._failed:
+                self._failed.add(key)
+                raise TimeoutError("throttled")
+        if any(c.code in self.broken for c in chunk):
+            raise TimeoutError("throttled")
+        return [SimpleNamespace(code=c.code, ts=0, open=10.0, high=10.0, low=10.0, close=10.0,
+                                total_volume=1, total_amount=10.0, change_price=0.0) for c in chunk]
+
+
+class TestSnapshotScheduler(unittest.TestCase):
+    def make_scheduler(self, **kwargs):
+        params = dict(chunk_size=100, max_workers=2, requests_per_second=0, base_backoff=0.0)
+        params.update(kwargs)
+        return SnapshotScheduler(**params)
+
+    def test_reports_dropped_chunks(self):
+        scheduler = self.make_scheduler(adaptive=False)
+        report = {}
+        frame = scheduler.fetch(FakeApi(broken={"1150"}), make_contracts(250), report=report)
+        self.assertEqual(len(frame), 150)
+        self.assertEqual(report["dropped"], [1])
+        self.assertEqual(len(report["dropped_codes"]), 100)
+        self.assertIn("1150", report["dropped_codes"])
+
+    def test_retry_recovers_transient_errors(self):
+        scheduler = self.make_scheduler()
+        api = FakeApi(flaky_once=True)
+        report = {}
+        frame = scheduler.fetch(api, make_contracts(300), report=report)
+        self.assertEqual(len(frame), 300)
+        self.assertEqual(report["dropped"], [])
+        self.assertEqual(api.calls, 6)
+        # 50% attempt error rate -> back off
+        self.assertEqual(scheduler.chunk_size, 50)
+        self.assertEqual(scheduler.max_workers, 1)
+
+    def test_grows_when_healthy(self):
+        scheduler = self.make_scheduler()
+        scheduler.fetch(FakeApi(), make_contracts(300))
+        self.assertEqual(scheduler.chunk_size, 150)
+        self.assertEqual(scheduler.max_workers, 3)
+
+    def test_fixed_sizes_disable_adaptation(self):
+        frame = fetch_snapshots_parallel(FakeApi(), make_contracts(120), chunk_size=50, max_workers=1)
+        self.assertEqual(len(frame), 120)
+
+    def test_report_written_on_early_exit(self):
+        scheduler = self.make_scheduler(chunk_size=50, max_workers=1, adaptive=False)
+        report = {}
+        scheduler.fetch(FakeApi(), make_contracts(100), report=report)
+        self.assertTrue(report["completed"])
+
+        gen = scheduler.iter_fetch(FakeApi(), make_contracts(300), report=report)
+        next(gen)
+        gen.close()
+        self.assertFalse(report["completed"])
+        self.assertEqual(report["chunks"], 6)
+        self.assertEqual(report["snapshots"], 50)
+        self.assertEqual(len(report["unfinished"]), 5)
+
+        with self.assertRaises(ValueError):
+            for _ in scheduler.iter_fetch(FakeApi(), make_contracts(100), report=report):
+                raise ValueError("consumer failed")
+        self.assertFalse(report["completed"])
+        self.assertEqual(report["chunks"], 2)
+
+    def test_concurrent_fetches_keep_separate_reports(self):
+        scheduler = self.make_scheduler(adaptive=False)
+        reports = [{}, {}]
+        threads = [threading.Thread(target=scheduler.fetch, args=(FakeApi(), make_contracts(n)),
+                                    kwargs={"report": r}) for n, r in zip((100, 300), reports)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual([r["snapshots"] for r in reports], [100, 300])
+        self.assertFalse(hasattr(scheduler, "last_report"))
+
+    def test_rate_limiter_spacing(self):
+        limiter = RateLimiter(50)
+        start = time.monotonic()
+        for _ in range(6):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+
+class SlowChunkApi(FakeApi):
+    """First chunk is slow; the rest return immediately."""
+    def snapshots(self, chunk):
+        if chunk[0].code == "1000":
+            time.sleep(0.3)
+        return super().snapshots(chunk)
+
+
+class MockSessionState(dict):
+    def __getattr__(self, key):
+        return self.get(key)
+    def __setattr__(self, key, value):
+        self[key] = value
+
+
+class TestMonitoringPipeline(unittest.TestCase):
+    def test_chunks_evaluated_as_they_arrive(self):
+        scheduler = SnapshotScheduler(chunk_size=50, max_workers=2, requests_per_second=0,
+                                      base_backoff=0.0, adaptive=False)
+        contracts = make_contracts(150)
+        arrivals = []
+        start = time.monotonic()
+
+        def on_chunk(chunk_id, frame, active_df):
+            arrivals.append((chunk_id, len(frame), time.monotonic() - start))
+
+        report = {}
+        active_df, watchlist_df, gap_df = monitor_loop.run_monitoring_pipeline(
+            SlowChunkApi(), [c.code for c in contracts], {}, {}, {}, contracts, MockSessionState(),
+            scheduler=scheduler, on_chunk=on_chunk, report=report
+        )
+        self.assertEqual(len(gap_df), 150)
+        self.assertEqual(arrivals[-1][0], 0)
+        self.assertLess(arrivals[0][2], 0.2)
+        self.assertEqual(report["snapshots"], 150)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+
+import unittest
+import sys
+from pathlib import Path
+import numpy as np
+
+# Setup path
+sys.path.append(str(Path(__file__).resolve().parent))
+
+import strategy
+
+
+class TestStrategyBatch(unittest.TestCase):
+    def setUp(self):
+        # Rows: strong gap / gap broken (low < prev_high) / low volume / not opened / flat bar
+        self.snaps = [
+            {"open": 103.0, "high": 106.0, "low": 102.0, "close": 105.9, "total_volume": 1200, "total_amount": 120_000_000},
+            {"open": 103.0, "high": 106.0, "low": 99.0, "close": 105.0, "total_volume": 1200, "total_amount": 120_000_000},
+            {"open": 103.0, "high": 106.0, "low": 102.0, "close": 105.0, "total_volume": 100, "total_amount": 10_000_000},
+            {"open": 0, "high": 0, "low": 0, "close": 0, "total_volume": 0, "total_amount": 0},
+            {"open": 104.0, "high": 104.0, "low": 104.0, "close": 104.0, "total_volume": 900, "total_amount": 90_000_000},
+        ]
+        self.prev_high = [101.0, 101.0, 101.0, 101.0, 101.0]
+        self.has_future = [True, False, True, True, False]
+
+    def run_batch(self):
+        cols = {k: [s[k] for s in self.snaps] for k in self.snaps[0]}
+        return strategy.check_criteria_batch(
+            cols["open"], cols["high"], cols["low"], cols["close"],
+            cols["total_volume"], cols["total_amount"],
+            self.prev_high, self.has_future,
+        )
+
+    def test_batch_masks(self):
+        res = self.run_batch()
+        self.assertEqual(res["active"].tolist(), [True, False, False, False, False])
+        self.assertEqual(res["gap"].tolist(), [True, False, True, False, True])
+        self.assertEqual(res["volume"].tolist(), [True, True, False, False, True])
+        self.assertEqual(res["p_loc"][3], 0.0)
+        self.assertEqual(res["p_loc"][4], 0.0)
+        self.assertEqual(strategy.feature_labels(res["features"][0]), ["⚡有股期", "🔥S6_極強勢"])
+        self.assertEqual(strategy.feature_labels(res["features"][3]), [])
+
+    def test_scalar_matches_batch(self):
+        res = self.run_batch()
+        for i, snap in enumerate(self.snaps):
+            is_active, features, p_loc, cond_gap = strategy.check_criteria(
+                snap, self.prev_high[i], 0.0, self.has_future[i]
+            )
+            self.assertEqual(is_active, bool(res["active"][i]))
+            self.assertEqual(cond_gap, bool(res["gap"][i]))
+            self.assertEqual(p_loc, float(res["p_loc"][i]))
+            self.assertEqual(features, strategy.feature_labels(res["features"][i]))
+
+    def test_random_consistency(self):
+        rng = np.random.default_rng(0)
+        n = 500
+        low = rng.uniform(50, 100, n)
+        high = low + rng.uniform(0, 5, n)
+        close = low + (high - low) * rng.uniform(0, 1, n)
+        open_ = low + (high - low) * rng.uniform(0, 1, n)
+        vol = rng.integers(0, 2000, n)
+        amt = vol * close * 1000
+        prev_high = low * rng.uniform(0.95, 1.02, n)
+        res = strategy.check_criteria_batch(open_, high, low, close, vol, amt, prev_high)
+        for i in range(n):
+            snap = {"open": open_[i], "high": high[i], "low": low[i], "close": close[i],
+                    "total_volume": vol[i], "total_amount": amt[i]}
+            is_active, _, p_loc, _ = strategy.check_criteria(snap, prev_high[i], 0.0)
+            self.assertEqual(is_active, bool(res["active"][i]))
+            self.assertEqual(p_loc, float(res["p_loc"][i]))
+
+
+if __name__ == '__main__':
+    unittest.main()
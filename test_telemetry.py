@@ -0,0 +1,96 @@
+
+import unittest
+import unittest.mock
+import sys
+import json
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+# Setup path
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from modules import telemetry, monitor_loop
+from modules.telemetry import LatencyTracker, span, tick_span
+from modules.api_manager import SnapshotScheduler
+
+
+class TestLatencyTracker(unittest.TestCase):
+    def test_percentiles_over_rolling_window(self):
+        tracker = LatencyTracker(window=100)
+        for ms in range(1, 201):
+            tracker.record("evaluate", ms / 1000.0)
+        stats = tracker.summary()["evaluate"]
+        self.assertEqual(stats["count"], 200)
+        # only the last 100 samples (101..200 ms) are kept
+        self.assertAlmostEqual(stats["p50"], 150.5, places=1)
+        self.assertAlmostEqual(stats["p99"], 199.01, places=1)
+        self.assertEqual(stats["max"], 200.0)
+
+    def test_span_and_structured_logs(self):
+        tracker = LatencyTracker()
+        with self.assertLogs(telemetry.logger, level="DEBUG") as logs:
+            with span("notify", tracker_=tracker, signals=3):
+                time.sleep(0.01)
+            tracker.log_summary()
+        event = json.loads(logs.records[0].getMessage())
+        self.assertEqual((event["event"], event["stage"], event["signals"]), ("span", "notify", 3))
+        self.assertGreaterEqual(event["ms"], 10)
+        summary = json.loads(logs.records[1].getMessage())
+        self.assertEqual(summary["stages"]["notify"]["count"], 1)
+
+    def test_tick_over_budget_warns(self):
+        tracker = LatencyTracker()
+        with self.assertLogs(telemetry.logger, level="WARNING") as logs:
+            with tick_span(budget=0.0, tracker_=tracker):
+                pass
+        self.assertIn("tick_over_budget", logs.output[0])
+
+
+class FakeApi:
+    def snapshots(self, chunk):
+        return [SimpleNamespace(code=c.code, ts=0, open=10.0, high=10.0, low=10.0, close=10.0,
+                                total_volume=1, total_amount=10.0, change_price=0.0) for c in chunk]
+
+
+class MockSessionState(dict):
+    def __getattr__(self, key):
+        return self.get(key)
+    def __setattr__(self, key, value):
+        self[key] = value
+
+
+class TestPipelineInstrumentation(unittest.TestCase):
+    def test_pipeline_records_stages(self):
+        telemetry.tracker.reset()
+        contracts = [SimpleNamespace(code=str(1000 + i)) for i in range(120)]
+        scheduler = SnapshotScheduler(chunk_size=50, max_workers=2, requests_per_second=0, adaptive=False)
+        monitor_loop.run_monitoring_pipeline(FakeApi(), [c.code for c in contracts], {}, {}, {}, contracts,
+                                             MockSessionState(), scheduler=scheduler)
+        summary = telemetry.tracker.summary()
+        self.assertEqual(summary["snapshot_chunk"]["count"], 3)
+        self.assertEqual(summary["evaluate"]["count"], 3)
+        self.assertEqual(summary["build_frames"]["count"], 3)
+        self.assertEqual(summary["tick"]["count"], 1)
+
+    def test_failed_attempts_recorded(self):
+        class SlowFailingApi:
+            def snapshots(self, chunk):
+                time.sleep(0.02)
+                raise TimeoutError("throttled")
+
+        tracker = LatencyTracker()
+        scheduler = SnapshotScheduler(chunk_size=50, max_workers=1, requests_per_second=0,
+                                      max_retries=2, base_backoff=0.0, adaptive=False)
+        with unittest.mock.patch("modules.api_manager.tracker", tracker), \
+                self.assertLogs(telemetry.logger, level="DEBUG") as logs:
+            scheduler.fetch(SlowFailingApi(), [SimpleNamespace(code="2330")])
+        stats = tracker.summary()["snapshot_chunk"]
+        self.assertEqual(stats["count"], 2)
+        self.assertGreaterEqual(stats["p50"], 20)
+        events = [json.loads(r.getMessage()) for r in logs.records]
+        self.assertEqual([(e["ok"], e["outcome"]) for e in events], [(False, "TimeoutError")] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+
+import unittest
+import sys
+import datetime
+from pathlib import Path
+import numpy as np
+
+# Setup path
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from modules.tick_clock import TickClock, ts_to_time_str, NS_PER_SECOND
+
+
+def to_ns(dt):
+    return int(dt.timestamp() * NS_PER_SECOND)
+
+
+class TestTickClock(unittest.TestCase):
+    def setUp(self):
+        self.clock = TickClock(datetime.datetime(2026, 1, 21, 9, 30, 5))
+
+    def test_time_str_fixed_per_tick(self):
+        self.assertEqual(self.clock.time_str, "09:30:05")
+        self.assertFalse(self.clock.before(9, 0))
+        self.assertTrue(self.clock.before(13, 30))
+
+    def test_is_today_matches_fromtimestamp(self):
+        samples = [
+            datetime.datetime(2026, 1, 20, 13, 30),
+            datetime.datetime(2026, 1, 20, 23, 59, 59, 999999),
+            datetime.datetime(2026, 1, 21, 0, 0),
+            datetime.datetime(2026, 1, 21, 9, 0, 1),
+            datetime.datetime(2026, 1, 21, 23, 59, 59),
+            datetime.datetime(2026, 1, 22, 0, 0),
+        ]
+        ts = np.array([to_ns(dt) for dt in samples], dtype=np.int64)
+        expected = [datetime.datetime.fromtimestamp(t / NS_PER_SECOND).strftime('%Y-%m-%d') == "2026-01-21"
+                    for t in ts.tolist()]
+        self.assertEqual(self.clock.is_today(ts).tolist(), expected)
+        self.assertEqual([self.clock.is_today(t) for t in ts.tolist()], expected)
+        self.assertEqual(expected, [False, False, True, True, True, False])
+
+    def test_ts_to_time_str(self):
+        self.assertEqual(ts_to_time_str(to_ns(datetime.datetime(2026, 1, 21, 9, 0, 1))), "09:00:01")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+
+import unittest
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Setup path
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from modules.api_manager import SnapshotScheduler
+from modules.snapshot_frame import SnapshotFrame
+from modules.universe import UniverseManager, DROP_NO_GAP, DROP_GAP_FILLED
+from modules import monitor_loop
+
+
+def snap(code, open_=0.0, low=0.0, close=0.0, volume=0, ts=10**18):
+    return SimpleNamespace(code=code, ts=ts, open=open_, high=max(open_, close), low=low, close=close,
+                           total_volume=volume, total_amount=close * volume * 1000, change_price=0.0)
+
+
+class MockSessionState(dict):
+    def __getattr__(self, key):
+        return self.get(key)
+    def __setattr__(self, key, value):
+        self[key] = value
+
+
+class TestUniverseManager(unittest.TestCase):
+    def setUp(self):
+        self.codes = ["1101", "2330", "2603", "3008", "8069"]
+        self.prev_high = {code: 100.0 for code in self.codes}
+        self.info = {code: {"reference": 99.0} for code in self.codes}
+
+    def test_drop_reasons(self):
+        universe = UniverseManager(self.codes, self.prev_high, self.info)
+        frame = SnapshotFrame.from_snapshots([
+            snap("1101", open_=100.5, low=100.5, close=100.8, volume=10),  # no gap over prev_high
+            snap("2330", open_=103.0, low=99.5, close=102.0, volume=10),   # gap filled
+            snap("2603", open_=103.0, low=102.0, close=104.0, volume=10),  # still alive
+            snap("3008"),                                                  # not open yet
+        ])
+        dropped = universe.update(frame)
+        self.assertEqual(sorted(dropped), ["1101", "2330"])
+        self.assertEqual(universe.dropped, {"1101": DROP_NO_GAP, "2330": DROP_GAP_FILLED})
+        self.assertEqual(universe.alive, ["2603", "3008", "8069"])
+        self.assertEqual(universe.stats(), {"total": 5, "alive": 3, "dropped_no_gap": 1, "dropped_gap_filled": 1})
+
+        # Dropping is permanent: a later recovery does not re-admit
+        universe.update(SnapshotFrame.from_snapshots([snap("2330", open_=103.0, low=99.5, close=110.0, volume=20)]))
+        self.assertNotIn("2330", universe)
+
+    def test_triggered_and_stale_kept(self):
+        universe = UniverseManager(self.codes, self.prev_high, self.info)
+        frame = SnapshotFrame.from_snapshots([
+            snap("2330", open_=103.0, low=99.5, close=102.0, volume=10, ts=10**18),
+            snap("1101", open_=100.5, low=100.5, close=100.8, volume=10, ts=10**18 - 1),
+        ])
+        dropped = universe.update(frame, triggered={"2330"}, min_ts=10**18)
+        self.assertEqual(dropped, [])
+        self.assertEqual(len(universe), 5)
+
+
+class ShrinkingApi:
+    """Every other code opens without a gap; records how many contracts are fetched."""
+    simulation = True
+
+    def __init__(self):
+        self.requested = []
+
+    def snapshots(self, chunk):
+        self.requested.extend(c.code for c in chunk)
+        return [snap(c.code, open_=100.5 if int(c.code) % 2 else 103.0, low=100.5 if int(c.code) % 2 else 102.0,
+                     close=101.0, volume=10) for c in chunk]
+
+
+class TestPipelineUniverse(unittest.TestCase):
+    def test_second_tick_fetches_survivors_only(self):
+        scheduler = SnapshotScheduler(chunk_size=50, max_workers=1, requests_per_second=0,
+                                      base_backoff=0.0, adaptive=False)
+        contracts = [SimpleNamespace(code=str(1000 + i)) for i in range(100)]
+        codes = [c.code for c in contracts]
+        prev_high = {code: 100.0 for code in codes}
+        universe = UniverseManager(codes, prev_high, {})
+        api = ShrinkingApi()
+        state = MockSessionState()
+
+        monitor_loop.run_monitoring_pipeline(api, codes, prev_high, {}, {}, contracts, state,
+                                             scheduler=scheduler, universe=universe)
+        self.assertEqual(len(api.requested), 100)
+        self.assertEqual(len(universe), 50)
+
+        api.requested.clear()
+        _, _, gap_df = monitor_loop.run_monitoring_pipeline(api, codes, prev_high, {}, {}, contracts, state,
+                                                            scheduler=scheduler, universe=universe)
+        self.assertEqual(len(api.requested), 50)
+        self.assertTrue(all(int(code) % 2 == 0 for code in api.requested))
+        self.assertEqual(len(gap_df), 50)
+
+
+if __name__ == '__main__':
+    unittest.main()